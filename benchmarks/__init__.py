@@ -0,0 +1,8 @@
+"""
+性能基准：本地假 Cloudreve v4、假上游（抖音/哔哩哔哩/网易云）服务与上传吞吐、端到端入库、CPU 热点微基准与冷启动预算。需先 pip install -e .（或 uv sync），在项目根目录运行：
+
+  python -m benchmarks.bench_upload
+  python -m benchmarks.bench_ingest
+  python -m benchmarks.bench_cpu
+  python -m benchmarks.bench_startup
+"""
@@ -0,0 +1,92 @@
+"""
+批量文件操作基准：bulk.move 对本地假 Cloudreve v4，在不同批大小与并发数下把 --files 个文件在两个文件夹间来回移动，
+输出每轮耗时、文件/秒与请求数；批大小 1、并发 1 即逐个请求的旧做法。最后用 bulk.rename 与 bulk.delete 各跑一轮。
+
+  python -m benchmarks.bench_bulk                                   # 默认 5000 个文件、接口延迟 10 ms
+  python -m benchmarks.bench_bulk --files 20000 --matrix 1x1,100x1,100x4,500x8
+  python -m benchmarks.bench_bulk --baseline benchmarks/baselines/bulk.json   # 耗时回退超过阈值时退出码 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.bench_upload import _post_json
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="批量文件操作基准（本地假服务）")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--matrix", default="1x1,100x1,100x4", help="批大小x并发数，逗号分隔")
+    parser.add_argument("--latency", type=float, default=0.01, help="假服务每个请求的额外延迟（秒）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="回退判定阈值（比例），默认 0.3")
+    args = parser.parse_args()
+
+    from benchmarks.fake_cloudreve import FakeCloudreve, FakeConfig
+    from benchmarks.serve import BackgroundServer
+
+    fake = FakeCloudreve(FakeConfig(latency=args.latency))
+    results: dict[str, dict] = {}
+    with BackgroundServer(fake.app) as base_url:
+        os.environ["CLOUDREVE_BASE_URL"] = f"{base_url}/api/v4"
+        from mcp_cloudreve import bulk, cloudreve, pipeline
+
+        token = cloudreve.password_sign_in("bench@example.com", "bench")["token"]
+        tokens = pipeline.TokenState(token["access_token"], token["refresh_token"])
+        folders = ["cloudreve://my/bench-bulk/a", "cloudreve://my/bench-bulk/b"]
+        names = [f"f{i:07d}.bin" for i in range(args.files)]
+        _post_json(f"{base_url}/_bench/files", {f"{folders[0]}/{name}": 1024 for name in names})
+        side = 0
+
+        def record(name: str, fn) -> None:
+            before = sum(v for k, v in fake.stats.items() if k.startswith("requests."))
+            t0 = time.perf_counter()
+            out = fn()
+            seconds = time.perf_counter() - t0
+            if out["failed"]:
+                raise SystemExit(f"{name} 失败：{out['failed'][:5]}")
+            requests = sum(v for k, v in fake.stats.items() if k.startswith("requests.")) - before
+            results[name] = {"seconds": round(seconds, 3), "files_per_s": round(len(out["done"]) / seconds, 1), "requests": requests}
+            print(f"{name:<16}{seconds:>9.3f}s{results[name]['files_per_s']:>12}{requests:>8}")
+
+        print(f"{'场景':<14}{'耗时':>10}{'文件/秒':>9}{'请求':>7}")
+        for spec in args.matrix.split(","):
+            batch, concurrency = (int(x) for x in spec.split("x"))
+            src, dst = folders[side], folders[1 - side]
+            record(f"move/{spec}", lambda: bulk.move(
+                tokens, [f"{src}/{name}" for name in names], dst, batch_size=batch, concurrency=concurrency,
+            ))
+            side = 1 - side
+        folder = folders[side]
+        record("rename", lambda: bulk.rename(tokens, {f"{folder}/{name}": f"r{name}" for name in names}))
+        record("delete", lambda: bulk.delete(tokens, [f"{folder}/r{name}" for name in names]))
+
+    report = {"meta": {"python": sys.version.split()[0], "files": args.files, "latency": args.latency}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = [
+            f"{name}: {cur['seconds']}s > 基线 {baseline[name]['seconds']}s"
+            for name, cur in results.items()
+            if name in baseline and cur["seconds"] > baseline[name]["seconds"] * (1 + args.tolerance)
+        ]
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
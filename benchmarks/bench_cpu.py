@@ -0,0 +1,230 @@
+"""
+CPU 热点微基准：签名、加密与分享页解析函数，每个用例与优化前的参考实现对比，先校验输出逐字节一致再计时。
+
+  python -m benchmarks.bench_cpu                       # 全部用例
+  python -m benchmarks.bench_cpu --cases enc_wbi,router_data --rounds 7
+  python -m benchmarks.bench_cpu --save-baseline benchmarks/baselines/cpu.json
+  python -m benchmarks.bench_cpu --baseline benchmarks/baselines/cpu.json   # 单次耗时上升超过阈值时退出码 1
+
+输出每个用例参考实现与当前实现的单次耗时（微秒，取各轮最小值）与加速比。
+基线只记录当前实现的耗时；输出不一致时直接失败（退出码 2），不计时。
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import string
+import sys
+import time
+import timeit
+import urllib.parse
+from functools import reduce
+from hashlib import md5
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from mcp_cloudreve import bilibili, douyin, netease
+
+
+# ----- 参考实现（优化前的原始代码，只用于对照与校验）-----
+def ref_hex_digest(data: bytes) -> str:
+    return "".join(hex(d)[2:].zfill(2) for d in data)
+
+
+def ref_encrypt_params(url_path: str, payload: dict) -> str:
+    url2 = url_path.replace("/eapi/", "/api/")
+    digest = ref_hex_digest(md5(f"nobody{url2}use{json.dumps(payload)}md5forencrypt".encode("utf-8")).digest())
+    params_str = f"{url2}-36cd479b6b5-{json.dumps(payload)}-36cd479b6b5-{digest}"
+    raw = params_str.encode("utf-8")
+    pad_len = 16 - (len(raw) % 16)
+    padded = raw + bytes([pad_len] * pad_len)
+    encryptor = Cipher(algorithms.AES(netease.AES_KEY), modes.ECB()).encryptor()
+    return ref_hex_digest(encryptor.update(padded) + encryptor.finalize())
+
+
+def ref_get_mixin_key(orig: str) -> str:
+    return reduce(lambda s, i: s + orig[i], bilibili.MIXIN_KEY_ENC_TAB, "")[:32]
+
+
+def ref_enc_wbi(params: dict, img_key: str, sub_key: str, wts: int) -> dict:
+    mixin_key = ref_get_mixin_key(img_key + sub_key)
+    params = dict(params)
+    params["wts"] = wts
+    params = dict(sorted(params.items()))
+    params = {k: "".join(filter(lambda c: c not in "!'()*", str(v))) for k, v in params.items()}
+    query = urllib.parse.urlencode(params)
+    params["w_rid"] = md5((query + mixin_key).encode()).hexdigest()
+    return params
+
+
+def ref_share_url(text: str) -> str | None:
+    urls = re.findall(r"https?://(?:[a-zA-Z0-9]|[$-_.+!*(),]|(?:%[0-9a-fA-F]{2}))+", text)
+    return urls[0] if urls else None
+
+
+def ref_router_data(html: str) -> str | None:
+    match = re.compile(r"window\._ROUTER_DATA\s*=\s*(.*?)</script>", re.DOTALL).search(html)
+    return match.group(1) if match else None
+
+
+# ----- 输入 -----
+def _random_text(rng: random.Random, n: int, alphabet: str) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(n))
+
+
+def _search_payload(rng: random.Random) -> dict:
+    return {
+        "hlpretag": "<span class=\"s-fc7\">",
+        "hlposttag": "</span>",
+        "s": _random_text(rng, rng.randint(1, 20), string.ascii_letters + "周杰伦 晴天!'()*"),
+        "type": "1",
+        "offset": "0",
+        "total": "true",
+        "limit": str(rng.randint(1, 100)),
+        "header": json.dumps({"os": "pc", "appver": "", "osver": "", "deviceId": "pyncm!", "requestId": str(rng.randint(20000000, 29999999))}),
+    }
+
+
+def _playurl_params(rng: random.Random) -> dict:
+    return {
+        "bvid": "BV" + _random_text(rng, 10, string.ascii_letters + string.digits),
+        "cid": str(rng.randint(1, 10**9)),
+        "qn": "80",
+        "fnval": "16",
+        "fnver": "0",
+        "fourk": "1",
+        "otype": "json",
+        "platform": "web",
+        "extra": _random_text(rng, 8, "ab!'()*c d&="),
+    }
+
+
+def _share_text(rng: random.Random) -> str:
+    url_chars = string.ascii_letters + string.digits + "$-_.+!*(),%/?&=#~"
+    return (
+        f"{rng.randint(1, 9)}.{rng.randint(10, 99)} 复制打开抖音，看看【{_random_text(rng, 6, '作品标题测试')}】"
+        f" https://v.douyin.com/{_random_text(rng, 8, url_chars)} {_random_text(rng, 5, 'ABCxyz@# ')}"
+    )
+
+
+def _share_page(rng: random.Random, padding: int) -> str:
+    data = json.dumps({"loaderData": {"video_(id)/page": {"videoInfoRes": {"item_list": [{"desc": "测试"}]}}}}, ensure_ascii=False)
+    decoy = "<script>var x = 'window._ROUTER_DATA';</script>" if rng.random() < 0.5 else ""
+    spaces = rng.choice(["", " ", "\n  ", "\t"])
+    return (
+        f"<html><head>{decoy}</head><body>{'<div>' + 'x' * padding + '</div>'}"
+        f"<script>window._ROUTER_DATA{spaces}={spaces}{data}</script><script>var y = 1;</script></body></html>"
+    )
+
+
+# ----- 用例：(名称, 参考实现, 当前实现, 输入生成器) -----
+def _cases() -> dict[str, tuple]:
+    wbi_keys = ("7cd084941338484aae1ad9425b84077c", "4932caff0ff746eab6f01bf08b70ac45")
+    return {
+        "hex_digest": (
+            ref_hex_digest, netease._hex_digest,
+            lambda rng: (rng.randbytes(rng.choice([16, 256, 1024])),),
+        ),
+        "encrypt_params": (
+            ref_encrypt_params, netease._encrypt_params,
+            lambda rng: (rng.choice(["/eapi/search/get", "/eapi/song/enhance/player/url/v1"]), _search_payload(rng)),
+        ),
+        "get_mixin_key": (
+            ref_get_mixin_key, bilibili._get_mixin_key.__wrapped__,
+            lambda rng: (_random_text(rng, 64, string.hexdigits.lower()),),
+        ),
+        "enc_wbi": (
+            ref_enc_wbi, bilibili._enc_wbi,
+            lambda rng: (_playurl_params(rng), *wbi_keys, rng.randint(1_600_000_000, 1_900_000_000)),
+        ),
+        "share_url": (
+            ref_share_url, lambda text: (m.group(0) if (m := douyin._SHARE_URL_RE.search(text)) else None),
+            lambda rng: (_share_text(rng),),
+        ),
+        "router_data": (
+            ref_router_data, douyin._extract_router_data,
+            lambda rng: (_share_page(rng, 200 * 1024),),
+        ),
+    }
+
+
+def validate(name: str, ref, cur, make_args, samples: int) -> None:
+    rng = random.Random(name)
+    for _ in range(samples):
+        args = make_args(rng)
+        expected, actual = ref(*args), cur(*args)
+        if expected != actual:
+            raise AssertionError(f"{name}: 输出不一致\n  输入 {args!r:.200}\n  参考 {expected!r:.200}\n  当前 {actual!r:.200}")
+
+
+def measure(fn, args: tuple, rounds: int) -> float:
+    """单次调用耗时（秒）：自动确定每轮次数（约 0.2 秒），取各轮最小值。"""
+    timer = timeit.Timer(lambda: fn(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=rounds, number=number)) / number
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """返回回退说明列表：当前实现单次耗时比基线上升超过 tolerance（比例）。"""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if base and base.get("current_us") and cur["current_us"] > base["current_us"] * (1 + tolerance):
+            regressions.append(f"{key}: {cur['current_us']} us > 基线 {base['current_us']} us")
+    return regressions
+
+
+def main() -> int:
+    cases = _cases()
+    parser = argparse.ArgumentParser(description="CPU 热点微基准（签名、加密、分享页解析）")
+    parser.add_argument("--cases", default=",".join(cases), help="逗号分隔的用例")
+    parser.add_argument("--rounds", type=int, default=5, help="计时轮数，取最小值")
+    parser.add_argument("--samples", type=int, default=200, help="校验输出一致性的随机输入数")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="回退判定阈值（比例），默认 0.3")
+    args = parser.parse_args()
+
+    names = [c.strip() for c in args.cases.split(",") if c.strip()]
+    results: dict[str, dict] = {}
+    print(f"{'用例':<16}{'参考 us':>12}{'当前 us':>12}{'加速':>8}")
+    for name in names:
+        ref, cur, make_args = cases[name]
+        try:
+            validate(name, ref, cur, make_args, args.samples)
+        except AssertionError as e:
+            print(e, file=sys.stderr)
+            return 2
+        sample = make_args(random.Random(f"{name}-bench"))
+        ref_s, cur_s = measure(ref, sample, args.rounds), measure(cur, sample, args.rounds)
+        results[name] = {
+            "reference_us": round(ref_s * 1e6, 3),
+            "current_us": round(cur_s * 1e6, 3),
+            "speedup": round(ref_s / cur_s, 2) if cur_s > 0 else None,
+        }
+        r = results[name]
+        print(f"{name:<16}{r['reference_us']:>12}{r['current_us']:>12}{r['speedup']:>7}x")
+
+    report = {"meta": {"python": sys.version.split()[0], "rounds": args.rounds, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
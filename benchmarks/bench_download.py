@@ -0,0 +1,145 @@
+"""
+下载吞吐基准：cloudreve_download_file 对本地假 Cloudreve v4 在不同文件大小与区间并发数下的 MB/s、单次耗时 p50/p99、峰值 RSS。
+每次下载都带 sha256 校验和（由假服务的内容函数算出），同时验证内容正确。
+
+  python -m benchmarks.bench_download                                         # 默认矩阵
+  python -m benchmarks.bench_download --sizes 64,256 --concurrency 1,4,8,16
+  python -m benchmarks.bench_download --store-bandwidth 20000000              # 每个连接限速 20 MB/s，体现区间并发的收益
+  python -m benchmarks.bench_download --url-ttl 0.5 --sizes 64                # 下载地址半秒过期，测地址刷新
+  python -m benchmarks.bench_download --save-baseline benchmarks/baselines/download.json
+  python -m benchmarks.bench_download --baseline benchmarks/baselines/download.json   # 回退超过阈值时退出码 1
+
+每个 (大小, 并发) 组合在独立子进程中运行，峰值 RSS 互不影响；假服务运行在父进程中。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_upload import MIB, _peak_rss_mb, _post_json, compare, percentile
+
+
+def _expected_sha256(size: int) -> str:
+    from benchmarks.fake_cloudreve import content
+
+    h = hashlib.sha256()
+    for offset in range(0, size, 8 * MIB):
+        h.update(content(offset, min(8 * MIB, size - offset)))
+    return h.hexdigest()
+
+
+def run_case(base_url: str, size: int, concurrency: int, repeat: int, checksum: str) -> dict:
+    out_dir = tempfile.mkdtemp(prefix="bench-download-")
+    os.environ["CLOUDREVE_BASE_URL"] = f"{base_url}/api/v4"
+    os.environ["MCP_DOWNLOAD_DIR"] = out_dir
+    from mcp_cloudreve import cloudreve, server
+
+    signed = cloudreve.password_sign_in("bench@example.com", "bench")
+    token = signed["token"]
+    rss_before = _peak_rss_mb()
+    durations: list[float] = []
+    refreshes = 0
+    try:
+        for i in range(repeat):
+            path = os.path.join(out_dir, f"{i}.bin")
+            start = time.perf_counter()
+            out = json.loads(server.cloudreve_download_file(
+                access_token=token["access_token"], refresh_token=token["refresh_token"],
+                uri=f"cloudreve://my/bench/{size}.bin", local_path=path,
+                checksum=f"sha256:{checksum}", concurrency=concurrency,
+            ))
+            durations.append(time.perf_counter() - start)
+            if out.get("status") != "success":
+                raise RuntimeError(json.dumps(out, ensure_ascii=False))
+            refreshes += out.get("url_refreshes", 0)
+            os.unlink(path)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    total = sum(durations)
+    return {
+        "mb_per_s": round(size * len(durations) / MIB / total, 2) if total > 0 else None,
+        "run_p50_s": round(percentile(durations, 50), 4),
+        "run_p99_s": round(percentile(durations, 99), 4),
+        "url_refreshes": refreshes,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cloudreve 下载吞吐基准（本地假服务）")
+    parser.add_argument("--sizes", default="16,128", help="文件大小（MiB），逗号分隔")
+    parser.add_argument("--concurrency", default="1,4,8", help="区间并发数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="假服务 API 请求的额外延迟（秒）")
+    parser.add_argument("--store-bandwidth", type=int, default=0, help="每个下载连接的带宽上限（字节/秒，0 不限）")
+    parser.add_argument("--url-ttl", type=float, default=0.0, help="临时下载地址有效期（秒，0 不过期）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回退判定阈值（比例），默认 0.2")
+    parser.add_argument("--child", nargs=5, metavar=("BASE_URL", "SIZE", "CONCURRENCY", "REPEAT", "SHA256"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        base_url, size, concurrency, repeat, checksum = args.child
+        print(json.dumps(run_case(base_url, int(size), int(concurrency), int(repeat), checksum)))
+        return 0
+
+    from benchmarks.fake_cloudreve import FakeCloudreve, FakeConfig
+    from benchmarks.serve import BackgroundServer
+
+    sizes = [int(float(s) * MIB) for s in args.sizes.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    fake = FakeCloudreve(FakeConfig(
+        latency=args.latency, store_bandwidth=args.store_bandwidth, url_ttl=args.url_ttl,
+    ))
+    results: dict[str, dict] = {}
+    with BackgroundServer(fake.app) as base_url:
+        _post_json(f"{base_url}/_bench/files", {f"cloudreve://my/bench/{size}.bin": size for size in sizes})
+        print(f"{'大小MiB':>8}{'并发':>6}{'MB/s':>10}{'p50 s':>9}{'p99 s':>9}{'地址刷新':>9}{'峰值RSS':>9}")
+        for size in sizes:
+            checksum = _expected_sha256(size)
+            for concurrency in levels:
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_download", "--child",
+                     base_url, str(size), str(concurrency), str(args.repeat), checksum],
+                    capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    print(proc.stderr, file=sys.stderr)
+                    raise SystemExit(f"size={size} concurrency={concurrency} 失败")
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                results[f"{size // MIB}MiB/c{concurrency}"] = r
+                print(f"{size / MIB:>8g}{concurrency:>6}{r['mb_per_s']:>10}{r['run_p50_s']:>9}{r['run_p99_s']:>9}"
+                      f"{r['url_refreshes']:>9}{r['peak_rss_mb']:>9}")
+
+    report = {"meta": {
+        "python": sys.version.split()[0], "latency": args.latency, "repeat": args.repeat,
+        "store_bandwidth": args.store_bandwidth, "url_ttl": args.url_ttl,
+    }, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+端到端入库基准：入库工具对本地假上游（benchmarks.fake_upstreams）与假 Cloudreve 运行，
+测量每种场景的总耗时 p50/p99、MB/s、各阶段（parse/download/upload/link…）耗时占比与峰值 RSS。
+
+  python -m benchmarks.bench_ingest                                    # 默认全部场景
+  python -m benchmarks.bench_ingest --scenarios douyin,netease --repeat 5
+  python -m benchmarks.bench_ingest --bandwidth 20000000 --latency 0.02   # 模拟上游限速与接口延迟
+  python -m benchmarks.bench_ingest --drop-at 1048576 --scenarios netease,bilibili   # 每个媒体 URL 首次下载在 1 MiB 处断流，测续传/重试
+  python -m benchmarks.bench_ingest --save-baseline benchmarks/baselines/ingest.json
+  python -m benchmarks.bench_ingest --baseline benchmarks/baselines/ingest.json   # 回退超过阈值时退出码 1
+
+场景（--scenarios）：
+  douyin           cloudreve_upload_douyin_video
+  bilibili         cloudreve_upload_bilibili_video（单 P；有 ffmpeg 时为 DASH + 合并，否则单段 durl）
+  bilibili_pages   cloudreve_upload_bilibili_video，pages="all"（分 P 数见 --pages）
+  netease          cloudreve_upload_netease_song（落盘 + 嵌封面）
+  netease_stream   cloudreve_upload_netease_song，stream_upload=True
+  netease_m4a      cloudreve_upload_netease_song，歌曲为 M4A（下载后补嵌封面，大小变化，取消提前创建的会话后重建）
+  playlist         cloudreve_upload_netease_playlist（曲目数见 --tracks）
+  douyin_fetch     cloudreve_upload_douyin_video，server_fetch=True（假 Cloudreve 的离线下载直接拉取假上游）
+  netease_fetch    cloudreve_upload_netease_song，server_fetch=True
+  douyin_dup       每轮经 FastMCP 的 call_tool 同时发起 4 个相同的 cloudreve_upload_douyin_video（应只传输一次，其余合并到进行中的任务）
+  netease_dup      每轮经 call_tool 同时发起 4 个相同的 cloudreve_upload_netease_song
+
+每个场景在独立子进程中运行（各模块在导入时读取上游地址，且峰值 RSS 互不影响），每轮使用不同的视频/歌曲 ID，
+避免命中进程内缓存；封面磁盘缓存指向临时目录。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_upload import MIB, _peak_rss_mb, _post_json, compare, percentile
+
+SCENARIOS = (
+    "douyin", "bilibili", "bilibili_pages", "netease", "netease_stream", "netease_m4a", "playlist", "douyin_fetch",
+    "netease_fetch", "douyin_dup", "netease_dup",
+)
+# *_dup 场景每轮同时发起的相同调用数
+_DUPLICATES = 4
+
+
+def _merge_stages(into: dict, stages: dict) -> None:
+    for name, st in stages.items():
+        agg = into.setdefault(name, {"seconds": 0.0, "bytes": 0, "count": 0})
+        agg["seconds"] += st.get("seconds", 0.0)
+        agg["bytes"] += st.get("bytes", 0)
+        agg["count"] += st.get("count", 0)
+
+
+def _tool_text(result) -> str:
+    """FastMCP.call_tool 的返回（内容列表，或带结构化结果时的 (内容列表, 结构化结果)）→ 工具返回的文本。"""
+    content = result[0] if isinstance(result, tuple) else result
+    return content[0].text
+
+
+# ----- 子进程：调用入库工具并输出一行 JSON -----
+def run_scenario(cloudreve_url: str, upstream_url: str, scenario: str, repeat: int, tracks: int) -> dict:
+    from benchmarks.fake_upstreams import FakeUpstreams
+
+    os.environ["CLOUDREVE_BASE_URL"] = f"{cloudreve_url}/api/v4"
+    os.environ.update(FakeUpstreams.env_for(upstream_url))
+    cache_dir = tempfile.mkdtemp(prefix="bench-covers-")
+    os.environ["NETEASE_COVER_CACHE_DIR"] = cache_dir
+    # 假 Cloudreve 的离线下载在本机完成，缩短轮询间隔以免轮询本身主导耗时
+    os.environ.setdefault("CLOUDREVE_REMOTE_POLL_INTERVAL", "0.05")
+    from mcp_cloudreve import cloudreve, server
+    from benchmarks.fake_cloudreve import POLICY_ID
+
+    signed = cloudreve.password_sign_in("bench@example.com", "bench")
+    access_token = signed["token"]["access_token"]
+    refresh_token = signed["token"]["refresh_token"]
+    common = {"access_token": access_token, "policy_id": POLICY_ID, "refresh_token": refresh_token, "timings": True}
+    rss_before = _peak_rss_mb()
+    durations: list[float] = []
+    total_bytes = 0
+    stages: dict[str, dict] = {}
+    retries = refreshes = coalesced = 0
+
+    def call(i: int) -> tuple[str, dict]:
+        """第 i 轮要调用的 (工具名, 参数)。"""
+        if scenario in ("douyin", "douyin_fetch", "douyin_dup"):
+            offset = {"douyin": 0, "douyin_fetch": 500, "douyin_dup": 800}[scenario]
+            return "cloudreve_upload_douyin_video", {
+                "douyin_share_link": f"看看 {upstream_url}/douyin/s/{i + 1 + offset} 复制此链接",
+                "server_fetch": scenario == "douyin_fetch", **common,
+            }
+        if scenario in ("bilibili", "bilibili_pages"):
+            bvid = f"BV1{'bp' if scenario == 'bilibili_pages' else 'bs'}{i:06d}"
+            return "cloudreve_upload_bilibili_video", {
+                "bilibili_share_link": f"{upstream_url}/bilibili/video/{bvid}",
+                "pages": "all" if scenario == "bilibili_pages" else "", **common,
+            }
+        if scenario in ("netease", "netease_stream", "netease_m4a", "netease_fetch", "netease_dup"):
+            # 不同专辑（ID // 100），避免封面命中缓存
+            offset = {"netease": 0, "netease_stream": 500, "netease_m4a": 750, "netease_fetch": 1000, "netease_dup": 1500}[scenario]
+            song_id = (3000 + i + offset) * 100
+            return "cloudreve_upload_netease_song", {
+                "keyword_or_song_id": str(song_id), "stream_upload": scenario == "netease_stream",
+                "server_fetch": scenario == "netease_fetch", **common,
+            }
+        if scenario == "playlist":
+            return "cloudreve_upload_netease_playlist", {"playlist_or_album": str((7000 + i) * 1000 + tracks), **common}
+        raise ValueError(f"未知的场景 {scenario}")
+
+    async def call_duplicates(name: str, arguments: dict) -> list[str]:
+        # 与线上请求相同的调度路径：FastMCP 在事件循环中并发处理，工具在工作线程中执行
+        results = await asyncio.gather(*(server.mcp.call_tool(name, arguments) for _ in range(_DUPLICATES)))
+        return [_tool_text(r) for r in results]
+
+    try:
+        for i in range(repeat):
+            start = time.perf_counter()
+            name, arguments = call(i)
+            if scenario.endswith("_dup"):
+                outs = asyncio.run(call_duplicates(name, arguments))
+            else:
+                outs = [getattr(server, name)(**arguments)]
+            durations.append(time.perf_counter() - start)
+            for out in outs:
+                result = json.loads(out)
+                if result.get("status") == "error" or "server_fetch_error" in result:
+                    raise RuntimeError(out)
+                coalesced += bool(result.get("coalesced"))
+                summary = result.get("timings") or {}
+                _merge_stages(stages, summary.get("stages") or {})
+                retries += summary.get("retries", 0)
+                refreshes += summary.get("token_refreshes", 0)
+                # 落盘路径记在 upload 阶段，流式路径记在 stream 阶段，服务端拉取记在 fetch 阶段；合并的调用没有传输字节
+                total_bytes += sum(
+                    (summary.get("stages") or {}).get(name, {}).get("bytes", 0) for name in ("upload", "stream", "fetch")
+                )
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    total = sum(durations)
+    stage_seconds = sum(st["seconds"] for st in stages.values()) or 1.0
+    return {
+        "mb_per_s": round(total_bytes / MIB / total, 2) if total > 0 and total_bytes else None,
+        "run_p50_s": round(percentile(durations, 50), 4),
+        "run_p99_s": round(percentile(durations, 99), 4),
+        "bytes_per_run": total_bytes // max(1, len(durations)),
+        "stages": {
+            name: {
+                "seconds_per_run": round(st["seconds"] / max(1, len(durations)), 4),
+                "share": round(st["seconds"] / stage_seconds, 3),
+                "bytes_per_run": st["bytes"] // max(1, len(durations)),
+            }
+            for name, st in sorted(stages.items(), key=lambda kv: -kv[1]["seconds"])
+        },
+        "retries": retries,
+        "token_refreshes": refreshes,
+        "coalesced": coalesced,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+# ----- 父进程：启动两个假服务、遍历场景、汇总与对比基线 -----
+def main() -> int:
+    parser = argparse.ArgumentParser(description="端到端入库基准（本地假上游 + 假 Cloudreve）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--douyin-size", type=float, default=16, help="抖音视频大小（MiB）")
+    parser.add_argument("--netease-size", type=float, default=8, help="网易云歌曲大小（MiB）")
+    parser.add_argument("--bilibili-size", type=float, default=16, help="durl 模式下哔哩哔哩视频大小（MiB）")
+    parser.add_argument("--bilibili-seconds", type=int, default=10, help="DASH 模式下生成的视频时长（秒）")
+    parser.add_argument("--pages", type=int, default=4, help="bilibili_pages 场景的分 P 数")
+    parser.add_argument("--tracks", type=int, default=8, help="playlist 场景的曲目数")
+    parser.add_argument("--bandwidth", type=int, default=0, help="假上游媒体限速（字节/秒，0 不限）")
+    parser.add_argument("--latency", type=float, default=0.0, help="假上游接口与假 Cloudreve 每个请求的额外延迟（秒）")
+    parser.add_argument("--drop-at", type=int, default=0, help="媒体下载在该偏移处断流（字节，0 关闭）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回退判定阈值（比例），默认 0.2")
+    parser.add_argument("--child", nargs=5, metavar=("CLOUDREVE", "UPSTREAM", "SCENARIO", "REPEAT", "TRACKS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        cloudreve_url, upstream_url, scenario, repeat, tracks = args.child
+        print(json.dumps(run_scenario(cloudreve_url, upstream_url, scenario, int(repeat), int(tracks))))
+        return 0
+
+    from benchmarks.fake_cloudreve import FakeCloudreve, FakeConfig
+    from benchmarks.fake_upstreams import FakeUpstreams, UpstreamConfig
+    from benchmarks.serve import BackgroundServer
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    upstreams = FakeUpstreams(UpstreamConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        media_drop_at=args.drop_at,
+        douyin_size=int(args.douyin_size * MIB),
+        netease_size=int(args.netease_size * MIB),
+        bilibili_size=int(args.bilibili_size * MIB),
+        bilibili_seconds=args.bilibili_seconds,
+        bilibili_pages=1,
+    ))
+    fake = FakeCloudreve(FakeConfig(latency=args.latency))
+    results: dict[str, dict] = {}
+    with BackgroundServer(fake.app) as cloudreve_url, BackgroundServer(upstreams.app) as upstream_url:
+        if args.drop_at:
+            # 模拟断流会让 uvicorn 打印异常栈，属预期行为
+            logging.getLogger("uvicorn.error").setLevel(logging.CRITICAL)
+        print(f"{'场景':<16}{'MB/s':>10}{'p50 s':>9}{'p99 s':>9}{'峰值RSS':>9}  阶段占比")
+        for scenario in scenarios:
+            _post_json(f"{upstream_url}/_bench/config", {
+                "bilibili_pages": args.pages if scenario == "bilibili_pages" else 1,
+                "netease_format": "m4a" if scenario == "netease_m4a" else "mp3",
+            })
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingest", "--child", cloudreve_url, upstream_url,
+                 scenario, str(args.repeat), str(args.tracks)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                raise SystemExit(f"{scenario} 失败")
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results[scenario] = r
+            shares = " ".join(f"{name}={st['share']:.0%}" for name, st in r["stages"].items())
+            print(f"{scenario:<16}{str(r['mb_per_s']):>10}{r['run_p50_s']:>9}{r['run_p99_s']:>9}{r['peak_rss_mb']:>9}  {shares}")
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "ffmpeg": bool(shutil.which("ffmpeg")),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "bandwidth": args.bandwidth,
+            "drop_at": args.drop_at,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+文件夹列表与元数据缓存基准：cloudreve_list_files / cloudreve_file_exists 对本地假 Cloudreve v4，依次测量
+首次列出（拉取全部页）、新鲜期内再次列出（命中缓存）、过了新鲜期后列出（只请求一页重验证）的耗时与请求数，
+以及批量存在性检查在无缓存、有文件夹列表缓存时的请求数。
+
+  python -m benchmarks.bench_list                               # 默认 5000 个文件
+  python -m benchmarks.bench_list --files 50000 --latency 0.02  # 接口延迟 20 ms 时缓存的收益更明显
+  python -m benchmarks.bench_list --baseline benchmarks/baselines/list.json   # 耗时回退超过阈值时退出码 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.bench_upload import _post_json
+
+_FOLDER = "cloudreve://my/bench-list"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="文件夹列表与元数据缓存基准（本地假服务）")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--checks", type=int, default=200, help="存在性检查的 URI 数（一半存在）")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--ttl", type=float, default=0.5, help="缓存新鲜期（秒）")
+    parser.add_argument("--latency", type=float, default=0.0, help="假服务每个请求的额外延迟（秒）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="回退判定阈值（比例），默认 0.3")
+    args = parser.parse_args()
+
+    os.environ["CLOUDREVE_LIST_PAGE_SIZE"] = str(args.page_size)
+    os.environ["CLOUDREVE_LIST_CACHE_TTL"] = str(args.ttl)
+    from benchmarks.fake_cloudreve import FakeCloudreve, FakeConfig
+    from benchmarks.serve import BackgroundServer
+
+    fake = FakeCloudreve(FakeConfig(latency=args.latency))
+    results: dict[str, dict] = {}
+    with BackgroundServer(fake.app) as base_url:
+        os.environ["CLOUDREVE_BASE_URL"] = f"{base_url}/api/v4"
+        from mcp_cloudreve import cloudreve, server
+
+        _post_json(f"{base_url}/_bench/files", {f"{_FOLDER}/f{i:07d}.bin": 1024 for i in range(args.files)})
+        checks = [f"{_FOLDER}/f{i:07d}.bin" for i in range(0, args.checks, 2)]
+        checks += [f"{_FOLDER}/missing{i:07d}.bin" for i in range(1, args.checks, 2)]
+
+        def run(name: str, tool, token: dict, **kwargs) -> dict:
+            before = sum(v for k, v in fake.stats.items() if k.startswith("requests."))
+            t0 = time.perf_counter()
+            out = json.loads(tool(access_token=token["access_token"], refresh_token=token["refresh_token"], **kwargs))
+            seconds = time.perf_counter() - t0
+            if out.get("status") != "success":
+                raise SystemExit(f"{name} 失败：{json.dumps(out, ensure_ascii=False)[:2000]}")
+            requests = sum(v for k, v in fake.stats.items() if k.startswith("requests.")) - before
+            results[name] = {"seconds": round(seconds, 4), "requests": requests}
+            print(f"{name:<18}{seconds:>9.4f}s  请求 {requests:>6}  {out.get('source', '')}")
+            return out
+
+        token = cloudreve.password_sign_in("bench@example.com", "bench")["token"]
+        run("list_cold", server.cloudreve_list_files, token, folder_uri=_FOLDER, limit=0)
+        run("list_cached", server.cloudreve_list_files, token, folder_uri=_FOLDER, limit=0)
+        time.sleep(args.ttl)
+        run("list_revalidated", server.cloudreve_list_files, token, folder_uri=_FOLDER, limit=0)
+        run("exists_listed", server.cloudreve_file_exists, token, uris=checks)
+        # 换一个令牌即换一个缓存空间：没有文件夹列表缓存时的存在性检查
+        other = cloudreve.password_sign_in("bench@example.com", "bench")["token"]
+        run("exists_cold", server.cloudreve_file_exists, other, uris=checks[:3])
+        run("exists_cached", server.cloudreve_file_exists, other, uris=checks[:3])
+
+    report = {"meta": {
+        "python": sys.version.split()[0], "files": args.files, "checks": args.checks,
+        "page_size": args.page_size, "ttl": args.ttl, "latency": args.latency,
+    }, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = [
+            f"{name}: {cur['seconds']}s > 基线 {baseline[name]['seconds']}s"
+            for name, cur in results.items()
+            if name in baseline and cur["seconds"] > baseline[name]["seconds"] * (1 + args.tolerance)
+        ]
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+冷启动基准与导入耗时预算：每次在全新解释器中测量
+
+  framework_ms   import mcp.server.fastmcp（MCP/Starlette 框架本身，本项目无法缩短的下限）
+  server_ms      其后再 import mcp_cloudreve.server 的增量（本项目模块 + 工具注册）
+  ready_ms       python -m mcp_cloudreve 从启动进程到端口可连接的总耗时
+
+并检查导入 server 后平台模块与重依赖（douyin/bilibili/netease、cryptography、mutagen、httpcore）尚未加载——
+它们应在入库工具首次调用时才导入。
+
+  python -m benchmarks.bench_startup                      # 默认 7 次取中位数，server_ms 预算 100 ms
+  python -m benchmarks.bench_startup --runs 15 --budget-ms 80
+  python -m benchmarks.bench_startup --save-baseline benchmarks/baselines/startup.json
+  python -m benchmarks.bench_startup --baseline benchmarks/baselines/startup.json
+
+超出预算、提前加载了重模块或相对基线回退超过阈值时退出码为 1。
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+# 导入 server 后不应出现在 sys.modules 中的模块
+LAZY_MODULES = (
+    "mcp_cloudreve.douyin",
+    "mcp_cloudreve.bilibili",
+    "mcp_cloudreve.netease",
+    "cryptography",
+    "mutagen",
+    "httpcore",
+)
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import mcp.server.fastmcp
+t1 = time.perf_counter()
+import mcp_cloudreve.server
+t2 = time.perf_counter()
+print(json.dumps({
+    "framework_ms": (t1 - t0) * 1000,
+    "server_ms": (t2 - t1) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import() -> dict:
+    proc = subprocess.run([sys.executable, "-c", _PROBE], capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_ready(timeout: float = 30.0) -> float:
+    """启动 python -m mcp_cloudreve，轮询直到端口可连接，返回毫秒数。"""
+    port = _free_port()
+    env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port)}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "mcp_cloudreve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"服务进程提前退出，退出码 {proc.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                    return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"{timeout} 秒内端口 {port} 未就绪")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="冷启动与导入耗时预算")
+    parser.add_argument("--runs", type=int, default=7, help="每项测量次数，取中位数")
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="server_ms 中位数上限（毫秒）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="回退判定阈值（比例），默认 0.3")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    ready = [measure_ready() for _ in range(args.runs)]
+    loaded = sorted({m for r in imports for m in r["loaded"]})
+    results = {
+        "framework_ms": round(statistics.median(r["framework_ms"] for r in imports), 1),
+        "server_ms": round(statistics.median(r["server_ms"] for r in imports), 1),
+        "ready_ms": round(statistics.median(ready), 1),
+        "ready_max_ms": round(max(ready), 1),
+    }
+    for key, value in results.items():
+        print(f"{key:<14}{value:>10}")
+
+    failures = []
+    if results["server_ms"] > args.budget_ms:
+        failures.append(f"server_ms {results['server_ms']} ms 超出预算 {args.budget_ms} ms")
+    if loaded:
+        failures.append(f"导入 server 时提前加载了 {', '.join(loaded)}")
+
+    report = {"meta": {"python": sys.version.split()[0], "runs": args.runs, "budget_ms": args.budget_ms}, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        for key in ("server_ms", "ready_ms"):
+            if baseline.get(key) and results[key] > baseline[key] * (1 + args.tolerance):
+                failures.append(f"{key} {results[key]} ms > 基线 {baseline[key]} ms")
+    for line in failures:
+        print(f"失败：{line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
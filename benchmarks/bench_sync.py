@@ -0,0 +1,131 @@
+"""
+目录增量同步基准：cloudreve_sync_directory 对本地假 Cloudreve v4，依次测量
+首次同步（全部上传）、未变化时重新同步、修改一部分文件后重新同步的耗时、上传文件数与请求数。
+
+  python -m benchmarks.bench_sync                              # 默认 10000 个文件
+  python -m benchmarks.bench_sync --files 100000 --size 256    # 10 万个小文件
+  python -m benchmarks.bench_sync --touch 0.01 --hash          # 1% 文件只改 mtime、开启 sha256：不应重传
+  python -m benchmarks.bench_sync --baseline benchmarks/baselines/sync.json   # 重新同步耗时回退超过阈值时退出码 1
+
+目录树为 --dirs 个子目录平均分布；清单写在临时目录中，结束后删除。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_upload import _peak_rss_mb
+
+
+def _make_tree(root: str, files: int, dirs: int, size: int) -> list[str]:
+    paths = []
+    block = os.urandom(size)
+    for i in range(files):
+        rel = os.path.join(f"d{i % dirs:04d}", f"sub{(i // dirs) % 4}", f"f{i:07d}.bin")
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(block)
+        paths.append(path)
+    return paths
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="目录增量同步基准（本地假服务）")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--size", type=int, default=1024, help="每个文件的字节数")
+    parser.add_argument("--modify", type=float, default=0.01, help="第三轮修改内容的文件比例")
+    parser.add_argument("--touch", type=float, default=0.0, help="第三轮只更新 mtime 的文件比例（配合 --hash）")
+    parser.add_argument("--hash", action="store_true", help="开启 hash_files")
+    parser.add_argument("--concurrency", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="假服务每个请求的额外延迟（秒）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="回退判定阈值（比例），默认 0.3")
+    args = parser.parse_args()
+
+    from benchmarks.fake_cloudreve import POLICY_ID, FakeCloudreve, FakeConfig
+    from benchmarks.serve import BackgroundServer
+
+    work = tempfile.mkdtemp(prefix="bench-sync-")
+    root = os.path.join(work, "tree")
+    manifest = os.path.join(work, "manifest.json")
+    fake = FakeCloudreve(FakeConfig(latency=args.latency))
+    results: dict[str, dict] = {}
+    try:
+        start = time.perf_counter()
+        paths = _make_tree(root, args.files, args.dirs, args.size)
+        print(f"生成 {args.files} 个文件：{time.perf_counter() - start:.1f}s")
+        with BackgroundServer(fake.app) as base_url:
+            os.environ["CLOUDREVE_BASE_URL"] = f"{base_url}/api/v4"
+            from mcp_cloudreve import cloudreve, server
+
+            token = cloudreve.password_sign_in("bench@example.com", "bench")["token"]
+
+            def run(name: str) -> None:
+                before = sum(v for k, v in fake.stats.items() if k.startswith("requests."))
+                t0 = time.perf_counter()
+                out = json.loads(server.cloudreve_sync_directory(
+                    access_token=token["access_token"], refresh_token=token["refresh_token"],
+                    local_dir=root, remote_folder_uri="cloudreve://my/bench-sync", policy_id=POLICY_ID,
+                    manifest_path=manifest, hash_files=args.hash, concurrency=args.concurrency,
+                ))
+                seconds = time.perf_counter() - t0
+                if out.get("status") != "success":
+                    raise SystemExit(f"{name} 失败：{json.dumps(out, ensure_ascii=False)[:2000]}")
+                requests = sum(v for k, v in fake.stats.items() if k.startswith("requests.")) - before
+                results[name] = {
+                    "seconds": round(seconds, 3),
+                    "uploaded": out["uploaded_count"],
+                    "unchanged": out["unchanged"],
+                    "requests": requests,
+                }
+                print(f"{name:<10}{seconds:>9.3f}s  上传 {out['uploaded_count']:>7}  未变 {out['unchanged']:>7}  请求 {requests:>7}")
+
+            run("initial")
+            run("unchanged")
+            step = max(1, int(1 / args.modify)) if args.modify > 0 else 0
+            for path in paths[::step] if step else []:
+                with open(path, "ab") as f:
+                    f.write(b"x")
+            touch_step = max(1, int(1 / args.touch)) if args.touch > 0 else 0
+            for path in paths[1::touch_step] if touch_step else []:
+                st = os.stat(path)
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            run("modified")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {"meta": {
+        "python": sys.version.split()[0], "files": args.files, "size": args.size, "hash": args.hash,
+        "modify": args.modify, "touch": args.touch, "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = [
+            f"{name}: {cur['seconds']}s > 基线 {baseline[name]['seconds']}s"
+            for name, cur in results.items()
+            if name in baseline and cur["seconds"] > baseline[name]["seconds"] * (1 + args.tolerance)
+        ]
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+上传吞吐基准：对本地假 Cloudreve v4 测量各上传路径在不同文件大小、分块大小下的 MB/s、单次耗时与分块请求的 p50/p99、峰值 RSS。
+
+  python -m benchmarks.bench_upload                                   # 默认矩阵
+  python -m benchmarks.bench_upload --sizes 1,64 --chunks 1,5 --repeat 5
+  python -m benchmarks.bench_upload --latency 0.005 --output out.json
+  python -m benchmarks.bench_upload --policy-type s3 --store-latency 0.02       # 直传 S3 兼容存储（分片并行）
+  python -m benchmarks.bench_upload --save-baseline benchmarks/baselines/upload.json
+  python -m benchmarks.bench_upload --baseline benchmarks/baselines/upload.json   # 回退超过阈值时退出码 1
+
+上传路径（--targets）：
+  upload_file     cloudreve_upload_file 工具（经分块缓冲池 readinto 后分块上传）
+  upload_path     pipeline.upload_path（入库工具下载完成后的上传）
+  prepared        pipeline.PreparedUpload（后台建目录/查策略、按大小提前建会话）
+  upload_stream   pipeline.upload_stream（边读边传，不落盘）
+
+--policy-type 为 s3 / onedrive / remote 时假服务返回直传信息，分块绕过 Cloudreve 直接发往模拟的后端存储；
+--store-latency 模拟存储端每个请求的延迟，用于对比中转与并行直传。
+
+每个 (路径, 大小, 分块) 组合在独立子进程中运行，峰值 RSS 互不影响；假服务运行在父进程中。
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+MIB = 1024 * 1024
+TARGETS = ("upload_file", "upload_path", "prepared", "upload_stream")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩百分位。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KiB，macOS 为字节
+    return rss / MIB if sys.platform == "darwin" else rss / 1024
+
+
+def _make_file(size: int) -> str:
+    fd, path = tempfile.mkstemp(prefix="bench-upload-", suffix=".bin")
+    block = os.urandom(min(size, MIB)) if size else b""
+    with os.fdopen(fd, "wb") as f:
+        left = size
+        while left > 0:
+            f.write(block[:left])
+            left -= len(block)
+    return path
+
+
+def _iter_file(path: str, chunk: int = 65536):
+    with open(path, "rb") as f:
+        while data := f.read(chunk):
+            yield data
+
+
+# ----- 子进程：实际执行上传并输出一行 JSON -----
+def run_case(base_url: str, target: str, size: int, repeat: int) -> dict:
+    os.environ["CLOUDREVE_BASE_URL"] = f"{base_url}/api/v4"
+    from mcp_cloudreve import cloudreve, pipeline, server, uploaders
+    from benchmarks.fake_cloudreve import POLICY_ID
+
+    chunk_latencies: list[float] = []
+
+    def timed(fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                chunk_latencies.append(time.perf_counter() - start)
+        return wrapper
+
+    # 中转时计 Cloudreve 分块请求，直传时计发往存储的分片请求（含合并请求）
+    cloudreve.upload_file_chunk = timed(cloudreve.upload_file_chunk)
+    uploaders._with_retry = timed(uploaders._with_retry)
+
+    signed = cloudreve.password_sign_in("bench@example.com", "bench")
+    access_token = signed["token"]["access_token"]
+    refresh_token = signed["token"]["refresh_token"]
+    path = _make_file(size)
+    rss_before = _peak_rss_mb()
+    durations: list[float] = []
+    try:
+        for i in range(repeat):
+            uri = f"cloudreve://my/bench/{target}-{size}-{i}.bin"
+            tokens = pipeline.TokenState(access_token, refresh_token)
+            start = time.perf_counter()
+            if target == "upload_file":
+                out = server.cloudreve_upload_file(
+                    access_token, uri, POLICY_ID, file_path=path, refresh_token=refresh_token,
+                )
+                if not out.startswith("上传完成"):
+                    raise RuntimeError(out)
+            elif target == "upload_path":
+                pipeline.upload_path(tokens, uri, path, POLICY_ID)
+            elif target == "prepared":
+                prepared = pipeline.PreparedUpload(tokens, uri, POLICY_ID, folder="cloudreve://my/bench")
+                prepared.on_size(size)
+                prepared.upload_path(path)
+            elif target == "upload_stream":
+                pipeline.upload_stream(tokens, uri, _iter_file(path), size, POLICY_ID)
+            else:
+                raise ValueError(f"未知的上传路径 {target}")
+            durations.append(time.perf_counter() - start)
+    finally:
+        os.unlink(path)
+    total = sum(durations)
+    return {
+        "mb_per_s": round(size * len(durations) / MIB / total, 2) if total > 0 else None,
+        "run_p50_s": round(percentile(durations, 50), 4),
+        "run_p99_s": round(percentile(durations, 99), 4),
+        "chunk_p50_ms": round(percentile(chunk_latencies, 50) * 1000, 2),
+        "chunk_p99_ms": round(percentile(chunk_latencies, 99) * 1000, 2),
+        "chunks_per_run": len(chunk_latencies) // max(1, len(durations)),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+    }
+
+
+# ----- 父进程：启动假服务、遍历矩阵、汇总与对比基线 -----
+def _post_json(url: str, payload: dict) -> dict:
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST",
+    )
+    with urllib.request.urlopen(req) as r:
+        return json.loads(r.read())
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """返回回退说明列表：吞吐下降或峰值 RSS 上升超过 tolerance（比例）。"""
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base.get("mb_per_s") and cur.get("mb_per_s") is not None and cur["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: 吞吐 {cur['mb_per_s']} MB/s < 基线 {base['mb_per_s']} MB/s")
+        if base.get("peak_rss_mb") and cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: 峰值 RSS {cur['peak_rss_mb']} MB > 基线 {base['peak_rss_mb']} MB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cloudreve 上传吞吐基准（本地假服务）")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="逗号分隔的上传路径")
+    parser.add_argument("--sizes", default="1,16,64", help="文件大小（MiB），逗号分隔")
+    parser.add_argument("--chunks", default="1,5", help="分块大小（MiB），逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="假服务每个请求的额外延迟（秒）")
+    parser.add_argument("--policy-type", default="local", help="存储策略类型：local（经 Cloudreve 中转）/ s3 / onedrive / remote")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="模拟后端存储每个请求的额外延迟（秒）")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比，回退时退出码为 1")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回退判定阈值（比例），默认 0.2")
+    parser.add_argument("--child", nargs=4, metavar=("BASE_URL", "TARGET", "SIZE", "REPEAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        base_url, target, size, repeat = args.child
+        print(json.dumps(run_case(base_url, target, int(size), int(repeat))))
+        return 0
+
+    from benchmarks.fake_cloudreve import FakeCloudreve, FakeConfig
+    from benchmarks.serve import BackgroundServer
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    sizes = [int(float(s) * MIB) for s in args.sizes.split(",")]
+    chunks = [int(float(c) * MIB) for c in args.chunks.split(",")]
+    fake = FakeCloudreve(FakeConfig(
+        latency=args.latency, policy_type=args.policy_type, store_latency=args.store_latency,
+    ))
+    results: dict[str, dict] = {}
+    with BackgroundServer(fake.app) as base_url:
+        print(f"{'路径':<14}{'大小MiB':>8}{'分块MiB':>8}{'MB/s':>10}{'p50 s':>9}{'p99 s':>9}"
+              f"{'块p50ms':>9}{'块p99ms':>9}{'峰值RSS':>9}")
+        for chunk in chunks:
+            _post_json(f"{base_url}/_bench/config", {"chunk_size": chunk})
+            for size in sizes:
+                for target in targets:
+                    proc = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.bench_upload", "--child", base_url, target, str(size), str(args.repeat)],
+                        capture_output=True, text=True,
+                    )
+                    if proc.returncode != 0:
+                        print(proc.stderr, file=sys.stderr)
+                        raise SystemExit(f"{target} size={size} chunk={chunk} 失败")
+                    r = json.loads(proc.stdout.strip().splitlines()[-1])
+                    results[f"{target}/{size // MIB}MiB/{chunk // MIB}MiB"] = r
+                    print(f"{target:<14}{size / MIB:>8g}{chunk / MIB:>8g}{r['mb_per_s']:>10}{r['run_p50_s']:>9}"
+                          f"{r['run_p99_s']:>9}{r['chunk_p50_ms']:>9}{r['chunk_p99_ms']:>9}{r['peak_rss_mb']:>9}")
+
+    report = {"meta": {
+        "python": sys.version.split()[0], "latency": args.latency, "repeat": args.repeat,
+        "policy_type": args.policy_type, "store_latency": args.store_latency,
+    }, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"回退：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
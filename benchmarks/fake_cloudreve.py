@@ -0,0 +1,748 @@
+"""
+本地假 Cloudreve v4（Starlette），只实现 MCP 用到的接口，数据全在内存中（上传内容只计字节数不保存）：
+
+  POST   /api/v4/session/token            登录
+  POST   /api/v4/session/token/refresh    刷新令牌
+  GET    /api/v4/user/setting/policies    存储策略列表
+  POST   /api/v4/file/create              创建文件/文件夹
+  PUT    /api/v4/file/upload              创建上传会话
+  DELETE /api/v4/file/upload              删除上传会话
+  POST   /api/v4/file/upload/{id}/{index} 上传分块（校验顺序与 chunk_size）
+  PUT    /api/v4/file/source              创建直链
+  GET|POST /api/v4/callback/{type}/{id}/{secret}  直传完成回调（s3 / onedrive）
+  POST   /api/v4/file/rename              重命名
+  POST   /api/v4/file/move                批量移动/复制（uris + dst + copy）
+  DELETE /api/v4/file                     批量删除（部分失败时返回 aggregated_error）
+  GET    /api/v4/file?uri=                列出文件夹（游标分页，支持 order_by=name|size|updated_at 与 order_direction）
+  GET    /api/v4/file/info?uri=           文件信息
+  POST   /api/v4/file/url                 临时下载地址（指向 GET /_store/content/{token}，内容为按偏移确定的伪随机字节，支持 Range）
+  POST   /api/v4/workflow/download        创建离线下载任务（在本服务的事件循环中真实下载 URL，只计字节数）
+  GET    /api/v4/workflow?category=       列出任务（downloading / downloaded）
+  DELETE /api/v4/workflow/download/{id}   取消离线下载任务
+
+policy_type 不为 local 时，创建会话返回 upload_urls 等直传信息，由同一服务模拟后端存储：
+  s3        PUT  /_store/s3/{id}/{part}       预签名分片（返回 ETag），POST /_store/s3/{id}?uploadId= 合并
+  onedrive  PUT  /_store/onedrive/{id}        按 Content-Range 顺序写入
+  remote    POST /_store/remote/{id}?chunk=   从机分块（校验 Authorization 为会话 credential），最后一块写完即落库
+
+可注入的行为（FakeConfig，运行中可经 POST /_bench/config 修改，GET /_bench/stats 查看计数）：
+  latency          每个请求额外延迟（秒）
+  chunk_size       创建会话时返回的分块大小
+  token_ttl        access_token 有效期（秒），过期后返回 HTTP 401，需刷新
+  token_max_uses   每个 access_token 最多使用次数（0 不限），用于稳定复现 401
+  fail_rate        已认证请求随机返回 fail_status 的概率
+  max_size         存储策略的 max_size（0 不限）
+  policy_type      存储策略类型：local（默认，经 Cloudreve 中转）/ s3 / onedrive / remote
+  store_latency    模拟后端存储每个请求的额外延迟（秒）
+  remote_download  用户组是否开启离线下载（1 / 0），为 0 时创建离线下载任务返回错误
+  url_ttl          临时下载地址有效期（秒，0 不过期），过期后返回 403
+  store_bandwidth  下载时每个连接的带宽上限（字节/秒，0 不限），用于体现区间并发的收益
+
+refresh_token 只能使用一次（刷新后作废），同一 refresh_token 的并发重复刷新只有一次成功。
+同一 URI 同时只能有一个上传会话：已有未完成/未删除的会话时，新建会话返回 40073（锁冲突）。
+POST /_bench/files {uri: size} 可直接登记文件（不经上传），供下载与列表基准使用；content(offset, length) 给出文件内容。
+文件夹由 create_file 显式创建或随文件登记隐式存在；子项变化时更新其 updated_at（列表接口的 parent 中返回）。
+
+  python -m benchmarks.fake_cloudreve --port 5212   # 单独运行，CLOUDREVE_BASE_URL=http://127.0.0.1:5212/api/v4
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+POLICY_ID = "bench"
+# 文件内容按偏移取自该伪随机块（长度不是 2 的幂，避免与区间边界对齐）
+_PATTERN = random.Random(0).randbytes(1024 * 1024 + 7)
+
+
+def content(offset: int, length: int) -> bytes:
+    """假文件在 [offset, offset + length) 的内容（所有文件相同）。"""
+    out = bytearray()
+    while length > 0:
+        start = offset % len(_PATTERN)
+        piece = _PATTERN[start:start + length]
+        out += piece
+        offset += len(piece)
+        length -= len(piece)
+    return bytes(out)
+
+
+class FakeConfig:
+    FIELDS = (
+        "latency", "chunk_size", "token_ttl", "token_max_uses", "fail_rate", "fail_status", "max_size",
+        "policy_type", "store_latency", "remote_download", "url_ttl", "store_bandwidth",
+    )
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        chunk_size: int = 5 * 1024 * 1024,
+        token_ttl: float = 3600.0,
+        token_max_uses: int = 0,
+        fail_rate: float = 0.0,
+        fail_status: int = 500,
+        max_size: int = 0,
+        policy_type: str = "local",
+        store_latency: float = 0.0,
+        remote_download: int = 1,
+        url_ttl: float = 0.0,
+        store_bandwidth: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.token_ttl = token_ttl
+        self.token_max_uses = token_max_uses
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.max_size = max_size
+        self.policy_type = policy_type
+        self.store_latency = store_latency
+        self.remote_download = remote_download
+        self.url_ttl = url_ttl
+        self.store_bandwidth = store_bandwidth
+
+    def update(self, values: dict) -> None:
+        for key, value in values.items():
+            if key in self.FIELDS:
+                setattr(self, key, type(getattr(self, key))(value))
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+
+class FakeCloudreve:
+    """假服务的状态；app 属性为 Starlette 应用。"""
+
+    def __init__(self, config: FakeConfig | None = None) -> None:
+        self.config = config or FakeConfig()
+        self.tokens: dict[str, dict] = {}
+        self.refresh_tokens: set[str] = set()
+        self.sessions: dict[str, dict] = {}
+        self.files: dict[str, int] = {}
+        # 文件与文件夹的修改时间（epoch 秒）；folders 的键即已存在的文件夹
+        self.mtimes: dict[str, float] = {}
+        self.folders: dict[str, float] = {}
+        self.tasks: dict[str, dict] = {}
+        self._fetches: dict[str, asyncio.Task] = {}
+        self.file_urls: dict[str, tuple[str, float]] = {}
+        self.stats: dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        api = "/api/v4"
+        self.app = Starlette(routes=[
+            Route(f"{api}/session/token", self.sign_in, methods=["POST"]),
+            Route(f"{api}/session/token/refresh", self.refresh, methods=["POST"]),
+            Route(f"{api}/user/setting/policies", self.policies, methods=["GET"]),
+            Route(f"{api}/file/create", self.create_file, methods=["POST"]),
+            Route(f"{api}/file/upload", self.create_session, methods=["PUT"]),
+            Route(f"{api}/file/upload", self.delete_session, methods=["DELETE"]),
+            Route(f"{api}/file/upload/{{session_id}}/{{index:int}}", self.upload_chunk, methods=["POST"]),
+            Route(f"{api}/file/source", self.direct_links, methods=["PUT"]),
+            Route(f"{api}/file/rename", self.rename, methods=["POST"]),
+            Route(f"{api}/file/info", self.file_info, methods=["GET"]),
+            Route(f"{api}/file", self.list_files, methods=["GET"]),
+            Route(f"{api}/file", self.delete_files, methods=["DELETE"]),
+            Route(f"{api}/file/move", self.move_files, methods=["POST"]),
+            Route(f"{api}/file/url", self.file_url, methods=["POST"]),
+            Route(f"{api}/workflow/download", self.create_remote_download, methods=["POST"]),
+            Route(f"{api}/workflow/download/{{task_id}}", self.cancel_remote_download, methods=["DELETE"]),
+            Route(f"{api}/workflow", self.list_tasks, methods=["GET"]),
+            Route(f"{api}/callback/{{policy_type}}/{{session_id}}/{{secret}}", self.upload_callback, methods=["GET", "POST"]),
+            Route("/_store/s3/{session_id}/{part:int}", self.s3_put_part, methods=["PUT"]),
+            Route("/_store/s3/{session_id}", self.s3_complete, methods=["POST"]),
+            Route("/_store/onedrive/{session_id}", self.onedrive_put, methods=["PUT"]),
+            Route("/_store/remote/{session_id}", self.remote_chunk, methods=["POST"]),
+            Route("/_store/content/{token}", self.file_content, methods=["GET"]),
+            Route("/_bench/files", self.add_files, methods=["POST"]),
+            Route("/_bench/config", self.set_config, methods=["POST"]),
+            Route("/_bench/stats", self.get_stats, methods=["GET"]),
+        ])
+
+    # ----- 工具 -----
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _issue_tokens(self) -> dict:
+        n = next(self._ids)
+        access, refresh = f"at-{n}", f"rt-{n}"
+        now = time.time()
+        with self._lock:
+            self.tokens[access] = {"expires": now + self.config.token_ttl, "uses": 0}
+            self.refresh_tokens.add(refresh)
+        return {
+            "access_token": access,
+            "refresh_token": refresh,
+            "access_expires": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now + self.config.token_ttl)),
+            "refresh_expires": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now + 7 * 86400)),
+        }
+
+    async def _enter(self, request: Request, name: str, auth: bool = True) -> JSONResponse | None:
+        """公共前置：计数、注入延迟、校验令牌、注入失败。返回非 None 时直接作为响应。"""
+        self._count(f"requests.{name}")
+        if self.config.latency > 0:
+            await asyncio.sleep(self.config.latency)
+        if not auth:
+            return None
+        header = request.headers.get("authorization", "")
+        token = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+        with self._lock:
+            info = self.tokens.get(token)
+            if info is not None:
+                info["uses"] += 1
+                expired = time.time() >= info["expires"] or (
+                    self.config.token_max_uses and info["uses"] > self.config.token_max_uses
+                )
+            else:
+                expired = True
+        if expired:
+            self._count("responses.401")
+            return JSONResponse({"code": 401, "msg": "Login required"}, status_code=401)
+        if self.config.fail_rate and random.random() < self.config.fail_rate:
+            self._count("responses.injected_failure")
+            return JSONResponse({"code": 500, "msg": "injected failure"}, status_code=self.config.fail_status)
+        return None
+
+    def _touch_parents(self, uri: str, now: float) -> None:
+        """登记 uri 的各级祖先文件夹，并更新直接父文件夹的修改时间（调用方持有 _lock）。"""
+        parent = uri.rsplit("/", 1)[0]
+        self.folders[parent] = now
+        while "/" in parent.removeprefix("cloudreve://"):
+            parent = parent.rsplit("/", 1)[0]
+            self.folders.setdefault(parent, now)
+
+    def _put_file(self, uri: str, size: int) -> None:
+        """落库一个文件（调用方持有 _lock）。"""
+        now = time.time()
+        self.files[uri] = size
+        self.mtimes[uri] = now
+        self._touch_parents(uri, now)
+
+    def _remove_file(self, uri: str) -> int:
+        size = self.files.pop(uri)
+        self.mtimes.pop(uri, None)
+        self._touch_parents(uri, time.time())
+        return size
+
+    @staticmethod
+    def _iso(ts: float) -> str:
+        return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+    def _file_object(self, uri: str) -> dict:
+        if uri in self.folders:
+            return {"type": 1, "path": uri, "name": uri.rsplit("/", 1)[-1], "size": 0,
+                    "updated_at": self._iso(self.folders[uri])}
+        return {"type": 0, "path": uri, "name": uri.rsplit("/", 1)[-1], "size": self.files[uri],
+                "updated_at": self._iso(self.mtimes.get(uri, 0.0))}
+
+    @staticmethod
+    def _ok(data=None) -> JSONResponse:
+        return JSONResponse({"code": 0, "msg": "", "data": data})
+
+    @staticmethod
+    def _error(code: int, msg: str) -> JSONResponse:
+        return JSONResponse({"code": code, "msg": msg})
+
+    # ----- 接口 -----
+    async def sign_in(self, request: Request) -> JSONResponse:
+        await self._enter(request, "sign_in", auth=False)
+        body = await request.json()
+        return self._ok({"user": {"id": "bench", "email": body.get("email", "")}, "token": self._issue_tokens()})
+
+    async def refresh(self, request: Request) -> JSONResponse:
+        await self._enter(request, "refresh", auth=False)
+        body = await request.json()
+        with self._lock:
+            # 与 Cloudreve 一样轮换 refresh_token：每个只能用一次
+            valid = body.get("refresh_token") in self.refresh_tokens
+            self.refresh_tokens.discard(body.get("refresh_token"))
+        if not valid:
+            return JSONResponse({"code": 401, "msg": "invalid refresh token"}, status_code=401)
+        return self._ok(self._issue_tokens())
+
+    async def policies(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "policies")) is not None:
+            return resp
+        return self._ok([{"id": POLICY_ID, "name": "bench", "type": self.config.policy_type, "max_size": self.config.max_size}])
+
+    async def create_file(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "create_file")) is not None:
+            return resp
+        body = await request.json()
+        if body.get("type") == "folder":
+            uri = (body.get("uri") or "").rstrip("/")
+            with self._lock:
+                if uri not in self.folders:
+                    now = time.time()
+                    self.folders[uri] = now
+                    self._touch_parents(uri, now)
+        return self._ok({"uri": body.get("uri"), "type": body.get("type")})
+
+    async def create_session(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "create_session")) is not None:
+            return resp
+        body = await request.json()
+        size = int(body.get("size") or 0)
+        if body.get("policy_id") != POLICY_ID:
+            return self._error(40010, "policy not found")
+        if self.config.max_size and size > self.config.max_size:
+            return self._error(40049, "file too large")
+        session_id = f"s-{next(self._ids)}"
+        policy_type = self.config.policy_type
+        chunk_size = self.config.chunk_size
+        session = {
+            "uri": body.get("uri"),
+            "size": size,
+            "chunk_size": chunk_size,
+            "received": 0,
+            "next_index": 0,
+            "policy_type": policy_type,
+            "secret": f"cb-{session_id}",
+            "parts": {},
+            "completed": False,
+        }
+        with self._lock:
+            # 与 Cloudreve 一样，同一 URI 同时只能有一个上传会话（占位文件被锁定）
+            if any(s["uri"] == session["uri"] for s in self.sessions.values()):
+                self._count("responses.session_conflict")
+                return self._error(40073, "lock conflict: upload session already exists for this file")
+            self.sessions[session_id] = session
+        data = {
+            "session_id": session_id,
+            "chunk_size": chunk_size,
+            "expires": int(time.time()) + 3600,
+            "storage_policy": {"id": POLICY_ID, "name": "bench", "type": policy_type, "relay": False},
+        }
+        store = f"{str(request.base_url).rstrip('/')}/_store/{policy_type}/{session_id}"
+        if policy_type == "s3":
+            parts = max(1, -(-size // chunk_size))
+            data["upload_urls"] = [f"{store}/{i + 1}?X-Amz-Signature=bench" for i in range(parts)]
+            data["complete_url"] = f"{store}?uploadId=u-{session_id}"
+            data["callback_secret"] = session["secret"]
+        elif policy_type == "onedrive":
+            data["upload_urls"] = [store]
+            data["callback_secret"] = session["secret"]
+        elif policy_type == "remote":
+            data["upload_urls"] = [store]
+            data["credential"] = f"cred-{session_id}"
+        return self._ok(data)
+
+    async def delete_session(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "delete_session")) is not None:
+            return resp
+        body = await request.json()
+        with self._lock:
+            session = self.sessions.get(body.get("id"))
+            if session is not None and session["uri"] == body.get("uri"):
+                del self.sessions[body["id"]]
+        return self._ok()
+
+    async def upload_chunk(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "upload_chunk")) is not None:
+            return resp
+        session_id = request.path_params["session_id"]
+        index = request.path_params["index"]
+        n = 0
+        async for part in request.stream():
+            n += len(part)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return self._error(40011, "upload session not found")
+            if index != session["next_index"]:
+                return self._error(40012, f"unexpected chunk index {index}, want {session['next_index']}")
+            remaining = session["size"] - session["received"]
+            want = min(session["chunk_size"], remaining)
+            if n != want:
+                return self._error(40013, f"invalid Content-Length {n}, want {want}")
+            session["received"] += n
+            session["next_index"] += 1
+            if session["received"] >= session["size"]:
+                self._put_file(session["uri"], session["size"])
+                del self.sessions[session_id]
+        self._count("chunks")
+        self._count("bytes_received", n)
+        return self._ok()
+
+    # ----- 模拟后端存储（直传） -----
+    async def _store_enter(self, name: str) -> None:
+        self._count(f"requests.{name}")
+        if self.config.store_latency > 0:
+            await asyncio.sleep(self.config.store_latency)
+
+    @staticmethod
+    async def _read_body(request: Request) -> int:
+        n = 0
+        async for part in request.stream():
+            n += len(part)
+        return n
+
+    def _finish(self, session_id: str) -> None:
+        """直传内容齐全后落库（调用方持有 _lock）。"""
+        session = self.sessions.pop(session_id)
+        self._put_file(session["uri"], session["size"])
+
+    async def s3_put_part(self, request: Request) -> Response:
+        await self._store_enter("s3_put_part")
+        session_id, part = request.path_params["session_id"], request.path_params["part"]
+        n = await self._read_body(request)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return Response("<Error><Code>NoSuchUpload</Code></Error>", status_code=404)
+            session["parts"][part] = n
+        self._count("chunks")
+        self._count("bytes_received", n)
+        return Response(status_code=200, headers={"ETag": f'"{session_id}-{part}-{n}"'})
+
+    async def s3_complete(self, request: Request) -> Response:
+        await self._store_enter("s3_complete")
+        session_id = request.path_params["session_id"]
+        body = (await request.body()).decode()
+        listed = [(int(num), tag) for num, tag in re.findall(
+            r"<PartNumber>(\d+)</PartNumber><ETag>(.*?)</ETag>", body,
+        )]
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return Response("<Error><Code>NoSuchUpload</Code></Error>", status_code=404)
+            parts = session["parts"]
+            expected = [(i, f'"{session_id}-{i}-{parts.get(i)}"') for i in range(1, len(parts) + 1)]
+            if listed != expected or sum(parts.values()) != session["size"]:
+                # 与真实 S3 一样，合并失败也可能以 200 返回 <Error>
+                return Response("<Error><Code>InvalidPart</Code></Error>", status_code=200)
+            session["completed"] = True
+        return Response("<CompleteMultipartUploadResult></CompleteMultipartUploadResult>", media_type="application/xml")
+
+    async def onedrive_put(self, request: Request) -> Response:
+        await self._store_enter("onedrive_put")
+        session_id = request.path_params["session_id"]
+        m = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+)", request.headers.get("content-range", ""))
+        n = await self._read_body(request)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or m is None:
+                return JSONResponse({"error": {"code": "itemNotFound"}}, status_code=404)
+            start, end, total = map(int, m.groups())
+            if start != session["received"] or end - start + 1 != n or total != session["size"]:
+                return JSONResponse({"error": {"code": "invalidRange"}}, status_code=416)
+            session["received"] += n
+            done = session["received"] == session["size"]
+            session["completed"] = done
+        self._count("chunks")
+        self._count("bytes_received", n)
+        return JSONResponse({"id": session_id} if done else {"nextExpectedRanges": [f"{end + 1}-"]},
+                            status_code=201 if done else 202)
+
+    async def remote_chunk(self, request: Request) -> JSONResponse:
+        await self._store_enter("remote_chunk")
+        session_id = request.path_params["session_id"]
+        index = int(request.query_params.get("chunk", "-1"))
+        n = await self._read_body(request)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return self._error(40011, "upload session not found")
+            if request.headers.get("authorization") != f"cred-{session_id}":
+                return self._error(40001, "invalid credential")
+            if index != session["next_index"]:
+                return self._error(40012, f"unexpected chunk index {index}, want {session['next_index']}")
+            session["received"] += n
+            session["next_index"] += 1
+            if session["received"] >= session["size"]:
+                self._finish(session_id)
+        self._count("chunks")
+        self._count("bytes_received", n)
+        return self._ok()
+
+    async def upload_callback(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "upload_callback")) is not None:
+            return resp
+        session_id = request.path_params["session_id"]
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or request.path_params["secret"] != session["secret"]:
+                return self._error(40011, "upload session not found")
+            if request.path_params["policy_type"] != session["policy_type"] or not session["completed"]:
+                return self._error(40014, "upload not completed")
+            self._finish(session_id)
+        return self._ok()
+
+    async def direct_links(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "direct_links")) is not None:
+            return resp
+        body = await request.json()
+        out = []
+        for uri in body.get("uris") or []:
+            if uri not in self.files:
+                return self._error(40016, f"file not found: {uri}")
+            name = uri.rsplit("/", 1)[-1]
+            out.append({"link": f"{request.base_url}f/{next(self._ids)}/{name}", "file_url": uri})
+        return self._ok(out)
+
+    async def file_info(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "file_info")) is not None:
+            return resp
+        uri = request.query_params.get("uri", "").rstrip("/")
+        with self._lock:
+            if uri not in self.files and uri not in self.folders:
+                return self._error(40016, f"file not found: {uri}")
+            return self._ok(self._file_object(uri))
+
+    def _subtree(self, uri: str) -> tuple[list[str], list[str]]:
+        """uri 自身及其下的 (文件列表, 文件夹列表)（调用方持有 _lock）。"""
+        if uri not in self.folders:
+            return ([uri] if uri in self.files else []), []
+        prefix = f"{uri}/"
+        files = [u for u in self.files if u == uri or u.startswith(prefix)]
+        folders = [u for u in self.folders if u == uri or u.startswith(prefix)]
+        return files, folders
+
+    @staticmethod
+    def _batch_result(errors: dict) -> JSONResponse:
+        if not errors:
+            return FakeCloudreve._ok()
+        return JSONResponse({"code": 40081, "msg": "Batch operation failed", "aggregated_error": errors})
+
+    async def move_files(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "move_files")) is not None:
+            return resp
+        body = await request.json()
+        dst = (body.get("dst") or "").rstrip("/")
+        errors = {}
+        with self._lock:
+            for uri in body.get("uris") or []:
+                files, folders = self._subtree(uri)
+                if not files and not folders:
+                    errors[uri] = {"code": 40016, "msg": f"file not found: {uri}"}
+                    continue
+                new_root = f"{dst}/{uri.rsplit('/', 1)[-1]}"
+                if new_root in self.files or new_root in self.folders:
+                    errors[uri] = {"code": 40004, "msg": f"object existed: {new_root}"}
+                    continue
+                now = time.time()
+                for folder in folders:
+                    self.folders[new_root + folder[len(uri):]] = now
+                    if not body.get("copy"):
+                        del self.folders[folder]
+                for f in files:
+                    size = self.files[f] if body.get("copy") else self._remove_file(f)
+                    self._put_file(new_root + f[len(uri):], size)
+                self._touch_parents(new_root, now)
+                if not body.get("copy"):
+                    self._touch_parents(uri, now)
+        return self._batch_result(errors)
+
+    async def delete_files(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "delete_files")) is not None:
+            return resp
+        body = await request.json()
+        errors = {}
+        with self._lock:
+            for uri in body.get("uris") or []:
+                files, folders = self._subtree(uri)
+                if not files and not folders:
+                    errors[uri] = {"code": 40016, "msg": f"file not found: {uri}"}
+                    continue
+                for f in files:
+                    self._remove_file(f)
+                for folder in folders:
+                    del self.folders[folder]
+                self._touch_parents(uri, time.time())
+        return self._batch_result(errors)
+
+    async def list_files(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "list_files")) is not None:
+            return resp
+        q = request.query_params
+        uri = q.get("uri", "").rstrip("/")
+        page_size = max(1, int(q.get("page_size") or 50))
+        offset = int(q.get("next_page_token") or 0)
+        order_by = q.get("order_by") or "name"
+        with self._lock:
+            if uri not in self.folders and "/" in uri.removeprefix("cloudreve://"):
+                return self._error(40016, f"folder not found: {uri}")
+            children = [self._file_object(u) for u in self.folders if u.rsplit("/", 1)[0] == uri and u != uri]
+            children += [self._file_object(u) for u in self.files if u.rsplit("/", 1)[0] == uri]
+            parent = self._file_object(uri) if uri in self.folders else {"type": 1, "path": uri, "name": ""}
+        children.sort(key=lambda f: (f[order_by], f["name"]), reverse=q.get("order_direction") == "desc")
+        page = children[offset:offset + page_size]
+        more = offset + page_size < len(children)
+        return self._ok({
+            "files": page,
+            "parent": parent,
+            "pagination": {"page": 0, "page_size": page_size, "is_cursor": True,
+                           "next_token": str(offset + page_size) if more else ""},
+        })
+
+    async def file_url(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "file_url")) is not None:
+            return resp
+        body = await request.json()
+        urls = []
+        for uri in body.get("uris") or []:
+            if uri not in self.files:
+                return self._error(40016, f"file not found: {uri}")
+            token = f"dl-{next(self._ids)}"
+            self.file_urls[token] = (uri, time.time() + self.config.url_ttl if self.config.url_ttl > 0 else 0.0)
+            urls.append({"url": f"{request.base_url}_store/content/{token}"})
+        return self._ok({"urls": urls})
+
+    async def file_content(self, request: Request) -> Response:
+        await self._store_enter("file_content")
+        uri, expires = self.file_urls.get(request.path_params["token"], ("", 0.0))
+        if not uri or (expires and time.time() > expires):
+            self._count("responses.url_expired")
+            return Response("<Error><Code>AccessDenied</Code></Error>", status_code=403)
+        size = self.files.get(uri, 0)
+        start, end, status = 0, size - 1, 200
+        if m := re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("range", "")):
+            start = int(m.group(1))
+            end = min(size - 1, int(m.group(2))) if m.group(2) else size - 1
+            if start >= size:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+            status = 206
+        length = end - start + 1
+        bandwidth = self.config.store_bandwidth
+
+        async def body():
+            step = 256 * 1024
+            for offset in range(start, end + 1, step):
+                n = min(step, end + 1 - offset)
+                if bandwidth > 0:
+                    await asyncio.sleep(n / bandwidth)
+                yield content(offset, n)
+            self._count("bytes_served", length)
+
+        headers = {"Content-Length": str(length), "Accept-Ranges": "bytes"}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return StreamingResponse(body(), status_code=status, headers=headers, media_type="application/octet-stream")
+
+    async def add_files(self, request: Request) -> JSONResponse:
+        with self._lock:
+            for uri, size in (await request.json()).items():
+                self._put_file(uri, int(size))
+        return JSONResponse({"files": len(self.files)})
+
+    async def rename(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "rename")) is not None:
+            return resp
+        body = await request.json()
+        uri, new_name = body.get("uri") or "", body.get("new_name") or ""
+        new_uri = f"{uri.rsplit('/', 1)[0]}/{new_name}"
+        with self._lock:
+            if uri not in self.files:
+                return self._error(40016, f"file not found: {uri}")
+            if new_uri in self.files:
+                return self._error(40004, f"object existed: {new_uri}")
+            self._put_file(new_uri, self._remove_file(uri))
+        return self._ok({"uri": new_uri, "name": new_name, "size": self.files[new_uri], "type": 0})
+
+    async def _run_fetch(self, task_id: str, url: str, dst: str) -> None:
+        """离线下载：真实下载 url，完成后以 URL 的文件名存入 dst。"""
+        task = self.tasks[task_id]
+        download = task["summary"]["props"]["download"]
+        task["status"] = "processing"
+        try:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=60.0) as client:
+                async with client.stream("GET", url) as r:
+                    r.raise_for_status()
+                    download["total"] = int(r.headers.get("content-length") or 0)
+                    download["name"] = urllib.parse.unquote(r.url.path.rsplit("/", 1)[-1]) or "download"
+                    async for part in r.aiter_bytes():
+                        download["downloaded"] += len(part)
+            if self.config.store_latency > 0:
+                await asyncio.sleep(self.config.store_latency)
+            with self._lock:
+                self._put_file(f"{dst}/{download['name']}", download["downloaded"])
+            download["total"] = download["downloaded"]
+            task["status"] = "completed"
+            self._count("bytes_fetched", download["downloaded"])
+        except asyncio.CancelledError:
+            task["status"] = "canceled"
+        except Exception as e:
+            task["status"] = "error"
+            task["error"] = str(e) or type(e).__name__
+        finally:
+            self._fetches.pop(task_id, None)
+
+    async def create_remote_download(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "create_remote_download")) is not None:
+            return resp
+        if not self.config.remote_download:
+            return self._error(40073, "Group not allowed to create remote download tasks")
+        body = await request.json()
+        dst = body.get("dst") or ""
+        out = []
+        for url in body.get("src") or []:
+            task_id = f"task-{next(self._ids)}"
+            self.tasks[task_id] = task = {
+                "id": task_id,
+                "status": "queued",
+                "type": "remote_download",
+                "summary": {"phase": "monitor", "props": {
+                    "src_str": url, "dst": dst, "download": {"name": "", "total": 0, "downloaded": 0},
+                }},
+            }
+            self._fetches[task_id] = asyncio.create_task(self._run_fetch(task_id, url, dst))
+            out.append(task)
+        return self._ok(out)
+
+    async def list_tasks(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "list_tasks")) is not None:
+            return resp
+        finished = request.query_params.get("category") == "downloaded"
+        tasks = [t for t in self.tasks.values() if (t["status"] in ("completed", "error", "canceled")) == finished]
+        return self._ok({"tasks": tasks, "pagination": {"page_size": len(tasks)}})
+
+    async def cancel_remote_download(self, request: Request) -> JSONResponse:
+        if (resp := await self._enter(request, "cancel_remote_download")) is not None:
+            return resp
+        task_id = request.path_params["task_id"]
+        if task_id not in self.tasks:
+            return self._error(40016, f"task not found: {task_id}")
+        if (fetch := self._fetches.get(task_id)) is not None:
+            fetch.cancel()
+        return self._ok()
+
+    async def set_config(self, request: Request) -> JSONResponse:
+        self.config.update(await request.json())
+        return JSONResponse(self.config.as_dict())
+
+    async def get_stats(self, request: Request) -> JSONResponse:
+        with self._lock:
+            return JSONResponse({"stats": dict(self.stats), "files": len(self.files), "open_sessions": len(self.sessions)})
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地假 Cloudreve v4")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5212)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=5 * 1024 * 1024)
+    parser.add_argument("--token-ttl", type=float, default=3600.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeCloudreve(FakeConfig(
+        latency=args.latency, chunk_size=args.chunk_size, token_ttl=args.token_ttl, fail_rate=args.fail_rate,
+    ))
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+本地假上游（Starlette）：抖音、哔哩哔哩、网易云音乐接口与媒体文件，供端到端入库基准使用。
+把各模块的根地址指向本服务（须在导入 mcp_cloudreve 前设置，见 env_for）：
+
+  DOUYIN_SHARE_BASE_URL = {base}/douyin        GET  /s/{code}（302 到分享页）、/share/video/{id}（含 _ROUTER_DATA 的 HTML）
+  BILIBILI_API_BASE_URL = {base}/bilibili      GET  /video/{bvid}、/x/web-interface/nav、/x/web-interface/view、/x/player/wbi/playurl
+  NETEASE_API_BASE_URL  = {base}/netease       POST /eapi/search/get、/eapi/song/enhance/player/url/v1（解密 eapi params）、
+                                                     /api/v3/song/detail、/api/v6/playlist/detail
+  NETEASE_WEB_BASE_URL  = {base}/netease-web   GET  /api/v1/album/{id}、/api/song/detail/
+  媒体                   {base}/media/...       支持 Range（206）、限速，可在指定偏移处断流以测试续传
+
+哔哩哔哩：本机有 ffmpeg 时返回 DASH（生成真实的 fMP4 .m4s 音视频），否则返回单段 durl（无需合并）。
+网易云歌曲默认为 ID3 + MPEG 帧构成的 MP3，封面为 JPEG，可正常流式嵌入封面；netease_format=m4a 时为最小的
+M4A（ftyp + moov + mdat），无法流式嵌入，下载后补嵌封面会改变文件大小（走重建上传会话的路径）。
+
+可调参数（UpstreamConfig，运行中可经 POST /_bench/config 修改）：
+  latency           接口请求额外延迟（秒，不含媒体）
+  bandwidth         媒体下载限速（字节/秒，0 不限）
+  media_drop_at     每个媒体 URL 的首次非 Range 请求在该偏移处断开（0 关闭），用于触发 Range 续传或整段重试
+                    （抖音下载不重试，开启后抖音场景会失败）
+  douyin_size       抖音视频大小
+  netease_size      网易云歌曲大小
+  netease_format    网易云歌曲格式：mp3（默认）/ m4a
+  bilibili_seconds  生成的哔哩哔哩 DASH 时长（秒）；durl 模式下按 bilibili_size 生成
+  bilibili_size     durl 模式下的视频大小
+  bilibili_pages    视频分 P 数
+  page_padding      抖音分享页 HTML 中 _ROUTER_DATA 之外的填充字节数（模拟真实页面大小）
+
+  python -m benchmarks.fake_upstreams --port 5300
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib.parse
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+MIB = 1024 * 1024
+NETEASE_AES_KEY = b"e82ckenh8dichen8"
+WBI_IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+WBI_SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+DOUYIN_VIDEO_ID = "7300000000000000001"
+BILIBILI_BVID = "BV1xx411c7mD"
+# 一个最小的 JPEG（SOI/APP0/…/EOI），满足 MIME 判断与嵌入
+COVER_JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00" + b"\x00" * 200 + b"\xff\xd9"
+# MPEG-1 Layer III 128kbps 44.1kHz 帧：4 字节帧头 + 413 字节数据
+MP3_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+ID3_HEADER = b"ID3\x03\x00\x00\x00\x00\x00\x00"
+
+
+def _box(kind: bytes, body: bytes) -> bytes:
+    return (8 + len(body)).to_bytes(4, "big") + kind + body
+
+
+# 最小 M4A 的 ftyp + moov（只有 mvhd），其后接 mdat 头与音频数据
+M4A_HEADER = _box(b"ftyp", b"M4A \x00\x00\x00\x00M4A isom") + _box(
+    b"moov", _box(b"mvhd", b"\x00" * 12 + (1000).to_bytes(4, "big") + b"\x00" * 84),
+)
+
+
+class UpstreamConfig:
+    FIELDS = (
+        "latency", "bandwidth", "media_drop_at", "douyin_size", "netease_size", "netease_format",
+        "bilibili_seconds", "bilibili_size", "bilibili_pages", "page_padding",
+    )
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bandwidth: int = 0,
+        media_drop_at: int = 0,
+        douyin_size: int = 16 * MIB,
+        netease_size: int = 8 * MIB,
+        netease_format: str = "mp3",
+        bilibili_seconds: int = 10,
+        bilibili_size: int = 16 * MIB,
+        bilibili_pages: int = 1,
+        page_padding: int = 200 * 1024,
+    ) -> None:
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.media_drop_at = media_drop_at
+        self.douyin_size = douyin_size
+        self.netease_size = netease_size
+        self.netease_format = netease_format
+        self.bilibili_seconds = bilibili_seconds
+        self.bilibili_size = bilibili_size
+        self.bilibili_pages = bilibili_pages
+        self.page_padding = page_padding
+
+    def update(self, values: dict) -> None:
+        for key, value in values.items():
+            if key in self.FIELDS:
+                setattr(self, key, type(getattr(self, key))(value))
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+
+class _Media:
+    """按偏移生成的媒体内容：prefix 之后循环 unit，总长 size；不在内存中展开整个文件。"""
+
+    def __init__(self, size: int, unit: bytes, prefix: bytes = b"", mime: str = "application/octet-stream") -> None:
+        self.size = size
+        self.unit = unit
+        self.prefix = prefix
+        self.mime = mime
+
+    def read(self, offset: int, length: int) -> bytes:
+        out = bytearray()
+        end = min(self.size, offset + length)
+        while offset < end:
+            if offset < len(self.prefix):
+                piece = self.prefix[offset:end]
+            else:
+                pos = (offset - len(self.prefix)) % len(self.unit)
+                piece = self.unit[pos:pos + end - offset]
+            out += piece
+            offset += len(piece)
+        return bytes(out)
+
+
+def _decrypt_eapi(params_hex: str) -> tuple[str, dict]:
+    """解密网易云 eapi 的 params，返回 (接口路径, payload)。"""
+    decryptor = Cipher(algorithms.AES(NETEASE_AES_KEY), modes.ECB()).decryptor()
+    raw = decryptor.update(bytes.fromhex(params_hex)) + decryptor.finalize()
+    raw = raw[:-raw[-1]]
+    path, payload, _digest = raw.decode("utf-8").split("-36cd479b6b5-")
+    return path, json.loads(payload)
+
+
+def _generate_dash(seconds: int) -> tuple[bytes, bytes] | None:
+    """用 ffmpeg 生成 fMP4 的视频与音频 .m4s；本机无 ffmpeg 时返回 None。"""
+    if not shutil.which("ffmpeg"):
+        return None
+    tmp_dir = tempfile.mkdtemp(prefix="fake-bilibili-")
+    try:
+        video = os.path.join(tmp_dir, "video.m4s")
+        audio = os.path.join(tmp_dir, "audio.m4s")
+        subprocess.run([
+            "ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=1280x720:rate=30",
+            "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "4M",
+            "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", video,
+        ], check=True, capture_output=True)
+        subprocess.run([
+            "ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:a", "aac", "-b:a", "128k", "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", audio,
+        ], check=True, capture_output=True)
+        with open(video, "rb") as f, open(audio, "rb") as g:
+            return f.read(), g.read()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class FakeUpstreams:
+    """假上游的状态；app 属性为 Starlette 应用。"""
+
+    def __init__(self, config: UpstreamConfig | None = None) -> None:
+        self.config = config or UpstreamConfig()
+        self.stats: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dash: tuple[bytes, bytes] | None = None
+        self._dash_seconds: int | None = None
+        self._dropped: set[str] = set()
+        self._random_block = hashlib.sha256(b"fake-upstreams").digest() * (MIB // 32)
+        self.app = Starlette(routes=[
+            Route("/douyin/s/{code}", self.douyin_short_link),
+            Route("/douyin/share/video/{video_id}", self.douyin_share_page),
+            Route("/bilibili/video/{bvid}", self.bilibili_video_page),
+            Route("/bilibili/x/web-interface/nav", self.bilibili_nav),
+            Route("/bilibili/x/web-interface/view", self.bilibili_view),
+            Route("/bilibili/x/player/wbi/playurl", self.bilibili_playurl),
+            Route("/netease/eapi/{path:path}", self.netease_eapi, methods=["POST"]),
+            Route("/netease/api/v3/song/detail", self.netease_song_detail, methods=["POST"]),
+            Route("/netease/api/v6/playlist/detail", self.netease_playlist, methods=["POST"]),
+            Route("/netease-web/api/v1/album/{album_id:int}", self.netease_album),
+            Route("/netease-web/api/song/detail/", self.netease_song_detail),
+            Route("/media/{kind}/{name:path}", self.media, methods=["GET", "HEAD"]),
+            Route("/_bench/config", self.set_config, methods=["POST"]),
+            Route("/_bench/stats", self.get_stats),
+        ])
+
+    @staticmethod
+    def env_for(base_url: str) -> dict[str, str]:
+        """让 mcp_cloudreve 各模块指向本服务的环境变量。"""
+        return {
+            "DOUYIN_SHARE_BASE_URL": f"{base_url}/douyin",
+            "BILIBILI_API_BASE_URL": f"{base_url}/bilibili",
+            "NETEASE_API_BASE_URL": f"{base_url}/netease",
+            "NETEASE_WEB_BASE_URL": f"{base_url}/netease-web",
+        }
+
+    # ----- 工具 -----
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    async def _enter(self, name: str) -> None:
+        self._count(f"requests.{name}")
+        if self.config.latency > 0:
+            await asyncio.sleep(self.config.latency)
+
+    @staticmethod
+    def _base(request: Request) -> str:
+        return str(request.base_url).rstrip("/")
+
+    def _get_dash(self) -> tuple[bytes, bytes] | None:
+        with self._lock:
+            if self._dash_seconds != self.config.bilibili_seconds:
+                self._dash = _generate_dash(self.config.bilibili_seconds)
+                self._dash_seconds = self.config.bilibili_seconds
+            return self._dash
+
+    def _media_for(self, kind: str, name: str) -> _Media | None:
+        if kind == "douyin":
+            return _Media(self.config.douyin_size, self._random_block, mime="video/mp4")
+        if kind == "netease":
+            if self.config.netease_format == "m4a":
+                size = self.config.netease_size
+                prefix = M4A_HEADER + (size - len(M4A_HEADER)).to_bytes(4, "big") + b"mdat"
+                return _Media(size, b"\x00" * 4096, prefix=prefix, mime="audio/mp4")
+            return _Media(self.config.netease_size, MP3_FRAME, prefix=ID3_HEADER, mime="audio/mpeg")
+        if kind == "cover":
+            return _Media(len(COVER_JPEG), COVER_JPEG, prefix=COVER_JPEG, mime="image/jpeg")
+        if kind == "bilibili":
+            if name.endswith("durl.flv"):
+                return _Media(self.config.bilibili_size, self._random_block, mime="video/x-flv")
+            dash = self._get_dash()
+            if dash is None:
+                return None
+            data = dash[0] if name.endswith("video.m4s") else dash[1]
+            return _Media(len(data), data, prefix=data, mime="video/mp4")
+        return None
+
+    # ----- 抖音 -----
+    async def douyin_short_link(self, request: Request) -> Response:
+        await self._enter("douyin.short_link")
+        # 纯数字短码映射到不同视频 ID，便于基准每轮使用不同的目标文件
+        code = request.path_params["code"]
+        video_id = f"73{int(code):017d}" if code.isdigit() else DOUYIN_VIDEO_ID
+        return RedirectResponse(f"{self._base(request)}/douyin/share/video/{video_id}?from=share", status_code=302)
+
+    async def douyin_share_page(self, request: Request) -> Response:
+        await self._enter("douyin.share_page")
+        video_id = request.path_params["video_id"]
+        router_data = {
+            "loaderData": {
+                "video_(id)/page": {
+                    "videoInfoRes": {
+                        "item_list": [{
+                            "desc": f"基准测试视频 {video_id}",
+                            "video": {"play_addr": {"url_list": [f"{self._base(request)}/media/douyin/playwm/{video_id}.mp4"]}},
+                        }],
+                    },
+                },
+            },
+        }
+        padding = "<div>" + "x" * self.config.page_padding + "</div>"
+        html = (
+            f"<!DOCTYPE html><html><head><title>douyin</title></head><body>{padding}"
+            f"<script>window._ROUTER_DATA = {json.dumps(router_data, ensure_ascii=False)}</script>"
+            f"<script>window.other = {{}};</script></body></html>"
+        )
+        return HTMLResponse(html)
+
+    # ----- 哔哩哔哩 -----
+    async def bilibili_video_page(self, request: Request) -> Response:
+        await self._enter("bilibili.video_page")
+        return HTMLResponse(f"<html><body>{request.path_params['bvid']}</body></html>")
+
+    async def bilibili_nav(self, request: Request) -> Response:
+        await self._enter("bilibili.nav")
+        return JSONResponse({"code": 0, "data": {"wbi_img": {
+            "img_url": f"https://i0.hdslb.com/bfs/wbi/{WBI_IMG_KEY}.png",
+            "sub_url": f"https://i0.hdslb.com/bfs/wbi/{WBI_SUB_KEY}.png",
+        }}})
+
+    async def bilibili_view(self, request: Request) -> Response:
+        await self._enter("bilibili.view")
+        bvid = request.query_params.get("bvid", BILIBILI_BVID)
+        pages = [
+            {"page": i + 1, "cid": 100000 + i, "part": f"第{i + 1}集", "duration": self.config.bilibili_seconds}
+            for i in range(max(1, self.config.bilibili_pages))
+        ]
+        return JSONResponse({"code": 0, "data": {
+            "bvid": bvid, "title": f"基准测试视频 {bvid}", "cid": pages[0]["cid"],
+            "owner": {"name": "bench"}, "pic": "", "duration": self.config.bilibili_seconds, "pages": pages,
+        }})
+
+    async def bilibili_playurl(self, request: Request) -> Response:
+        await self._enter("bilibili.playurl")
+        q = request.query_params
+        if not q.get("w_rid") or not q.get("wts"):
+            return JSONResponse({"code": -403, "message": "missing wbi signature"})
+        base = f"{self._base(request)}/media/bilibili/{q.get('bvid')}/{q.get('cid')}"
+        dash = await asyncio.to_thread(self._get_dash)
+        if dash is not None:
+            # 与真实接口一样给出时长与码率，供服务端估算暂存空间
+            seconds = self.config.bilibili_seconds
+            return JSONResponse({"code": 0, "data": {"dash": {
+                "duration": seconds,
+                "video": [{"baseUrl": f"{base}/video.m4s", "id": 80, "bandwidth": len(dash[0]) * 8 // seconds}],
+                "audio": [{"baseUrl": f"{base}/audio.m4s", "id": 30280, "bandwidth": len(dash[1]) * 8 // seconds}],
+            }}})
+        return JSONResponse({"code": 0, "data": {"durl": [{"url": f"{base}/durl.flv", "size": self.config.bilibili_size}]}})
+
+    # ----- 网易云音乐 -----
+    def _netease_song(self, request: Request, song_id: int) -> dict:
+        album_id = song_id // 100
+        return {
+            "id": song_id,
+            "name": f"基准歌曲 {song_id}",
+            "ar": [{"id": 1, "name": "基准歌手"}],
+            "al": {"id": album_id, "name": f"基准专辑 {album_id}", "picUrl": f"{self._base(request)}/media/cover/{album_id}.jpg"},
+        }
+
+    @staticmethod
+    async def _form(request: Request) -> dict[str, str]:
+        body = (await request.body()).decode("utf-8")
+        return {k: v[0] for k, v in urllib.parse.parse_qs(body).items()}
+
+    async def netease_eapi(self, request: Request) -> Response:
+        await self._enter("netease.eapi")
+        form = await self._form(request)
+        path, payload = _decrypt_eapi(form.get("params", ""))
+        if path == "/api/search/get":
+            limit = int(payload.get("limit") or 1)
+            songs = []
+            for i in range(limit):
+                song = self._netease_song(request, 200000 + i)
+                songs.append({"id": song["id"], "name": song["name"], "artists": song["ar"], "album": song["al"]})
+            return JSONResponse({"code": 200, "result": {"songs": songs, "songCount": limit}})
+        if path == "/api/song/enhance/player/url/v1":
+            ids = payload.get("ids") or []
+            if isinstance(ids, str):
+                ids = json.loads(ids)
+            return JSONResponse({"code": 200, "data": [
+                {
+                    "id": int(sid),
+                    "url": f"{self._base(request)}/media/netease/{int(sid)}.mp3",
+                    "size": self.config.netease_size,
+                    "level": payload.get("level") or "standard",
+                    "expi": 1200,
+                }
+                for sid in ids
+            ]})
+        return JSONResponse({"code": 404, "msg": f"unknown eapi {path}"})
+
+    async def netease_song_detail(self, request: Request) -> Response:
+        await self._enter("netease.song_detail")
+        if request.method == "POST":
+            ids = [int(item["id"]) for item in json.loads((await self._form(request)).get("c", "[]"))]
+        else:
+            ids = [int(request.query_params.get("id", "0"))]
+        return JSONResponse({"code": 200, "songs": [self._netease_song(request, sid) for sid in ids]})
+
+    async def netease_playlist(self, request: Request) -> Response:
+        await self._enter("netease.playlist")
+        playlist_id = int((await self._form(request)).get("id", "0"))
+        count = max(1, playlist_id % 1000)
+        return JSONResponse({"code": 200, "playlist": {
+            "id": playlist_id, "name": f"基准歌单 {playlist_id}",
+            "trackIds": [{"id": playlist_id * 1000 + i} for i in range(count)],
+        }})
+
+    async def netease_album(self, request: Request) -> Response:
+        await self._enter("netease.album")
+        album_id = request.path_params["album_id"]
+        songs = [self._netease_song(request, album_id * 100 + i) for i in range(10)]
+        return JSONResponse({"code": 200, "album": {
+            "id": album_id, "name": f"基准专辑 {album_id}", "picUrl": f"{self._base(request)}/media/cover/{album_id}.jpg",
+        }, "songs": songs})
+
+    # ----- 媒体 -----
+    async def media(self, request: Request) -> Response:
+        kind = request.path_params["kind"]
+        media = await asyncio.to_thread(self._media_for, kind, request.path_params["name"])
+        if media is None:
+            return Response(status_code=404)
+        self._count(f"media.{kind}")
+        start, end = 0, media.size - 1
+        status = 200
+        range_header = request.headers.get("range", "")
+        m = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header.strip())
+        if m:
+            start = int(m.group(1))
+            if m.group(2):
+                end = min(end, int(m.group(2)))
+            if start >= media.size:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{media.size}"})
+            status = 206
+            self._count(f"media.{kind}.range")
+        headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end}/{media.size}"
+        if request.method == "HEAD":
+            return Response(status_code=status, headers=headers, media_type=media.mime)
+        drop_at = 0
+        if status == 200 and self.config.media_drop_at:
+            with self._lock:
+                if request.url.path not in self._dropped:
+                    self._dropped.add(request.url.path)
+                    drop_at = self.config.media_drop_at
+        bandwidth = self.config.bandwidth
+
+        async def body():
+            offset = start
+            piece = 64 * 1024
+            while offset <= end:
+                if drop_at and offset >= drop_at:
+                    self._count(f"media.{kind}.dropped")
+                    raise ConnectionResetError("模拟断流")
+                n = min(piece, end - offset + 1)
+                if drop_at:
+                    n = min(n, drop_at - offset)
+                data = media.read(offset, n)
+                offset += len(data)
+                self._count(f"media.{kind}.bytes", len(data))
+                yield data
+                if bandwidth > 0:
+                    await asyncio.sleep(len(data) / bandwidth)
+
+        return StreamingResponse(body(), status_code=status, headers=headers, media_type=media.mime)
+
+    async def set_config(self, request: Request) -> Response:
+        self.config.update(await request.json())
+        return JSONResponse(self.config.as_dict())
+
+    async def get_stats(self, request: Request) -> Response:
+        with self._lock:
+            return JSONResponse({"stats": dict(self.stats)})
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地假上游（抖音/哔哩哔哩/网易云）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5300)
+    parser.add_argument("--bandwidth", type=int, default=0, help="媒体限速（字节/秒）")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeUpstreams(UpstreamConfig(latency=args.latency, bandwidth=args.bandwidth))
+    base = f"http://{args.host}:{args.port}"
+    for key, value in FakeUpstreams.env_for(base).items():
+        print(f"export {key}={value}")
+    print(f"# 抖音分享链接：{base}/douyin/s/bench  哔哩哔哩：{base}/bilibili/video/{BILIBILI_BVID}  网易云：任意关键词或歌曲 ID")
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+在后台线程中运行 Starlette 应用（uvicorn，监听 127.0.0.1 随机端口），供基准脚本启动假上游服务。
+"""
+
+import socket
+import threading
+import time
+
+import uvicorn
+
+
+class BackgroundServer:
+    """with BackgroundServer(app) as base_url: ...；退出时停止服务。"""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0) -> None:
+        if port == 0:
+            with socket.socket() as s:
+                s.bind((host, 0))
+                port = s.getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self) -> str:
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("基准用假服务启动失败")
+            time.sleep(0.01)
+        return self.url
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -7,14 +7,22 @@ import os
 import re
 import shutil
 import subprocess
-import tempfile
+import threading
 import time
 import urllib.parse
-from functools import reduce
+from functools import lru_cache
 from hashlib import md5
 
 import httpx
 
+from . import metrics
+from . import spool
+from . import state
+from . import transport
+
+# API 根地址；可用环境变量 BILIBILI_API_BASE_URL 指向本地假服务（基准测试）
+API_BASE_URL = os.environ.get("BILIBILI_API_BASE_URL", "https://api.bilibili.com").rstrip("/")
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
     "referer": "https://www.bilibili.com",
@@ -28,26 +36,31 @@ MIXIN_KEY_ENC_TAB = [
 ]
 
 
+# WBI 签名时从参数值中剔除的字符
+_WBI_STRIP_CHARS = str.maketrans("", "", "!'()*")
+_UNICODE_ESCAPE_RE = re.compile(r"\\u([0-9a-fA-F]{4})")
+# 分享文本中的第一个链接（字符集等价于 [a-zA-Z0-9] | [$-_.+!*(),] | %XX 的逐字符交替，后者已被 $-_ 区间覆盖）
+_SHARE_URL_RE = re.compile(r"https?://[!$-_a-z]+")
+
+
+@lru_cache(maxsize=8)
 def _get_mixin_key(orig: str) -> str:
-    return reduce(lambda s, i: s + orig[i], MIXIN_KEY_ENC_TAB, "")[:32]
+    return "".join([orig[i] for i in MIXIN_KEY_ENC_TAB[:32]])
 
 
-def _enc_wbi(params: dict, img_key: str, sub_key: str) -> dict:
+def _enc_wbi(params: dict, img_key: str, sub_key: str, wts: int | None = None) -> dict:
+    """WBI 签名：加入 wts（默认当前时间）、按键排序、剔除值中的 !'()* 后计算 w_rid。"""
     mixin_key = _get_mixin_key(img_key + sub_key)
-    params = dict(params)
-    params["wts"] = round(time.time())
-    params = dict(sorted(params.items()))
-    params = {
-        k: "".join(filter(lambda c: c not in "!'()*", str(v)))
-        for k, v in params.items()
-    }
-    query = urllib.parse.urlencode(params)
-    params["w_rid"] = md5((query + mixin_key).encode()).hexdigest()
-    return params
+    items = dict(params)
+    items["wts"] = round(time.time()) if wts is None else wts
+    signed = {k: str(items[k]).translate(_WBI_STRIP_CHARS) for k in sorted(items)}
+    query = urllib.parse.urlencode(signed)
+    signed["w_rid"] = md5((query + mixin_key).encode()).hexdigest()
+    return signed
 
 
 def _unescape_url(url: str) -> str:
-    return re.sub(r"\\u([0-9a-fA-F]{4})", lambda m: chr(int(m.group(1), 16)), url)
+    return _UNICODE_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), url)
 
 
 def _sanitize_filename(name: str) -> str:
@@ -55,7 +68,7 @@ def _sanitize_filename(name: str) -> str:
 
 
 def get_wbi_keys(client: httpx.Client) -> tuple[str, str]:
-    r = client.get("https://api.bilibili.com/x/web-interface/nav", headers=HEADERS)
+    r = client.get(f"{API_BASE_URL}/x/web-interface/nav", headers=HEADERS)
     r.raise_for_status()
     data = r.json()
     wbi = data["data"]["wbi_img"]
@@ -64,19 +77,42 @@ def get_wbi_keys(client: httpx.Client) -> tuple[str, str]:
     return img_key, sub_key
 
 
+# WBI 密钥每天轮换一次，缓存一段时间（MCP_STATE_BACKEND=redis 时多 worker 共享），多 P 并发签名时只请求一次 nav
+WBI_KEYS_TTL = 3600.0
+_wbi_keys_cache = state.cache("bilibili:wbi_keys", maxsize=1, ttl=WBI_KEYS_TTL)
+_wbi_keys_lock = threading.Lock()
+
+
+def get_cached_wbi_keys(client: httpx.Client) -> tuple[str, str]:
+    """返回缓存的 (img_key, sub_key)，过期或未缓存时经 get_wbi_keys 重新获取。"""
+    keys = _wbi_keys_cache.get("keys")
+    if keys:
+        return tuple(keys)
+    with _wbi_keys_lock:
+        keys = _wbi_keys_cache.get("keys")
+        if keys:
+            return tuple(keys)
+        keys = get_wbi_keys(client)
+        _wbi_keys_cache.set("keys", list(keys))
+        return keys
+
+
+def _invalidate_wbi_keys() -> None:
+    _wbi_keys_cache.pop("keys")
+
+
 def parse_bilibili_share_url(share_text: str) -> dict:
     """
     从分享文本/链接中解析出 bvid。
     返回: {"bvid": "BVxxx", "title": "", "cid": ""}（title/cid 需后续 get_video_info 获取）
     """
-    urls = re.findall(r"https?://(?:[a-zA-Z0-9]|[$-_.+!*(),]|(?:%[0-9a-fA-F]{2}))+", share_text)
-    if not urls:
+    m = _SHARE_URL_RE.search(share_text)
+    if not m:
         raise ValueError("未找到有效的哔哩哔哩链接")
-    url = urls[0].strip()
-    with httpx.Client(timeout=15.0, follow_redirects=True, headers=HEADERS) as client:
-        r = client.get(url)
-        r.raise_for_status()
-        final = str(r.url)
+    url = m.group(0).strip()
+    r = transport.get_client(url).get(url, headers=HEADERS, timeout=15.0, follow_redirects=True)
+    r.raise_for_status()
+    final = str(r.url)
     match = re.search(r"(BV[\w]+)", final, re.I)
     if not match:
         raise ValueError("无法从链接中解析视频 BV 号")
@@ -85,46 +121,86 @@ def parse_bilibili_share_url(share_text: str) -> dict:
 
 
 def get_video_info(bvid: str, cookie: str = "") -> dict:
-    """获取视频信息（title, cid, owner 等）。"""
+    """获取视频信息（title, cid, owner 等）。pages 为分 P 列表 [{page, cid, part, duration}, ...]。"""
     h = {**HEADERS}
     if cookie:
         h["cookie"] = cookie
-    with httpx.Client(timeout=15.0, headers=h) as client:
-        r = client.get(f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}")
-        r.raise_for_status()
-        data = r.json()
+    url = f"{API_BASE_URL}/x/web-interface/view?bvid={bvid}"
+    r = transport.get_client(url).get(url, headers=h, timeout=15.0)
+    r.raise_for_status()
+    data = r.json()
     if data.get("code") != 0:
         raise RuntimeError(data.get("message", "获取视频信息失败"))
     d = data["data"]
+    pages = [
+        {
+            "page": p.get("page") or i + 1,
+            "cid": p.get("cid"),
+            "part": p.get("part", ""),
+            "duration": p.get("duration", 0),
+        }
+        for i, p in enumerate(d.get("pages") or [])
+        if p.get("cid")
+    ]
+    if not pages and d.get("cid"):
+        pages = [{"page": 1, "cid": d.get("cid"), "part": "", "duration": d.get("duration", 0)}]
     return {
         "bvid": bvid,
         "title": d.get("title", ""),
         "cid": d.get("cid"),
         "owner": (d.get("owner") or {}).get("name", ""),
         "pic": d.get("pic", ""),
+        "pages": pages,
     }
 
 
+def select_pages(pages: list[dict], selection: str) -> list[dict]:
+    """
+    按选择串筛选分 P。selection 为 "all"/"*" 表示全部，或如 "1-3,5" 的页码列表（从 1 开始）。
+    返回保持原顺序的分 P 列表；页码超出范围时抛 ValueError。
+    """
+    spec = (selection or "").strip().lower()
+    if spec in ("all", "*"):
+        return list(pages)
+    by_page = {p["page"]: p for p in pages}
+    wanted: set[int] = set()
+    for part in spec.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            start = int(lo) if lo.strip() else 1
+            end = int(hi) if hi.strip() else max(by_page or [0])
+            wanted.update(range(start, end + 1))
+        else:
+            wanted.add(int(part))
+    missing = sorted(n for n in wanted if n not in by_page)
+    if missing:
+        raise ValueError(f"分 P 不存在：{missing}（共 {len(pages)} P）")
+    if not wanted:
+        raise ValueError("未选择任何分 P")
+    return [p for p in pages if p["page"] in wanted]
+
+
 def _download_to_path(url: str, path: str, headers: dict | None = None) -> None:
     h = headers or HEADERS
     last_err = None
     for attempt in range(5):
         try:
-            with httpx.Client(
-                timeout=httpx.Timeout(30.0, read=600.0),
-                headers=h,
-                http2=False,
-                follow_redirects=True,
-            ) as client:
-                r = client.get(url)
+            client = transport.get_client(url, http2=False)
+            with client.stream(
+                "GET", url, headers=h, timeout=httpx.Timeout(30.0, read=600.0), follow_redirects=True,
+            ) as r:
                 r.raise_for_status()
-                with open(path, "wb") as f:
-                    for chunk in r.iter_bytes(chunk_size=65536):
-                        f.write(chunk)
+                with metrics.stage("bilibili", "download") as st, open(path, "wb") as f:
+                    st.bytes = n = sum(f.write(chunk) for chunk in r.iter_bytes(chunk_size=65536))
+            metrics.add_bytes("bilibili", "download", n)
             return
         except Exception as e:
             last_err = e
             if attempt < 4:
+                metrics.record_retry()
                 time.sleep(3.0 * (attempt + 1))
             else:
                 raise
@@ -132,50 +208,95 @@ def _download_to_path(url: str, path: str, headers: dict | None = None) -> None:
         raise last_err
 
 
-def download_bilibili_video_to_path(bvid: str, path: str, cookie: str = "") -> int:
-    """
-    下载哔哩哔哩视频到本地文件（DASH 会合并音视频，durl 会合并分段）。
-    传入 cookie 可获取更高画质（未登录通常只有 360p/480p，登录后可达 1080p）。
-    返回写入字节数。
-    """
+def get_play_stream(bvid: str, cid: int | str, cookie: str = "") -> dict:
+    """获取某一 P 的播放流信息（data 字段，含 dash 或 durl）。WBI 签名复用缓存的密钥。"""
     h = {**HEADERS}
     if cookie:
         h["cookie"] = cookie
-    info = get_video_info(bvid, cookie)
-    cid = info["cid"]
-    title = _sanitize_filename(info["title"]) or bvid
     last_err = None
     for attempt in range(4):
         try:
-            with httpx.Client(
-                timeout=httpx.Timeout(30.0, read=60.0),
-                headers=h,
-                http2=False,
-            ) as client:
-                img_key, sub_key = get_wbi_keys(client)
-                params = _enc_wbi({
-                    "bvid": bvid,
-                    "cid": str(cid),
-                    "qn": "80",
-                    "fnval": "16",
-                    "fnver": "0",
-                    "fourk": "1",
-                    "otype": "json",
-                    "platform": "web",
-                }, img_key, sub_key)
-                r = client.get("https://api.bilibili.com/x/player/wbi/playurl", params=params)
-                r.raise_for_status()
-                data = r.json()
+            playurl = f"{API_BASE_URL}/x/player/wbi/playurl"
+            client = transport.get_client(playurl)
+            img_key, sub_key = get_cached_wbi_keys(client)
+            params = _enc_wbi({
+                "bvid": bvid,
+                "cid": str(cid),
+                "qn": "80",
+                "fnval": "16",
+                "fnver": "0",
+                "fourk": "1",
+                "otype": "json",
+                "platform": "web",
+            }, img_key, sub_key)
+            r = client.get(playurl, params=params, headers=h, timeout=httpx.Timeout(30.0, read=60.0))
+            r.raise_for_status()
+            data = r.json()
             break
         except Exception as e:
             last_err = e
+            # 签名失败可能是密钥已轮换，下次重试重新拉取
+            _invalidate_wbi_keys()
             if attempt < 3:
+                metrics.record_retry()
                 time.sleep(2.0 * (attempt + 1))
             else:
                 raise
     if data.get("code") != 0:
+        if data.get("code") == -403:
+            _invalidate_wbi_keys()
         raise RuntimeError(data.get("message", "获取播放地址失败"))
-    stream = data.get("data") or {}
+    return data.get("data") or {}
+
+
+def estimate_spool_bytes(stream: dict) -> int | None:
+    """
+    按播放流信息估算下载与合并期间占用的暂存空间（字节）；无法估算时返回 None。
+    DASH：所选视频+音频码率 × 时长，分段文件与合并输出同时存在，按两倍计；
+    durl：各段 size 之和，多段时同样要再写一份合并输出。
+    """
+    if "dash" in stream:
+        dash = stream["dash"]
+        duration = dash.get("duration") or 0
+        streams = (dash.get("video") or [])[:1] + (dash.get("audio") or [])[:1]
+        bandwidth = sum(int(s.get("bandwidth") or 0) for s in streams)
+        if not duration or not bandwidth:
+            return None
+        return 2 * int(bandwidth * duration / 8)
+    durl = stream.get("durl") or []
+    if durl and all(item.get("size") for item in durl):
+        total = sum(int(item["size"]) for item in durl)
+        return total if len(durl) == 1 else 2 * total
+    return None
+
+
+def download_bilibili_video_to_path(
+    bvid: str,
+    path: str,
+    cookie: str = "",
+    cid: int | str | None = None,
+    reservation: spool.Reservation | None = None,
+) -> int:
+    """
+    下载哔哩哔哩视频到本地文件（DASH 会合并音视频，durl 会合并分段）。
+    传入 cookie 可获取更高画质（未登录通常只有 360p/480p，登录后可达 1080p）。
+    cid 指定分 P；不传则下载第 1 P。
+    reservation 为调用方的暂存预留（path 应由它创建）：拿到播放流后按估算大小调整预留，中间文件也放在暂存目录中；
+    不传时单独预留。
+    返回写入字节数。
+    """
+    if reservation is None:
+        with spool.reserve() as res:
+            return download_bilibili_video_to_path(bvid, path, cookie, cid, reservation=res)
+    h = {**HEADERS}
+    if cookie:
+        h["cookie"] = cookie
+    if cid is None:
+        cid = get_video_info(bvid, cookie)["cid"]
+    stream = get_play_stream(bvid, cid, cookie)
+    estimated = estimate_spool_bytes(stream)
+    if estimated is not None:
+        reservation.resize(estimated)
 
     if "dash" in stream:
         dash = stream["dash"]
@@ -187,21 +308,23 @@ def download_bilibili_video_to_path(bvid: str, path: str, cookie: str = "") -> i
         audio_url = None
         if audio_list:
             audio_url = _unescape_url(audio_list[0]["baseUrl"])
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = reservation.temp_dir()
         try:
             video_path = f"{tmp_dir}/video.m4s"
             _download_to_path(video_url, video_path, headers=h)
             if audio_url:
                 audio_path = f"{tmp_dir}/audio.m4s"
                 _download_to_path(audio_url, audio_path, headers=h)
-                subprocess.run([
-                    "ffmpeg", "-y", "-i", video_path, "-i", audio_path,
-                    "-c:v", "copy", "-c:a", "copy", "-f", "mp4", path
-                ], check=True, capture_output=True)
+                with metrics.stage("bilibili", "mux"):
+                    subprocess.run([
+                        "ffmpeg", "-y", "-i", video_path, "-i", audio_path,
+                        "-c:v", "copy", "-c:a", "copy", "-f", "mp4", path
+                    ], check=True, capture_output=True)
             else:
-                subprocess.run([
-                    "ffmpeg", "-y", "-i", video_path, "-c", "copy", "-f", "mp4", path
-                ], check=True, capture_output=True)
+                with metrics.stage("bilibili", "mux"):
+                    subprocess.run([
+                        "ffmpeg", "-y", "-i", video_path, "-c", "copy", "-f", "mp4", path
+                    ], check=True, capture_output=True)
         finally:
             shutil.rmtree(tmp_dir, ignore_errors=True)
         return os.path.getsize(path)
@@ -214,7 +337,7 @@ def download_bilibili_video_to_path(bvid: str, path: str, cookie: str = "") -> i
             url = _unescape_url(durl[0]["url"])
             _download_to_path(url, path, headers=h)
             return os.path.getsize(path)
-        tmp_dir = tempfile.mkdtemp()
+        tmp_dir = reservation.temp_dir()
         try:
             seg_paths = []
             for i, item in enumerate(durl):
@@ -223,9 +346,10 @@ def download_bilibili_video_to_path(bvid: str, path: str, cookie: str = "") -> i
                 _download_to_path(seg_url, seg_path, headers=h)
                 seg_paths.append(seg_path)
             concat = "|".join(seg_paths)
-            subprocess.run([
-                "ffmpeg", "-y", "-i", f"concat:{concat}", "-c", "copy", path
-            ], check=True, capture_output=True)
+            with metrics.stage("bilibili", "mux"):
+                subprocess.run([
+                    "ffmpeg", "-y", "-i", f"concat:{concat}", "-c", "copy", path
+                ], check=True, capture_output=True)
         finally:
             shutil.rmtree(tmp_dir, ignore_errors=True)
         return os.path.getsize(path)
@@ -0,0 +1,122 @@
+"""
+分块上传缓冲池：进程内所有上传共用一个字节预算（MCP_CHUNK_MEMORY_BUDGET，默认 256 MiB），
+分块数据 readinto / 拷贝进预分配、可复用的 bytearray，再以 memoryview 交给 HTTP 请求，
+不再为每个分块分配新的 bytes；预算用尽时后来的上传排队等待，常驻内存不随并发数增长。
+
+另提供 Base64 的增量解码（按块解码后写入缓冲区），避免整段解码出一份完整副本。
+"""
+
+import binascii
+import contextlib
+import os
+import re
+import threading
+from collections.abc import Iterator
+
+from . import metrics
+
+MIB = 1024 * 1024
+# memoryview 按此大小切片交给 HTTP 客户端，发送时每次只复制一片
+_BODY_SLICE = MIB
+
+BUDGET = int(os.environ.get("MCP_CHUNK_MEMORY_BUDGET", str(256 * MIB)))
+
+_cond = threading.Condition()
+# 空闲缓冲区按容量分组；同一存储策略的分块大小相同，基本都能直接复用
+_idle: dict[int, list[bytearray]] = {}
+_idle_bytes = 0
+_in_use_bytes = 0
+
+
+def _update_gauges() -> None:
+    metrics.CHUNK_BUFFER_BYTES.labels("in_use").set(_in_use_bytes)
+    metrics.CHUNK_BUFFER_BYTES.labels("idle").set(_idle_bytes)
+
+
+def _take(size: int) -> bytearray | None:
+    """在预算内取一个容量为 size 的缓冲区（调用方持有 _cond）；需等待时返回 None。"""
+    global _idle_bytes, _in_use_bytes
+    pool = _idle.get(size)
+    if pool:
+        buf = pool.pop()
+        _idle_bytes -= size
+        _in_use_bytes += size
+        return buf
+    # 没有同容量的空闲缓冲区：先丢弃其他容量的空闲缓冲区腾出预算
+    while _in_use_bytes + _idle_bytes + size > BUDGET and _idle_bytes:
+        capacity = next(c for c, bufs in _idle.items() if bufs)
+        _idle[capacity].pop()
+        _idle_bytes -= capacity
+    # 超过整个预算的单个分块在没有其他上传占用时放行，避免永远等不到
+    if _in_use_bytes + size > BUDGET and _in_use_bytes:
+        return None
+    _in_use_bytes += size
+    return bytearray(size)
+
+
+def _give(buf: bytearray) -> None:
+    """归还缓冲区（调用方持有 _cond）；放回空闲池后总量超预算则直接丢弃。"""
+    global _idle_bytes, _in_use_bytes
+    size = len(buf)
+    _in_use_bytes -= size
+    if _in_use_bytes + _idle_bytes + size <= BUDGET:
+        _idle.setdefault(size, []).append(buf)
+        _idle_bytes += size
+
+
+@contextlib.contextmanager
+def acquire(size: int) -> Iterator[memoryview]:
+    """借用一个 size 字节的缓冲区（memoryview），预算不足时阻塞等待；with 结束后归还，不得再引用。"""
+    with _cond:
+        while (buf := _take(size)) is None:
+            _cond.wait()
+        _update_gauges()
+    try:
+        yield memoryview(buf)
+    finally:
+        with _cond:
+            _give(buf)
+            _update_gauges()
+            _cond.notify_all()
+
+
+def request_body(chunk: bytes | memoryview) -> tuple[int, bytes | list[memoryview]]:
+    """把分块转成 httpx 的请求体，返回 (字节数, content)。memoryview 按 1 MiB 切片，不复制整个分块。"""
+    if isinstance(chunk, bytes):
+        return len(chunk), chunk
+    view = memoryview(chunk).cast("B")
+    return view.nbytes, [view[i:i + _BODY_SLICE] for i in range(0, view.nbytes, _BODY_SLICE)]
+
+
+def readinto_full(f, view: memoryview) -> int:
+    """从文件读满 view（到文件末尾为止），返回读入字节数。"""
+    filled = 0
+    while filled < len(view):
+        n = f.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+_WHITESPACE_RE = re.compile(r"\s")
+# 每次解码的 Base64 字符数（4 的倍数），对应 3 MiB 原始数据
+_B64_BLOCK = 4 * MIB
+
+
+def normalize_base64(encoded: str) -> str:
+    """去掉换行等空白（只有含空白时才复制）。"""
+    return "".join(encoded.split()) if _WHITESPACE_RE.search(encoded) else encoded
+
+
+def base64_size(encoded: str) -> int:
+    """已规整（无空白）的 Base64 解码后的字节数；长度不是 4 的倍数时抛 binascii.Error。"""
+    if len(encoded) % 4:
+        raise binascii.Error("Base64 长度不是 4 的倍数（缺少填充）")
+    return len(encoded) // 4 * 3 - encoded[-2:].count("=")
+
+
+def iter_base64(encoded: str) -> Iterator[bytes]:
+    """按块增量解码已规整的 Base64，每块至多 3 MiB。"""
+    for start in range(0, len(encoded), _B64_BLOCK):
+        yield binascii.a2b_base64(encoded[start:start + _B64_BLOCK])
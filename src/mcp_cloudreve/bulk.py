@@ -0,0 +1,130 @@
+"""
+批量文件操作：移动、复制、删除、重命名，一次工具调用处理成千上万个 URI。
+
+  CLOUDREVE_BULK_BATCH_SIZE    移动/复制/删除一次请求包含的 URI 数（默认 100）
+  CLOUDREVE_BULK_CONCURRENCY   同时进行的请求数（默认 4）
+
+移动/复制/删除使用 v4 接收 URI 列表的批量接口（POST /file/move、DELETE /file），按父文件夹分组后切成批；
+重命名接口一次只能改一个对象，按并发上限逐个请求。某一批部分失败时，按响应中的 aggregated_error 只把
+失败项记为失败，其余视为成功；一批整体失败不影响其他批。完成后使相关文件夹的列表缓存失效。
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from . import cloudreve
+from . import listing
+from . import metrics
+from . import pipeline
+
+BATCH_SIZE = max(1, int(os.environ.get("CLOUDREVE_BULK_BATCH_SIZE", "100")))
+CONCURRENCY = max(1, int(os.environ.get("CLOUDREVE_BULK_CONCURRENCY", "4")))
+
+
+def _batches(uris: list[str], batch_size: int) -> list[list[str]]:
+    """去重、去掉末尾 /，按父文件夹分组后每 batch_size 个一批（同一批的对象位于同一文件夹）。"""
+    groups: dict[str, list[str]] = {}
+    for uri in dict.fromkeys(u.strip().rstrip("/") for u in uris if u.strip()):
+        groups.setdefault(uri.rsplit("/", 1)[0], []).append(uri)
+    return [members[i:i + batch_size] for members in groups.values() for i in range(0, len(members), batch_size)]
+
+
+def _run(
+    batches: list[list[str]],
+    send: Callable[[list[str]], None],
+    concurrency: int | None,
+) -> dict:
+    """以有限并发执行 send(batch)，返回 {done, failed: [{uri, error}], requests}。"""
+    done: list[str] = []
+    failed: list[dict] = []
+
+    def run_batch(batch: list[str]) -> tuple[list[str], list[dict]]:
+        try:
+            send(batch)
+        except cloudreve.CloudreveError as e:
+            if not e.aggregated:
+                return [], [{"uri": uri, "error": str(e)} for uri in batch]
+            errors = {uri.rstrip("/"): item for uri, item in e.aggregated.items()}
+            return (
+                [uri for uri in batch if uri not in errors],
+                [{"uri": uri, "error": (errors[uri] or {}).get("msg") or str(e)} for uri in batch if uri in errors],
+            )
+        except Exception as e:
+            return [], [{"uri": uri, "error": str(e) or type(e).__name__} for uri in batch]
+        return batch, []
+
+    workers = min(concurrency or CONCURRENCY, len(batches))
+    if workers <= 1:
+        outcomes = [run_batch(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cloudreve-bulk") as pool:
+            outcomes = list(pool.map(metrics.in_context(run_batch), batches))
+    for ok, bad in outcomes:
+        done.extend(ok)
+        failed.extend(bad)
+    return {"done": done, "failed": failed, "requests": len(batches)}
+
+
+def _invalidate(tokens: pipeline.TokenState, uris: list[str]) -> None:
+    for uri in uris:
+        listing.invalidate(tokens, uri)
+
+
+def move(
+    tokens: pipeline.TokenState,
+    uris: list[str],
+    dst: str,
+    *,
+    copy: bool = False,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> dict:
+    """把 uris 移动（copy 为 True 时复制）到文件夹 dst，返回 {done, failed, requests}。"""
+    dst = pipeline.normalize_folder_uri(dst)
+    result = _run(
+        _batches(uris, batch_size or BATCH_SIZE),
+        lambda batch: tokens.call(cloudreve.move_files, batch, dst, copy=copy),
+        concurrency,
+    )
+    _invalidate(tokens, ([] if copy else result["done"]) + [dst])
+    return result
+
+
+def delete(
+    tokens: pipeline.TokenState,
+    uris: list[str],
+    *,
+    unlink: bool = False,
+    skip_soft_delete: bool = False,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> dict:
+    """删除 uris（默认进回收站），返回 {done, failed, requests}。"""
+    result = _run(
+        _batches(uris, batch_size or BATCH_SIZE),
+        lambda batch: tokens.call(cloudreve.delete_files, batch, unlink=unlink, skip_soft_delete=skip_soft_delete),
+        concurrency,
+    )
+    _invalidate(tokens, result["done"])
+    return result
+
+
+def rename(
+    tokens: pipeline.TokenState,
+    renames: dict[str, str],
+    *,
+    concurrency: int | None = None,
+) -> dict:
+    """按 {uri: 新名称} 重命名，每个对象一个请求，返回 {done, failed, requests}；done 中为原 URI。"""
+    for uri, new_name in renames.items():
+        if not new_name or "/" in new_name:
+            raise ValueError(f"{uri} 的新名称无效：{new_name!r}")
+    targets = {uri.strip().rstrip("/"): new_name for uri, new_name in renames.items()}
+    result = _run(
+        [[uri] for uri in targets],
+        lambda batch: tokens.call(cloudreve.rename_file, batch[0], targets[batch[0]]),
+        concurrency,
+    )
+    _invalidate(tokens, result["done"] + [f"{uri.rsplit('/', 1)[0]}/{targets[uri]}" for uri in result["done"]])
+    return result
@@ -4,9 +4,11 @@ Cloudreve API v4 客户端
 """
 
 import os
+import urllib.parse
 from typing import Any
 
-import httpx
+from . import buffers
+from . import transport
 
 DEFAULT_BASE_URL = "https://cloudreve.2000gallery.art/api/v4"
 
@@ -14,6 +16,18 @@ DEFAULT_BASE_URL = "https://cloudreve.2000gallery.art/api/v4"
 RefreshedTokens = dict[str, Any] | None
 
 
+class CloudreveError(RuntimeError):
+    """
+    接口返回 code != 0；code 为 Cloudreve 的业务错误码（如 40016 / 404 表示对象不存在）。
+    批量操作部分失败时 aggregated 为 {uri: {code, msg}}（响应中的 aggregated_error），其余对象已处理成功。
+    """
+
+    def __init__(self, msg: str, code: int | None = None, aggregated: dict | None = None) -> None:
+        super().__init__(msg)
+        self.code = code
+        self.aggregated = aggregated or {}
+
+
 def _base_url() -> str:
     url = os.environ.get("CLOUDREVE_BASE_URL", DEFAULT_BASE_URL)
     return url.rstrip("/")
@@ -32,30 +46,32 @@ def _request(
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
-    with httpx.Client(timeout=30.0) as client:
-        r = client.request(
+    r = transport.get_client(url).request(
+        method,
+        url,
+        headers=headers,
+        json=json,
+        content=content,
+        timeout=30.0,
+    )
+    if r.status_code == 401 and refresh_token and token:
+        new_tokens = refresh_token_api(refresh_token)
+        data, _ = _request(
             method,
-            url,
-            headers=headers,
+            path,
+            token=new_tokens["access_token"],
+            refresh_token=new_tokens.get("refresh_token"),
             json=json,
             content=content,
         )
-        if r.status_code == 401 and refresh_token and token:
-            new_tokens = refresh_token_api(refresh_token)
-            data, _ = _request(
-                method,
-                path,
-                token=new_tokens["access_token"],
-                refresh_token=new_tokens.get("refresh_token"),
-                json=json,
-                content=content,
-            )
-            return (data, new_tokens)
-        r.raise_for_status()
-        data = r.json()
+        return (data, new_tokens)
+    r.raise_for_status()
+    data = r.json()
     if data.get("code", 0) != 0:
         msg = data.get("msg") or ""
-        raise RuntimeError(msg.strip() or f"请求失败(code={data.get('code')})")
+        raise CloudreveError(
+            msg.strip() or f"请求失败(code={data.get('code')})", data.get("code"), data.get("aggregated_error"),
+        )
     return (data, None)
 
 
@@ -164,35 +180,72 @@ def create_upload_session(
     return (data["data"], refreshed)
 
 
+def upload_callback(
+    access_token: str,
+    policy_type: str,
+    session_id: str,
+    callback_secret: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[None, RefreshedTokens]:
+    """直传存储（S3 / OneDrive 等）完成后通知 Cloudreve 校验并落库文件。S3 兼容类存储为 GET，OneDrive 为 POST。"""
+    _, refreshed = _request(
+        "POST" if policy_type == "onedrive" else "GET",
+        f"/callback/{policy_type}/{session_id}/{callback_secret}",
+        token=access_token,
+        refresh_token=refresh_token,
+    )
+    return (None, refreshed)
+
+
+def delete_upload_session(
+    access_token: str,
+    session_id: str,
+    uri: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[None, RefreshedTokens]:
+    """删除（取消）上传会话，同时清理占位文件。用于提前创建的会话最终未使用的情况。"""
+    _, refreshed = _request(
+        "DELETE",
+        "/file/upload",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"id": session_id, "uri": uri},
+    )
+    return (None, refreshed)
+
+
 def upload_file_chunk(
     access_token: str,
     session_id: str,
     index: int,
-    chunk: bytes,
+    chunk: bytes | memoryview,
     *,
     refresh_token: str | None = None,
 ) -> tuple[None, RefreshedTokens]:
-    """上传一个分块。API 要求：除最后一块外，Content-Length 必须与创建会话时的 chunk_size 一致；最后一块可更小。分块须按 index 从 0 起顺序上传。若 401 且提供 refresh_token 则自动刷新后重试。"""
+    """上传一个分块。API 要求：除最后一块外，Content-Length 必须与创建会话时的 chunk_size 一致；最后一块可更小。分块须按 index 从 0 起顺序上传。若 401 且提供 refresh_token 则自动刷新后重试。
+    chunk 可为缓冲池中的 memoryview：按 1 MiB 切片发送，不复制整个分块。"""
     url = f"{_base_url()}/file/upload/{session_id}/{index}"
+    length, content = buffers.request_body(chunk)
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/octet-stream",
-        "Content-Length": str(len(chunk)),
+        "Content-Length": str(length),
     }
-    with httpx.Client(timeout=60.0) as client:
-        r = client.post(url, headers=headers, content=chunk)
-        if r.status_code == 401 and refresh_token:
-            new_tokens = refresh_token_api(refresh_token)
-            upload_file_chunk(
-                new_tokens["access_token"],
-                session_id,
-                index,
-                chunk,
-                refresh_token=new_tokens.get("refresh_token"),
-            )
-            return (None, new_tokens)
-        r.raise_for_status()
-        data = r.json()
+    r = transport.get_client(url).post(url, headers=headers, content=content, timeout=60.0)
+    if r.status_code == 401 and refresh_token:
+        new_tokens = refresh_token_api(refresh_token)
+        upload_file_chunk(
+            new_tokens["access_token"],
+            session_id,
+            index,
+            chunk,
+            refresh_token=new_tokens.get("refresh_token"),
+        )
+        return (None, new_tokens)
+    r.raise_for_status()
+    data = r.json()
     if data.get("code", 0) != 0:
         msg = data.get("msg") or ""
         raise RuntimeError(msg.strip() or f"上传分块 {index} 失败(code={data.get('code')})")
@@ -215,3 +268,186 @@ def create_direct_links(
     )
     raw = data.get("data") or []
     return (raw if isinstance(raw, list) else [], refreshed)
+
+
+def rename_file(
+    access_token: str,
+    uri: str,
+    new_name: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[dict, RefreshedTokens]:
+    """重命名文件或文件夹，返回 (文件信息, 若刷新则返回新 token 信息)。"""
+    data, refreshed = _request(
+        "POST",
+        "/file/rename",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"uri": uri, "new_name": new_name},
+    )
+    return (data.get("data") or {}, refreshed)
+
+
+def move_files(
+    access_token: str,
+    uris: list[str],
+    dst: str,
+    *,
+    copy: bool = False,
+    refresh_token: str | None = None,
+) -> tuple[None, RefreshedTokens]:
+    """一次请求把多个文件/文件夹移动（copy 为 True 时复制）到文件夹 dst。部分失败时抛 CloudreveError（aggregated 列出失败项）。"""
+    _, refreshed = _request(
+        "POST",
+        "/file/move",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"uris": uris, "dst": dst, "copy": copy},
+    )
+    return (None, refreshed)
+
+
+def delete_files(
+    access_token: str,
+    uris: list[str],
+    *,
+    unlink: bool = False,
+    skip_soft_delete: bool = False,
+    refresh_token: str | None = None,
+) -> tuple[None, RefreshedTokens]:
+    """
+    一次请求删除多个文件/文件夹。默认移入回收站；skip_soft_delete 为 True 时直接永久删除，
+    unlink 为 True 时只删除文件记录、保留存储中的实体。部分失败时抛 CloudreveError（aggregated 列出失败项）。
+    """
+    _, refreshed = _request(
+        "DELETE",
+        "/file",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"uris": uris, "unlink": unlink, "skip_soft_delete": skip_soft_delete},
+    )
+    return (None, refreshed)
+
+
+def create_remote_download(
+    access_token: str,
+    src: list[str],
+    dst: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[list[dict], RefreshedTokens]:
+    """创建离线下载任务：由 Cloudreve 服务端下载 src 中的 URL 到文件夹 dst，返回 (任务列表, 若刷新则返回新 token 信息)。需用户组开启离线下载。"""
+    data, refreshed = _request(
+        "POST",
+        "/workflow/download",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"src": src, "dst": dst},
+    )
+    raw = data.get("data") or []
+    return (raw if isinstance(raw, list) else [raw], refreshed)
+
+
+def list_tasks(
+    access_token: str,
+    category: str,
+    *,
+    page_size: int = 50,
+    next_page_token: str = "",
+    refresh_token: str | None = None,
+) -> tuple[dict, RefreshedTokens]:
+    """列出任务，category 为 general / downloading / downloaded，返回 ({tasks, pagination}, 若刷新则返回新 token 信息)。"""
+    query = {"category": category, "page_size": page_size}
+    if next_page_token:
+        query["next_page_token"] = next_page_token
+    data, refreshed = _request(
+        "GET",
+        f"/workflow?{urllib.parse.urlencode(query)}",
+        token=access_token,
+        refresh_token=refresh_token,
+    )
+    return (data.get("data") or {}, refreshed)
+
+
+def cancel_remote_download(
+    access_token: str,
+    task_id: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[None, RefreshedTokens]:
+    """取消离线下载任务。"""
+    _, refreshed = _request(
+        "DELETE",
+        f"/workflow/download/{urllib.parse.quote(task_id, safe='')}",
+        token=access_token,
+        refresh_token=refresh_token,
+    )
+    return (None, refreshed)
+
+
+def list_files(
+    access_token: str,
+    uri: str,
+    *,
+    page_size: int = 100,
+    next_page_token: str = "",
+    order_by: str = "",
+    order_direction: str = "",
+    refresh_token: str | None = None,
+) -> tuple[dict, RefreshedTokens]:
+    """
+    列出文件夹的一页内容（游标分页），返回 ({files, parent, pagination: {next_token, ...}}, 若刷新则返回新 token 信息)。
+    pagination.next_token 非空时把它作为 next_page_token 请求下一页；order_by 可为 name / size / updated_at / created_at。
+    """
+    query: dict[str, Any] = {"uri": uri, "page": 0, "page_size": page_size}
+    if next_page_token:
+        query["next_page_token"] = next_page_token
+    if order_by:
+        query["order_by"] = order_by
+    if order_direction:
+        query["order_direction"] = order_direction
+    data, refreshed = _request(
+        "GET",
+        f"/file?{urllib.parse.urlencode(query)}",
+        token=access_token,
+        refresh_token=refresh_token,
+    )
+    return (data.get("data") or {}, refreshed)
+
+
+def get_file_info(
+    access_token: str,
+    uri: str,
+    *,
+    refresh_token: str | None = None,
+) -> tuple[dict, RefreshedTokens]:
+    """获取文件或文件夹信息（name、size、type、updated_at 等），返回 (文件信息, 若刷新则返回新 token 信息)。"""
+    data, refreshed = _request(
+        "GET",
+        f"/file/info?{urllib.parse.urlencode({'uri': uri})}",
+        token=access_token,
+        refresh_token=refresh_token,
+    )
+    return (data.get("data") or {}, refreshed)
+
+
+def get_file_urls(
+    access_token: str,
+    uris: list[str],
+    *,
+    download: bool = True,
+    refresh_token: str | None = None,
+) -> tuple[list[str], RefreshedTokens]:
+    """
+    获取文件的临时下载 URL（与 uris 一一对应，有效期由站点决定），返回 (URL 列表, 若刷新则返回新 token 信息)。
+    S3 等存储策略返回预签名地址，本机存储返回 Cloudreve 的下载地址；相对地址按 CLOUDREVE_BASE_URL 补全。
+    """
+    data, refreshed = _request(
+        "POST",
+        "/file/url",
+        token=access_token,
+        refresh_token=refresh_token,
+        json={"uris": uris, "download": download},
+    )
+    urls = (data.get("data") or {}).get("urls") or []
+    return ([urllib.parse.urljoin(_base_url() + "/", (u or {}).get("url") or "") for u in urls], refreshed)
@@ -4,9 +4,18 @@
 """
 
 import json
+import os
 import re
+from typing import Callable
 
-import httpx
+from . import transport
+
+# 分享页所在站点；可用环境变量 DOUYIN_SHARE_BASE_URL 指向本地假服务（基准测试）
+SHARE_BASE_URL = os.environ.get("DOUYIN_SHARE_BASE_URL", "https://www.iesdouyin.com").rstrip("/")
+
+# 分享文本中的第一个链接（字符集等价于 [a-zA-Z0-9] | [$-_.+!*(),] | %XX 的逐字符交替，后者已被 $-_ 区间覆盖）
+_SHARE_URL_RE = re.compile(r"https?://[!$-_a-z]+")
+_ROUTER_DATA_MARK = "window._ROUTER_DATA"
 
 # 模拟移动端，便于解析分享页
 HEADERS = {
@@ -14,23 +23,39 @@ HEADERS = {
 }
 
 
+def _extract_router_data(html: str) -> str | None:
+    """取出页面中 window._ROUTER_DATA = ... 到其后第一个 </script> 之间的文本（未去首尾空白）；
+    结果与正则 window\\._ROUTER_DATA\\s*=\\s*(.*?)</script> 一致，但用 str.find 定位，不在整页上逐字符回溯。"""
+    start = 0
+    while (pos := html.find(_ROUTER_DATA_MARK, start)) >= 0:
+        start = pos + len(_ROUTER_DATA_MARK)
+        i = start
+        while i < len(html) and html[i].isspace():
+            i += 1
+        if i < len(html) and html[i] == "=":
+            i += 1
+            while i < len(html) and html[i].isspace():
+                i += 1
+            end = html.find("</script>", i)
+            if end < 0:
+                return None
+            return html[i:end]
+    return None
+
+
 def parse_douyin_share_url(share_text: str) -> dict:
     """
     从分享文本/链接中解析出无水印视频信息。
     返回: {"url": 无水印播放地址, "title": 视频标题/描述, "video_id": 视频 ID}
     """
-    urls = re.findall(
-        r"https?://(?:[a-zA-Z0-9]|[$-_.+!*(),]|(?:%[0-9a-fA-F]{2}))+",
-        share_text,
-    )
-    if not urls:
+    m = _SHARE_URL_RE.search(share_text)
+    if not m:
         raise ValueError("未找到有效的抖音分享链接")
 
-    share_url = urls[0].strip()
-    with httpx.Client(timeout=15.0, follow_redirects=True, headers=HEADERS) as client:
-        r = client.get(share_url)
-        r.raise_for_status()
-        final_url = str(r.url)
+    share_url = m.group(0).strip()
+    r = transport.get_client(share_url).get(share_url, headers=HEADERS, timeout=15.0, follow_redirects=True)
+    r.raise_for_status()
+    final_url = str(r.url)
 
     # 从最终 URL 取 video_id（如 iesdouyin.com/share/video/xxxxx）
     parts = final_url.split("?")[0].rstrip("/").split("/")
@@ -38,23 +63,18 @@ def parse_douyin_share_url(share_text: str) -> dict:
     if not video_id:
         raise ValueError("无法从链接中解析视频 ID")
 
-    page_url = f"https://www.iesdouyin.com/share/video/{video_id}"
-    with httpx.Client(timeout=15.0, headers=HEADERS) as client:
-        r = client.get(page_url)
-        r.raise_for_status()
-        html = r.text
+    page_url = f"{SHARE_BASE_URL}/share/video/{video_id}"
+    r = transport.get_client(page_url).get(page_url, headers=HEADERS, timeout=15.0)
+    r.raise_for_status()
+    html = r.text
 
     # 页面内 _ROUTER_DATA 含视频信息
-    pattern = re.compile(
-        r"window\._ROUTER_DATA\s*=\s*(.*?)</script>",
-        re.DOTALL,
-    )
-    match = pattern.search(html)
-    if not match or not match.group(1):
+    raw = _extract_router_data(html)
+    if not raw:
         raise ValueError("从页面解析视频信息失败")
 
     try:
-        data = json.loads(match.group(1).strip())
+        data = json.loads(raw.strip())
     except json.JSONDecodeError as e:
         raise ValueError(f"解析页面 JSON 失败: {e}") from e
 
@@ -90,16 +110,25 @@ def parse_douyin_share_url(share_text: str) -> dict:
 
 def download_douyin_video(video_url: str) -> bytes:
     """下载抖音无水印视频，返回完整字节内容。"""
-    with httpx.Client(timeout=120.0, follow_redirects=True, headers=HEADERS) as client:
-        r = client.get(video_url)
+    r = transport.get_client(video_url, http2=False).get(
+        video_url, headers=HEADERS, timeout=120.0, follow_redirects=True,
+    )
+    r.raise_for_status()
+    return r.content
+
+
+def download_douyin_video_to_path(
+    video_url: str,
+    path: str,
+    on_size: Callable[[int], None] | None = None,
+) -> int:
+    """下载抖音无水印视频到本地文件（流式写入），返回写入字节数。用于大文件时避免整文件进内存。
+    on_size 在拿到响应头且有 Content-Length 时以文件大小调用（可用于提前创建上传会话），其抛出的异常会中止下载。"""
+    client = transport.get_client(video_url, http2=False)
+    with client.stream("GET", video_url, headers=HEADERS, timeout=120.0, follow_redirects=True) as r:
         r.raise_for_status()
-        return r.content
-
-
-def download_douyin_video_to_path(video_url: str, path: str) -> int:
-    """下载抖音无水印视频到本地文件（流式写入），返回写入字节数。用于大文件时避免整文件进内存。"""
-    with httpx.Client(timeout=120.0, follow_redirects=True, headers=HEADERS) as client:
-        with client.stream("GET", video_url) as r:
-            r.raise_for_status()
-            with open(path, "wb") as f:
-                return sum(f.write(chunk) for chunk in r.iter_bytes(chunk_size=65536))
+        length = r.headers.get("content-length")
+        if on_size is not None and length and length.isdigit() and not r.headers.get("content-encoding"):
+            on_size(int(length))
+        with open(path, "wb") as f:
+            return sum(f.write(chunk) for chunk in r.iter_bytes(chunk_size=65536))
@@ -0,0 +1,338 @@
+"""
+从 Cloudreve 下载文件到本地：按字节区间并发下载到预分配的本地文件，支持断点续传与校验和验证。
+
+  MCP_DOWNLOAD_CONCURRENCY   单个文件同时下载的区间数（默认 8）
+  MCP_DOWNLOAD_PART_SIZE     每个区间的字节数（默认 16 MiB，至少 1 MiB）
+  MCP_DOWNLOAD_DIR           下载目标的根目录（默认 ~/Downloads），工具传入的 local_path 只能落在其中
+
+local_path 按 resolve_path 解析：相对路径相对 MCP_DOWNLOAD_DIR，解析符号链接与 .. 后不在该目录内则拒绝。
+开始下载前经 spool.reserve 在目标目录所在文件系统上预留剩余所需字节（与入库暂存共用 MCP_SPOOL_MIN_FREE、MCP_SPOOL_WAIT），
+并发下载不会合计超出剩余空间；排队超时抛 spool.SpoolBusy。
+
+下载中的内容写在 {目标}.part（开始前按文件大小预分配），已完成的区间记录在 {目标}.part.json；
+中断后以相同来源、大小与区间大小再次下载时只补缺失的区间。全部区间完成且大小、校验和一致后才改名为目标文件。
+服务端不支持 Range 时退化为单连接顺序下载（不可续传）。临时下载地址过期（401/403/410）时通过 get_url 重新获取。
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import httpx
+
+from . import metrics
+from . import spool
+from . import transport
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+CONCURRENCY = max(1, int(os.environ.get("MCP_DOWNLOAD_CONCURRENCY", "8")))
+PART_SIZE = max(MIB, int(os.environ.get("MCP_DOWNLOAD_PART_SIZE", str(16 * MIB))))
+DOWNLOAD_DIR = os.environ.get("MCP_DOWNLOAD_DIR") or os.path.join(os.path.expanduser("~"), "Downloads")
+# 单个区间的重试次数（每次从已写入的位置续传）
+_PART_ATTEMPTS = 5
+# 下载地址过期时重新获取的次数
+_URL_REFRESHES = 2
+_TIMEOUT = httpx.Timeout(30.0, read=60.0)
+_EXPIRED = {401, 403, 410}
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+# 未写算法前缀时按十六进制长度推断
+_DIGEST_ALGOS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+
+def parse_checksum(checksum: str) -> tuple[str, str] | None:
+    """解析 "sha256:<hex>" / "md5:<hex>" 或按长度推断算法的十六进制串，返回 (算法, 摘要)；空串返回 None。"""
+    text = checksum.strip().lower()
+    if not text:
+        return None
+    algo, sep, digest = text.partition(":")
+    if not sep:
+        algo, digest = _DIGEST_ALGOS.get(len(text), ""), text
+    if algo not in hashlib.algorithms_available or not re.fullmatch(r"[0-9a-f]+", digest):
+        raise ValueError(f"无法识别的校验和：{checksum}（应为 sha256:<hex>、md5:<hex> 等）")
+    return algo, digest
+
+
+def resolve_path(local_path: str, name: str) -> str:
+    """
+    把 local_path 解析为 DOWNLOAD_DIR 内的目标文件路径：相对路径相对 DOWNLOAD_DIR，以 / 结尾或为已有目录时追加文件名 name。
+    解析符号链接与 .. 后不在 DOWNLOAD_DIR 内（或就是该目录本身）时抛 PermissionError。
+    """
+    root = os.path.realpath(DOWNLOAD_DIR)
+    path = os.path.join(root, os.path.expanduser(local_path.strip()))
+    if path.endswith(("/", os.sep)) or os.path.isdir(path):
+        path = os.path.join(path, name)
+    real = os.path.realpath(path)
+    if real == root or os.path.commonpath([root, real]) != root:
+        raise PermissionError(f"{local_path} 不在下载目录 {root} 内（MCP_DOWNLOAD_DIR）")
+    return real
+
+
+def file_digest(path: str, algo: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, algo).hexdigest()
+
+
+class _Source:
+    """当前下载地址；过期时由第一个发现的线程重新获取，其余线程直接使用新地址。"""
+
+    def __init__(self, get_url: Callable[[], str]) -> None:
+        self._get_url = get_url
+        self._lock = threading.Lock()
+        self.url = get_url()
+        self.refreshes = 0
+
+    def refresh(self, stale: str) -> str:
+        with self._lock:
+            if self.url == stale:
+                logger.info("下载地址已过期，重新获取")
+                self.url = self._get_url()
+                self.refreshes += 1
+            return self.url
+
+
+def _client(url: str) -> httpx.Client:
+    # 大文件下载走 HTTP/1.1：每个区间一个连接，避免 HTTP/2 单连接上的流控限制吞吐
+    return transport.get_client(url, http2=False)
+
+
+def _probe(source: _Source) -> tuple[int | None, bool]:
+    """请求第一个字节，返回 (文件大小, 是否支持 Range)；大小未知时为 None。"""
+    for attempt in range(_URL_REFRESHES + 1):
+        url = source.url
+        with _client(url).stream(
+            "GET", url, headers={"Range": "bytes=0-0"}, timeout=_TIMEOUT, follow_redirects=True,
+        ) as r:
+            if r.status_code in _EXPIRED and attempt < _URL_REFRESHES:
+                source.refresh(url)
+                continue
+            # 空文件没有第 0 个字节，S3 等返回 416 与 Content-Range: bytes */0
+            if r.status_code == 416 and r.headers.get("content-range", "").strip() == "bytes */0":
+                return 0, False
+            r.raise_for_status()
+            m = _CONTENT_RANGE_RE.fullmatch(r.headers.get("content-range", ""))
+            if r.status_code == 206 and m and m.group(3) != "*":
+                return int(m.group(3)), True
+            length = r.headers.get("content-length")
+            if length and length.isdigit() and not r.headers.get("content-encoding"):
+                return int(length), False
+            return None, False
+    raise AssertionError("unreachable")
+
+
+def _load_done(state_path: str, part_path: str, source_key: str, size: int, part_size: int) -> set[int]:
+    """读取上次中断时已完成的区间；来源、大小、区间大小或 .part 文件不匹配时返回空集（重新下载）。"""
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if os.path.getsize(part_path) != size:
+            return set()
+    except (OSError, ValueError):
+        return set()
+    if (state.get("source"), state.get("size"), state.get("part_size")) != (source_key, size, part_size):
+        return set()
+    return {int(i) for i in state.get("done") or []}
+
+
+def _save_done(state_path: str, source_key: str, size: int, part_size: int, done: set[int]) -> None:
+    tmp = state_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": source_key, "size": size, "part_size": part_size, "done": sorted(done)}, f)
+    os.replace(tmp, state_path)
+
+
+def _preallocate(path: str, size: int) -> None:
+    """创建（截断）path 并预分配 size 字节；磁盘空间不足时立即失败，而不是写到一半才遇到 ENOSPC。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if shutil.disk_usage(directory).free < size:
+        raise OSError(errno.ENOSPC, f"磁盘空间不足：需要 {size} 字节（{directory}）")
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError as e:
+                # 文件系统不支持时退回 truncate（稀疏文件）
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                    raise
+        f.truncate(size)
+
+
+def _download_part(source: _Source, part_path: str, start: int, end: int, stop: threading.Event) -> int:
+    """下载 [start, end] 写入 part_path 的对应位置；中断时从已写入的位置续传。返回写入字节数。"""
+    pos = start
+    attempt = refreshes = 0
+    with open(part_path, "r+b") as f:
+        while pos <= end:
+            if stop.is_set():
+                raise RuntimeError("其他区间下载失败，已停止")
+            url = source.url
+            try:
+                with _client(url).stream(
+                    "GET", url, headers={"Range": f"bytes={pos}-{end}"}, timeout=_TIMEOUT, follow_redirects=True,
+                ) as r:
+                    if r.status_code in _EXPIRED and refreshes < _URL_REFRESHES:
+                        refreshes += 1
+                        source.refresh(url)
+                        continue
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise RuntimeError(f"服务端未按 Range 返回区间（HTTP {r.status_code}）")
+                    f.seek(pos)
+                    for chunk in r.iter_bytes():
+                        if pos + len(chunk) > end + 1:
+                            raise RuntimeError(f"服务端返回的数据超出请求区间 {start}-{end}")
+                        f.write(chunk)
+                        pos += len(chunk)
+                if pos > end:
+                    break
+                err: object = f"连接提前结束（区间 {start}-{end} 已写到 {pos}）"
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    raise
+                err = e
+            except httpx.TransportError as e:
+                err = e
+            attempt += 1
+            if attempt >= _PART_ATTEMPTS:
+                raise RuntimeError(f"区间 {start}-{end} 下载失败：{err}")
+            logger.warning("区间 %s-%s 下载中断（已写到 %s），第 %s 次续传 - %s", start, end, pos, attempt, err)
+            metrics.record_retry()
+            time.sleep(0.5 * attempt)
+    return pos - start
+
+
+def _download_ranged(
+    source: _Source, part_path: str, state_path: str, source_key: str, size: int, part_size: int, concurrency: int,
+) -> dict:
+    count = -(-size // part_size)
+    done = _load_done(state_path, part_path, source_key, size, part_size)
+    if not done:
+        _preallocate(part_path, size)
+    resumed = sum(min(part_size, size - i * part_size) for i in done if 0 <= i < count)
+    todo = [i for i in range(count) if i not in done]
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def run(index: int) -> int:
+        start = index * part_size
+        try:
+            n = _download_part(source, part_path, start, min(size, start + part_size) - 1, stop)
+        except BaseException:
+            stop.set()
+            raise
+        metrics.add_bytes("cloudreve", "download", n)
+        with lock:
+            done.add(index)
+            _save_done(state_path, source_key, size, part_size, done)
+        return n
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(todo)), thread_name_prefix="cloudreve-download") as pool:
+            futures = [pool.submit(metrics.in_context(run), i) for i in todo]
+        fetched = sum(f.result() for f in futures)
+    else:
+        fetched = 0
+    return {"parts": count, "downloaded_bytes": fetched, "resumed_bytes": resumed}
+
+
+def _download_sequential(source: _Source, part_path: str, size: int | None) -> dict:
+    """服务端不支持 Range 时单连接顺序下载；中断则从头重试。"""
+    if size:
+        _preallocate(part_path, size)
+    for attempt in range(1, _PART_ATTEMPTS + 1):
+        url = source.url
+        written = 0
+        try:
+            with open(part_path, "wb") as f, _client(url).stream(
+                "GET", url, timeout=_TIMEOUT, follow_redirects=True,
+            ) as r:
+                r.raise_for_status()
+                for chunk in r.iter_bytes():
+                    f.write(chunk)
+                    written += len(chunk)
+            metrics.add_bytes("cloudreve", "download", written)
+            return {"parts": 1, "downloaded_bytes": written, "resumed_bytes": 0}
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 or attempt == _PART_ATTEMPTS:
+                raise
+            err: Exception = e
+        except httpx.TransportError as e:
+            if attempt == _PART_ATTEMPTS:
+                raise
+            err = e
+        logger.warning("下载中断（不支持 Range，已收 %s 字节），第 %s 次重试 - %s", written, attempt, err)
+        metrics.record_retry()
+        time.sleep(0.5 * attempt)
+    raise AssertionError("unreachable")
+
+
+def download(
+    get_url: Callable[[], str],
+    path: str,
+    *,
+    source_key: str,
+    size: int | None = None,
+    checksum: str = "",
+    concurrency: int | None = None,
+    part_size: int | None = None,
+) -> dict:
+    """
+    把 get_url() 返回的地址下载到 path（已存在则覆盖），返回
+    {size, parts, downloaded_bytes, resumed_bytes, ranged, url_refreshes, checksum}。
+    source_key 标识下载来源（如 Cloudreve 文件 URI），用于判断 .part 能否续传；size 为预期大小，与服务端不符时报错。
+    checksum 形如 sha256:<hex>，下载完成后校验，不一致时删除已下载内容并抛 RuntimeError。
+    """
+    expected = parse_checksum(checksum)
+    part_size = max(MIB, part_size or PART_SIZE)
+    source = _Source(get_url)
+    total, ranged = _probe(source)
+    if size is not None and total is not None and size != total:
+        raise RuntimeError(f"文件大小不一致：Cloudreve 记录 {size} 字节，下载地址返回 {total} 字节")
+    if total is None:
+        total = size
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    part_path, state_path = path + ".part", path + ".part.json"
+    # 续传时已有的 .part 已占用磁盘，只预留剩余部分；大小未知时按 spool 的默认值预留
+    existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    with spool.reserve(max(0, total - existing) if total is not None else None, directory=directory) as res:
+        res.track(part_path)
+        if total == 0:
+            # 空文件无需请求内容，直接创建
+            open(part_path, "wb").close()
+            result = {"parts": 0, "downloaded_bytes": 0, "resumed_bytes": 0}
+        elif ranged:
+            result = _download_ranged(
+                source, part_path, state_path, source_key, total, part_size, concurrency or CONCURRENCY,
+            )
+        else:
+            result = _download_sequential(source, part_path, total)
+    actual = os.path.getsize(part_path)
+    if total is not None and actual != total:
+        raise RuntimeError(f"下载大小不一致：期望 {total} 字节，实际 {actual} 字节")
+
+    digest = None
+    if expected is not None:
+        algo, want = expected
+        got = file_digest(part_path, algo)
+        if got != want:
+            for p in (part_path, state_path):
+                if os.path.exists(p):
+                    os.unlink(p)
+            raise RuntimeError(f"校验和不一致：期望 {algo}:{want}，实际 {algo}:{got}（已删除下载内容）")
+        digest = f"{algo}:{got}"
+    os.replace(part_path, path)
+    if os.path.exists(state_path):
+        os.unlink(state_path)
+    return {"size": actual, "ranged": ranged, "url_refreshes": source.refreshes, "checksum": digest, **result}
@@ -0,0 +1,191 @@
+"""
+文件夹列表与元数据本地缓存：按游标分页流式读取 v4 GET /file，结果缓存后重复的存在性检查与文件夹浏览不再发请求。
+
+  CLOUDREVE_LIST_PAGE_SIZE       每页条数（默认 500）
+  CLOUDREVE_LIST_CACHE_TTL       新鲜期（秒，默认 30）：期内直接返回缓存，不发请求
+  CLOUDREVE_LIST_CACHE_MAX_AGE   最长保留时间（秒，默认 600）：过了新鲜期的文件夹列表先做一次条件重验证
+
+缓存经 state.cache() 创建，按 (令牌摘要, 文件夹 URI) 区分用户（MCP_STATE_BACKEND=redis 时多 worker 共享）。
+列表接口没有 ETag，因此按 updated_at 倒序拉取，重验证时只取第一页：新增或修改过的文件必然排在第一页，
+第一页与父文件夹的 updated_at 都和缓存一致时沿用缓存（只续期），否则重新拉取全部页。
+本服务自己的写操作（上传、建文件夹、重命名、服务端拉取）完成后即使相关缓存失效；其他客户端的改动
+（主要是删除较早的文件）最迟在保留期后可见，refresh=True 可强制重新拉取。
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Iterator
+
+from . import cloudreve
+from . import state
+
+if TYPE_CHECKING:
+    from .pipeline import TokenState
+
+PAGE_SIZE = max(1, int(os.environ.get("CLOUDREVE_LIST_PAGE_SIZE", "500")))
+CACHE_TTL = float(os.environ.get("CLOUDREVE_LIST_CACHE_TTL", "30"))
+CACHE_MAX_AGE = max(CACHE_TTL, float(os.environ.get("CLOUDREVE_LIST_CACHE_MAX_AGE", "600")))
+# 表示对象（或其父文件夹）不存在的业务错误码
+_NOT_FOUND_CODES = {404, 40016}
+# 同一文件夹下一次查询至少这么多个 URI 时改为列出该文件夹，而不是逐个查询
+_LIST_THRESHOLD = 4
+
+_folders = state.cache("cloudreve:listing", maxsize=256, ttl=CACHE_MAX_AGE)
+# 单个 URI 的查询结果（含不存在），值为 {"file": 精简信息或 None}
+_stats = state.cache("cloudreve:stat", maxsize=4096, ttl=CACHE_TTL)
+
+
+def is_not_found(e: Exception) -> bool:
+    return isinstance(e, cloudreve.CloudreveError) and e.code in _NOT_FOUND_CODES
+
+
+def _split(uri: str) -> tuple[str, str] | None:
+    """拆成 (父文件夹 URI, 名称)；文件系统根（如 cloudreve://my）返回 None。"""
+    uri = uri.rstrip("/")
+    if "/" not in uri.removeprefix("cloudreve://"):
+        return None
+    parent, name = uri.rsplit("/", 1)
+    return parent, name
+
+
+def _entry(f: dict, folder: str) -> dict:
+    """接口返回的文件对象 → 缓存与输出用的精简字段。"""
+    name = f.get("name") or ""
+    return {
+        "name": name,
+        "uri": f.get("path") or f"{folder}/{name}",
+        "type": "folder" if f.get("type") == 1 else "file",
+        "size": f.get("size") or 0,
+        "updated_at": f.get("updated_at") or "",
+    }
+
+
+def _digest(entries: list[dict]) -> str:
+    raw = json.dumps([[e["name"], e["type"], e["size"], e["updated_at"]] for e in entries], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _validator(data: dict) -> str:
+    return (data.get("parent") or {}).get("updated_at") or ""
+
+
+def _next_token(data: dict) -> str:
+    return (data.get("pagination") or {}).get("next_token") or ""
+
+
+def iter_pages(tokens: "TokenState", uri: str, *, page_size: int | None = None) -> Iterator[tuple[list[dict], dict]]:
+    """逐页产出 (本页精简条目, 本页原始 data)，按 updated_at 倒序；调用方提前停止迭代时不再请求后续页。"""
+    next_token = ""
+    while True:
+        data = tokens.call(
+            cloudreve.list_files, uri, page_size=page_size or PAGE_SIZE, next_page_token=next_token,
+            order_by="updated_at", order_direction="desc",
+        )
+        yield [_entry(f, uri) for f in data.get("files") or []], data
+        next_token = _next_token(data)
+        if not next_token:
+            return
+
+
+def list_folder(tokens: "TokenState", uri: str, *, refresh: bool = False, limit: int = 0) -> dict:
+    """
+    列出文件夹，返回 {files, complete, source, pages}：source 为 cache（未发请求）/ revalidated（只请求了第一页）/ fetched。
+    limit>0 且需要拉取时，拉够 limit 条即停止（即最近修改的 limit 项，complete 为 False，不写入缓存）。
+    """
+    key = (tokens.cache_key(), uri)
+    now = time.time()
+    cached = None if refresh else _folders.get(key)
+    if cached is not None and now - cached["checked"] < CACHE_TTL:
+        return {"files": cached["files"], "complete": True, "source": "cache", "pages": 0}
+    files: list[dict] = []
+    head = validator = ""
+    pages = iter_pages(tokens, uri)
+    count = 0
+    try:
+        for entries, data in pages:
+            count += 1
+            if count == 1:
+                head, validator = _digest(entries), _validator(data)
+                if cached is not None and cached["head"] == head and cached["validator"] == validator:
+                    cached["checked"] = now
+                    _folders.set(key, cached)
+                    return {"files": cached["files"], "complete": True, "source": "revalidated", "pages": 1}
+            files.extend(entries)
+            if limit and len(files) >= limit and _next_token(data):
+                return {"files": files[:limit], "complete": False, "source": "fetched", "pages": count}
+    finally:
+        pages.close()
+    _folders.set(key, {"files": files, "head": head, "validator": validator, "checked": now})
+    # 该文件夹下各文件的单独查询结果以新列表为准，一次批量删除（Redis 后端只需一次往返）
+    _stats.discard((key[0], f["uri"]) for f in files)
+    return {"files": files, "complete": True, "source": "fetched", "pages": count}
+
+
+def _stat_one(tokens: "TokenState", user: str, uri: str) -> tuple[dict | None, bool]:
+    """返回 (精简信息或 None, 是否命中缓存)。"""
+    cached = _stats.get((user, uri))
+    if cached is not None:
+        return cached["file"], True
+    try:
+        info = tokens.call(cloudreve.get_file_info, uri)
+        found = _entry(info, uri.rsplit("/", 1)[0])
+        found["uri"] = found["uri"] or uri
+    except Exception as e:
+        if not is_not_found(e):
+            raise
+        found = None
+    _stats.set((user, uri), {"file": found})
+    return found, False
+
+
+def stat(tokens: "TokenState", uris: list[str]) -> tuple[dict[str, dict | None], int]:
+    """
+    批量查询文件/文件夹是否存在，返回 ({uri: 精简信息，不存在为 None}, 发出的请求数)。
+    父文件夹列表在新鲜期内时直接从中回答；同一文件夹下查询较多时列出一次该文件夹（过期的列表只需重验证）；
+    其余逐个 GET /file/info，结果（含不存在）缓存 CLOUDREVE_LIST_CACHE_TTL 秒。
+    """
+    user = tokens.cache_key()
+    now = time.time()
+    out: dict[str, dict | None] = {}
+    requests = 0
+    groups: dict[str, list[tuple[str, str]]] = {}
+    singles: list[str] = []
+    for uri in dict.fromkeys(u.strip().rstrip("/") for u in uris):
+        parts = _split(uri)
+        if parts is None:
+            singles.append(uri)
+        else:
+            groups.setdefault(parts[0], []).append((uri, parts[1]))
+    for parent, members in groups.items():
+        cached = _folders.get((user, parent))
+        fresh = cached is not None and now - cached["checked"] < CACHE_TTL
+        if not fresh and len(members) < _LIST_THRESHOLD:
+            singles.extend(uri for uri, _ in members)
+            continue
+        try:
+            listed = list_folder(tokens, parent)
+        except Exception as e:
+            if not is_not_found(e):
+                raise
+            requests += 1
+            out.update({uri: None for uri, _ in members})
+            continue
+        requests += listed["pages"]
+        by_name = {f["name"]: f for f in listed["files"]}
+        out.update({uri: by_name.get(name) for uri, name in members})
+    for uri in singles:
+        out[uri], hit = _stat_one(tokens, user, uri)
+        requests += 0 if hit else 1
+    return out, requests
+
+
+def invalidate(tokens: "TokenState", uri: str) -> None:
+    """本服务写入 uri（上传、建文件夹、重命名等）后调用：丢弃其父文件夹列表、其自身（作为文件夹）列表与查询结果。"""
+    user = tokens.cache_key()
+    uri = uri.strip().rstrip("/")
+    _stats.pop((user, uri), None)
+    _folders.pop((user, uri), None)
+    if (parts := _split(uri)) is not None:
+        _folders.pop((user, parts[0]), None)
@@ -6,18 +6,44 @@
   python -m mcp_cloudreve
 
 端口/主机由环境变量 PORT、HOST 控制（默认 3001 / 127.0.0.1），在导入 server 前生效。
+MCP_TRANSPORT=streamable-http 时使用无状态 streamable-HTTP（POST /mcp）；此时可设 MCP_WORKERS>1
+以 uvicorn 多进程方式运行，放在负载均衡后横向扩展（SSE 会话绑定单个进程，只能单 worker）。
 """
 
+import logging
 import os
+import tempfile
 
 os.environ.setdefault("PORT", "3001")
 os.environ.setdefault("MCP_PORT", os.environ["PORT"])
 
-from .server import mcp
+from .server import TRANSPORT, mcp
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get("MCP_WORKERS", "1"))
 
 
 def main() -> None:
-    mcp.run(transport="sse")
+    if WORKERS <= 1:
+        mcp.run(transport=TRANSPORT)
+        return
+    if TRANSPORT != "streamable-http":
+        raise SystemExit("MCP_WORKERS>1 需要 MCP_TRANSPORT=streamable-http：SSE 会话绑定在单个进程上，无法分散到多个 worker")
+    import uvicorn
+
+    # 多进程下 Prometheus 指标需写入共享目录，/metrics 汇总所有 worker；须在 worker 启动前设置
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="mcp-cloudreve-metrics-"))
+    if os.environ.get("MCP_STATE_BACKEND", "memory") == "memory":
+        logger.warning("多 worker 下 MCP_STATE_BACKEND=memory：解析结果缓存不在 worker 间共享，建议使用 redis")
+    uvicorn.run(
+        "mcp_cloudreve.server:create_app",
+        factory=True,
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        workers=WORKERS,
+        log_level=mcp.settings.log_level.lower(),
+    )
 
 
 if __name__ == "__main__":
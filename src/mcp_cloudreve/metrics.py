@@ -0,0 +1,265 @@
+"""
+Prometheus 指标：工具耗时、各阶段耗时（解析/下载/合并/上传/直链）、按平台统计的上下行字节数、进行中的任务数，
+以及经 transport 共享客户端发出的上游请求（按上游统计耗时与状态码，由 httpx 事件钩子采集）。
+上游请求的 host 标签只取有限的几个值（cloudreve / douyin / bilibili / netease / other），
+CDN 节点、S3 桶、临时下载地址等主机名各不相同，直接作为标签会让时间序列数无限增长。
+server 在 SSE / streamable-HTTP 应用上挂载 GET /metrics 输出这些指标（多 worker 时经 PROMETHEUS_MULTIPROC_DIR 汇总）。
+
+单次调用的阶段明细由 StageTimer 收集（经 contextvar 传递，工作线程用 in_context 包装），
+调用结束时输出一行结构化日志，入库工具传 timings=True 时同时附在返回 JSON 中。
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# 工具与阶段多为秒级到分钟级（大文件下载上传），上游请求多为毫秒级
+_LONG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_SHORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+TOOL_DURATION = Histogram(
+    "mcp_tool_duration_seconds", "MCP 工具调用耗时", ["tool", "status"], buckets=_LONG_BUCKETS,
+)
+TOOLS_IN_FLIGHT = Gauge("mcp_tool_in_flight", "正在执行的工具调用数", ["tool"], multiprocess_mode="livesum")
+STAGE_DURATION = Histogram(
+    "mcp_stage_duration_seconds", "入库各阶段耗时", ["platform", "stage"], buckets=_LONG_BUCKETS,
+)
+BYTES = Counter("mcp_bytes_total", "按平台统计的下载/上传字节数", ["platform", "direction"])
+UPSTREAM_DURATION = Histogram(
+    "mcp_upstream_request_duration_seconds", "上游请求耗时（至收到响应头）", ["host", "method"],
+    buckets=_SHORT_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter("mcp_upstream_responses_total", "上游响应数（按状态码）", ["host", "status"])
+COALESCED = Counter("mcp_coalesced_total", "并发的重复入库请求合并到进行中任务的次数", ["platform"])
+CHUNK_BUFFER_BYTES = Gauge(
+    "mcp_chunk_buffer_bytes", "分块上传缓冲池占用字节数（in_use 正在使用 / idle 空闲待复用）", ["state"],
+    multiprocess_mode="livesum",
+)
+
+
+class _StageRecord:
+    """stage() 产出的记录，调用方可填写本阶段处理的字节数与分块数。"""
+
+    __slots__ = ("bytes", "chunks")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.chunks = 0
+
+
+class StageTimer:
+    """
+    一次工具调用的阶段明细：各阶段累计耗时、字节数、分块数、次数，以及重试与令牌刷新次数。
+    并行处理（多 P、歌单）时同名阶段累加，seconds 为各线程耗时之和。线程安全。
+    """
+
+    def __init__(self, tool: str, platform: str) -> None:
+        self.tool = tool
+        self.platform = platform
+        self.retries = 0
+        self.token_refreshes = 0
+        self._started = time.perf_counter()
+        self._stages: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, nbytes: int = 0, chunks: int = 0) -> None:
+        with self._lock:
+            st = self._stages.setdefault(name, {"seconds": 0.0, "bytes": 0, "chunks": 0, "count": 0})
+            st["seconds"] += seconds
+            st["bytes"] += nbytes
+            st["chunks"] += chunks
+            st["count"] += 1
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def summary(self) -> dict:
+        """返回 {total_seconds, stages: {阶段: {seconds, bytes, throughput_bytes_per_s, chunks, count}}, retries, token_refreshes}。"""
+        with self._lock:
+            stages = {}
+            for name, st in self._stages.items():
+                item: dict[str, Any] = {"seconds": round(st["seconds"], 3), "count": st["count"]}
+                if st["bytes"]:
+                    item["bytes"] = st["bytes"]
+                    item["throughput_bytes_per_s"] = round(st["bytes"] / st["seconds"]) if st["seconds"] > 0 else None
+                if st["chunks"]:
+                    item["chunks"] = st["chunks"]
+                stages[name] = item
+            return {
+                "total_seconds": round(time.perf_counter() - self._started, 3),
+                "stages": stages,
+                "retries": self.retries,
+                "token_refreshes": self.token_refreshes,
+            }
+
+
+_current_timer: contextvars.ContextVar[StageTimer | None] = contextvars.ContextVar("mcp_stage_timer", default=None)
+
+
+def current_timer() -> StageTimer:
+    """当前调用的 StageTimer；不在 timed() 内时返回一个不会输出日志的临时实例。"""
+    return _current_timer.get() or StageTimer("", "")
+
+
+@contextmanager
+def timed(tool: str, platform: str) -> Iterator[StageTimer]:
+    """在一次工具调用内启用阶段明细收集，结束时输出一行 JSON 结构化日志（event=tool_timings）。"""
+    timer = StageTimer(tool, platform)
+    token = _current_timer.set(timer)
+    status = "error"
+    try:
+        yield timer
+        status = "ok"
+    finally:
+        _current_timer.reset(token)
+        logger.info("%s", json.dumps(
+            {"event": "tool_timings", "tool": tool, "platform": platform, "status": status, **timer.summary()},
+            ensure_ascii=False,
+        ))
+
+
+def in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """把当前 contextvar（含 StageTimer）带到线程池中执行的 fn：pool.submit(metrics.in_context(fn), ...)。"""
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def record_retry() -> None:
+    """记录一次重试/续传（计入当前调用的 StageTimer）。"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add_retry()
+
+
+def _result_status(result: Any) -> str:
+    """工具返回 JSON 文本时取其 status 字段（工具内部已捕获异常并返回 status=error）。"""
+    if isinstance(result, str) and result.startswith("{"):
+        try:
+            status = json.loads(result).get("status")
+        except (ValueError, AttributeError):
+            return "ok"
+        return str(status) if status else "ok"
+    return "ok"
+
+
+def instrument_tool(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """工具函数装饰器（放在 @mcp.tool() 下方）：统计耗时、结果状态与进行中的调用数。"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        in_flight = TOOLS_IN_FLIGHT.labels(name)
+        in_flight.inc()
+        start = time.perf_counter()
+        status = "exception"
+        try:
+            result = fn(*args, **kwargs)
+            status = _result_status(result)
+            return result
+        finally:
+            in_flight.dec()
+            TOOL_DURATION.labels(name, status).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+@contextmanager
+def stage(platform: str, name: str) -> Iterator[_StageRecord]:
+    """统计一个阶段的耗时（异常退出同样计入）；产出的记录可填写 bytes / chunks，一并计入当前调用的 StageTimer。"""
+    record = _StageRecord()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.labels(platform, name).observe(elapsed)
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.add(name, elapsed, record.bytes, record.chunks)
+
+
+def add_bytes(platform: str, direction: str, n: int) -> None:
+    """累计字节数；direction 为 download、upload 或 server_fetch（Cloudreve 离线下载拉取的字节）；platform 为 cloudreve 的 download 是从网盘下载到本地的字节。"""
+    if n > 0:
+        BYTES.labels(platform, direction).inc(n)
+
+
+# 按主机名后缀归入平台（含各平台的媒体 CDN 域名）
+_HOST_SUFFIXES = (
+    ("douyin", ("douyin.com", "iesdouyin.com", "douyinvod.com", "douyincdn.com", "amemv.com", "snssdk.com", "zjcdn.com")),
+    ("bilibili", ("bilibili.com", "bilivideo.com", "bilivideo.cn", "hdslb.com", "b23.tv")),
+    ("netease", ("163.com", "126.net", "127.net")),
+)
+# 各模块可用环境变量改指的接口根地址（如基准测试的本地假服务），按 host:port 精确匹配
+_BASE_URL_ENVS = (
+    ("douyin", "DOUYIN_SHARE_BASE_URL"),
+    ("bilibili", "BILIBILI_API_BASE_URL"),
+    ("netease", "NETEASE_API_BASE_URL"),
+    ("netease", "NETEASE_WEB_BASE_URL"),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _suffix_label(host: str) -> str:
+    for label, suffixes in _HOST_SUFFIXES:
+        if any(host == suffix or host.endswith("." + suffix) for suffix in suffixes):
+            return label
+    return "other"
+
+
+def _host(url: httpx.URL) -> str:
+    """上游请求的 host 标签：cloudreve（CLOUDREVE_BASE_URL 所在主机）、平台名或 other。"""
+    from . import cloudreve
+
+    netloc = url.netloc.decode("ascii", "replace").lower()
+    if netloc == urllib.parse.urlsplit(cloudreve._base_url()).netloc.lower():
+        return "cloudreve"
+    for label, env in _BASE_URL_ENVS:
+        base = os.environ.get(env)
+        if base and netloc == urllib.parse.urlsplit(base).netloc.lower():
+            return label
+    return _suffix_label((url.host or "").lower())
+
+
+def on_request(request: httpx.Request) -> None:
+    """httpx request 事件钩子：记录开始时间。"""
+    request.extensions["mcp_start"] = time.perf_counter()
+
+
+def on_response(response: httpx.Response) -> None:
+    """httpx response 事件钩子：收到响应头时记录耗时与状态码。"""
+    request = response.request
+    host = _host(request.url)
+    start = request.extensions.get("mcp_start")
+    if start is not None:
+        UPSTREAM_DURATION.labels(host, request.method).observe(time.perf_counter() - start)
+    UPSTREAM_RESPONSES.labels(host, str(response.status_code)).inc()
+
+
+def render() -> tuple[bytes, str]:
+    """返回 (指标文本, Content-Type)。设置了 PROMETHEUS_MULTIPROC_DIR（多 worker）时汇总所有 worker 的指标。"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
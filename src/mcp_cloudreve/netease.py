@@ -3,69 +3,135 @@
 参考: https://github.com/bei123/astrbot_plugin_so_vits_svc/blob/master/netease_api.py
 """
 
+import functools
+import itertools
 import json
 import logging
+import os
+import re
+import threading
+import time
+import urllib.parse
 from hashlib import md5
 from random import randrange
+from typing import Callable, Iterator
 
 logger = logging.getLogger(__name__)
 
 import httpx
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from . import metrics
+from . import state
+from . import transport
+from .cache import DiskLRUCache
 
 AES_KEY = b"e82ckenh8dichen8"
-BASE_URL = "https://interface3.music.163.com"
+# 接口根地址（eapi、详情、歌单）与网页接口根地址（专辑、备用详情）；可用环境变量指向本地假服务（基准测试）
+BASE_URL = os.environ.get("NETEASE_API_BASE_URL", "https://interface3.music.163.com").rstrip("/")
+WEB_BASE_URL = os.environ.get("NETEASE_WEB_BASE_URL", "https://music.163.com").rstrip("/")
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.164 Safari/537.36",
     "Referer": "",
 }
 
+# 解析结果缓存：(关键词, cookie) → 搜索结果，(歌曲 ID, cookie) → 详情，(歌曲 ID, 音质, cookie) → 播放链接。
+# 带不带 cookie（以及哪个账号）返回的字段与音质不同，键中的 cookie 部分为其摘要（见 _cookie_scope）。
+# 播放链接带签名且会过期（接口返回 expi 秒），缓存时间取 expi 减去余量与 SONG_URL_TTL 的较小值。
+SEARCH_TTL = 600.0
+DETAIL_TTL = 3600.0
+SONG_URL_TTL = 600.0
+SONG_URL_EXPIRY_MARGIN = 120.0
+# 某音质无可用链接时短暂记住，避免每次都先探测一遍
+SONG_URL_MISS_TTL = 300.0
+# 经 state 创建，MCP_STATE_BACKEND=redis 时多 worker 共享
+_search_cache = state.cache("netease:search", maxsize=512, ttl=SEARCH_TTL)
+_detail_cache = state.cache("netease:detail", maxsize=2048, ttl=DETAIL_TTL)
+_song_url_cache = state.cache("netease:song_url", maxsize=2048, ttl=SONG_URL_TTL)
+# 未命中标记须可 JSON 序列化（共享后端），用 == 比较
+_NO_URL = "no-url"
+
+# 封面磁盘缓存（按 URL 内容寻址，LRU 淘汰）；同一专辑的歌曲共用封面，只需下载一次
+COVER_CACHE_DIR = os.environ.get("NETEASE_COVER_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "mcp-cloudreve", "covers",
+)
+COVER_CACHE_MAX_BYTES = int(os.environ.get("NETEASE_COVER_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+# 嵌入封面的默认边长（像素，服务端按 ?param=WyH 缩放）；0 表示原图
+COVER_SIZE = int(os.environ.get("NETEASE_COVER_SIZE", "0"))
+_cover_cache = DiskLRUCache(COVER_CACHE_DIR, COVER_CACHE_MAX_BYTES)
+# 封面下载并发上限；同一 URL 同时只下载一次
+_cover_fetch_slots = threading.BoundedSemaphore(int(os.environ.get("NETEASE_COVER_FETCH_CONCURRENCY", "4")))
+_cover_url_locks: dict[str, threading.Lock] = {}
+_cover_url_locks_guard = threading.Lock()
+
+
+def _request(method: str, url: str, *, headers: dict | None = None, **kwargs) -> httpx.Response:
+    """经共享传输层（按主机复用连接）发送请求；默认带 HEADERS、15 秒超时。"""
+    kwargs.setdefault("timeout", 15.0)
+    return transport.get_client(url).request(method, url, headers={**HEADERS, **(headers or {})}, **kwargs)
+
+
+def _cookie_header(cookies: dict) -> str:
+    return "; ".join(f"{k}={v}" for k, v in cookies.items())
+
 
 def _hex_digest(data: bytes) -> str:
-    return "".join(hex(d)[2:].zfill(2) for d in data)
+    return data.hex()
 
 
 def _hash_hex_digest(text: str) -> str:
-    return _hex_digest(md5(text.encode("utf-8")).digest())
+    return md5(text.encode("utf-8")).hexdigest()
 
 
 def _pkcs7_pad(data: bytes, block_size: int = 16) -> bytes:
     """PKCS7 填充至 block_size 的整数倍（若已对齐则补一整块）。"""
     pad_len = block_size - (len(data) % block_size)
-    return data + bytes([pad_len] * pad_len)
+    return data + bytes((pad_len,)) * pad_len
+
+
+@functools.lru_cache(maxsize=1)
+def _eapi_cipher():
+    """eapi 固定密钥的 AES-ECB（首次使用时才导入 cryptography）；Cipher 可复用，每次调用只新建 encryptor 上下文。"""
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    return Cipher(algorithms.AES(AES_KEY), modes.ECB())
 
 
 def _encrypt_params(url_path: str, payload: dict) -> str:
     url2 = url_path.replace("/eapi/", "/api/")
-    digest = _hash_hex_digest(f"nobody{url2}use{json.dumps(payload)}md5forencrypt")
-    params_str = f"{url2}-36cd479b6b5-{json.dumps(payload)}-36cd479b6b5-{digest}"
-    raw = params_str.encode("utf-8")
-    padded = _pkcs7_pad(raw, 16)
-    cipher = Cipher(algorithms.AES(AES_KEY), modes.ECB())
-    encryptor = cipher.encryptor()
-    enc = encryptor.update(padded) + encryptor.finalize()
-    return _hex_digest(enc)
+    text = json.dumps(payload)
+    digest = _hash_hex_digest(f"nobody{url2}use{text}md5forencrypt")
+    params_str = f"{url2}-36cd479b6b5-{text}-36cd479b6b5-{digest}"
+    padded = _pkcs7_pad(params_str.encode("utf-8"), 16)
+    encryptor = _eapi_cipher().encryptor()
+    return _hex_digest(encryptor.update(padded) + encryptor.finalize())
 
 
 def _post(path: str, payload: dict, cookie: str = "") -> dict:
     url = BASE_URL + path
     params_hex = _encrypt_params(path, payload)
-    headers = {**HEADERS}
     cookies = {"os": "pc", "appver": "", "osver": "", "deviceId": "pyncm!"}
-    if cookie:
-        for item in cookie.strip().split(";"):
-            item = item.strip()
-            if "=" in item:
-                k, v = item.split("=", 1)
-                cookies[k.strip()] = v.strip()
-    with httpx.Client(timeout=15.0, headers=headers, cookies=cookies) as client:
-        r = client.post(url, data={"params": params_hex})
-        r.raise_for_status()
-        return r.json()
+    cookies.update(_parse_cookies(cookie))
+    r = _request(
+        "POST",
+        url,
+        data={"params": params_hex},
+        headers={"Cookie": _cookie_header(cookies)},
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def _cookie_scope(cookie: str) -> str:
+    """缓存键中区分调用方身份的部分：cookie 的摘要（不保存 cookie 本身），无 cookie 为空串。"""
+    return _hash_hex_digest(cookie) if cookie else ""
 
 
 def search(keyword: str, limit: int = 30, cookie: str = "") -> list[dict]:
-    """搜索歌曲，返回 [{id, name, artists, album, pic_url}, ...]。"""
+    """搜索歌曲，返回 [{id, name, artists, album, pic_url}, ...]。结果按 (关键词, limit, cookie) 缓存 SEARCH_TTL 秒。"""
+    cache_key = (keyword.strip(), limit, _cookie_scope(cookie))
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
     config = {
         "os": "pc",
         "appver": "",
@@ -100,7 +166,9 @@ def search(keyword: str, limit: int = 30, cookie: str = "") -> list[dict]:
             "album": album.get("name", "未知"),
             "pic_url": pic_url,
         })
-    return out
+    if out:
+        _search_cache.set(cache_key, out)
+    return list(out)
 
 
 def _parse_cookies(cookie: str) -> dict:
@@ -114,33 +182,44 @@ def _parse_cookies(cookie: str) -> dict:
 
 
 def get_song_detail(song_id: int | str, cookie: str = "") -> dict | None:
-    """获取歌曲详情（名称、歌手、专辑、封面图）。不走 eapi 加密。传 cookie 时可能返回更完整数据。"""
+    """获取歌曲详情（名称、歌手、专辑、封面图）。不走 eapi 加密。传 cookie 时可能返回更完整数据。结果按 (歌曲 ID, cookie) 缓存 DETAIL_TTL 秒。"""
     sid = int(song_id)
+    cached = _detail_cache.get((sid, _cookie_scope(cookie)))
+    if cached is not None:
+        return dict(cached)
     url = f"{BASE_URL}/api/v3/song/detail"
     data = {"c": json.dumps([{"id": sid, "v": 0}])}
-    headers = {**HEADERS, "Referer": "https://music.163.com/"}
-    cookies = _parse_cookies(cookie)
+    headers = {"Referer": "https://music.163.com/"}
+    if cookie:
+        headers["Cookie"] = _cookie_header(_parse_cookies(cookie))
     song = None
-    with httpx.Client(timeout=15.0, headers=headers, cookies=cookies) as client:
-        r = client.post(url, data=data)
-        r.raise_for_status()
-        result = json.loads(r.text)
-        songs = result.get("songs") or (result.get("data") or {}).get("songs")
-        if songs:
-            song = songs[0]
-        if not song and r.status_code == 200:
-            # 备用：music.163.com 老接口 GET
-            r2 = client.get(
-                "https://music.163.com/api/song/detail/",
-                params={"id": sid, "ids": f"[{sid}]"},
-                headers=headers,
-            )
-            r2.raise_for_status()
-            raw = json.loads(r2.text)
-            if raw.get("songs"):
-                song = raw["songs"][0]
+    r = _request("POST", url, data=data, headers=headers)
+    r.raise_for_status()
+    result = json.loads(r.text)
+    songs = result.get("songs") or (result.get("data") or {}).get("songs")
+    if songs:
+        song = songs[0]
+    if not song and r.status_code == 200:
+        # 备用：music.163.com 老接口 GET
+        r2 = _request(
+            "GET",
+            f"{WEB_BASE_URL}/api/song/detail/",
+            params={"id": sid, "ids": f"[{sid}]"},
+            headers=headers,
+        )
+        r2.raise_for_status()
+        raw = json.loads(r2.text)
+        if raw.get("songs"):
+            song = raw["songs"][0]
     if not song:
         return None
+    detail = _normalize_song(song)
+    _detail_cache.set((sid, _cookie_scope(cookie)), detail)
+    return dict(detail)
+
+
+def _normalize_song(song: dict) -> dict:
+    """把详情接口返回的歌曲对象整理为 {id, name, artists, album, pic_url}。"""
     # 部分接口用 al/ar，部分用 album/artists
     al = song.get("al") or song.get("album") or {}
     ar = song.get("ar") or song.get("artists") or []
@@ -160,32 +239,118 @@ def get_song_detail(song_id: int | str, cookie: str = "") -> dict | None:
     }
 
 
-def get_song_url(song_id: int | str, level: str = "lossless", cookie: str = "") -> dict | None:
-    """获取歌曲播放/下载链接。level: standard, exhigh, lossless, hires 等。"""
-    config = {
+# /api/v3/song/detail 与 song/enhance/player/url/v1 单次请求的歌曲 ID 上限
+BATCH_SIZE = 500
+
+
+def get_song_details(song_ids: list[int | str], cookie: str = "") -> dict[int, dict]:
+    """批量获取歌曲详情，返回 {歌曲 ID: 详情}。已缓存的直接取缓存，其余每 BATCH_SIZE 首一次请求（c 参数传 ID 列表）。"""
+    out: dict[int, dict] = {}
+    missing: list[int] = []
+    scope = _cookie_scope(cookie)
+    for song_id in song_ids:
+        sid = int(song_id)
+        cached = _detail_cache.get((sid, scope))
+        if cached is not None:
+            out[sid] = dict(cached)
+        elif sid not in missing:
+            missing.append(sid)
+    headers = {"Referer": "https://music.163.com/"}
+    if cookie:
+        headers["Cookie"] = _cookie_header(_parse_cookies(cookie))
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
+        r = _request(
+            "POST",
+            f"{BASE_URL}/api/v3/song/detail",
+            data={"c": json.dumps([{"id": sid, "v": 0} for sid in batch])},
+            headers=headers,
+        )
+        r.raise_for_status()
+        result = json.loads(r.text)
+        for song in result.get("songs") or (result.get("data") or {}).get("songs") or []:
+            if not song.get("id"):
+                continue
+            detail = _normalize_song(song)
+            _detail_cache.set((int(song["id"]), scope), detail)
+            out[int(song["id"])] = dict(detail)
+    return out
+
+
+def _song_url_cache_key(song_id: int, level: str, cookie: str) -> tuple:
+    # cookie 决定账号权限（能拿到的音质）
+    return (song_id, level, _cookie_scope(cookie))
+
+
+def _url_header() -> str:
+    return json.dumps({
         "os": "pc",
         "appver": "",
         "osver": "",
         "deviceId": "pyncm!",
         "requestId": str(randrange(20000000, 30000000)),
-    }
-    payload = {
-        "ids": [int(song_id)],
-        "level": level,
-        "encodeType": "flac",
-        "header": json.dumps(config),
-    }
-    result = _post("/eapi/song/enhance/player/url/v1", payload, cookie=cookie)
-    if "data" not in result or not result["data"]:
-        return None
-    d = result["data"][0]
-    if not d.get("url"):
+    })
+
+
+def _cache_song_url(sid: int, level: str, cookie: str, d: dict | None) -> dict | None:
+    """把接口返回的一条链接信息写入缓存并返回 {url, size, level}；无链接时记一条短期未命中。"""
+    cache_key = _song_url_cache_key(sid, level, cookie)
+    if not d or not d.get("url"):
+        _song_url_cache.set(cache_key, _NO_URL, ttl=SONG_URL_MISS_TTL)
         return None
-    return {"url": d["url"], "size": d.get("size", 0), "level": d.get("level", "")}
+    info = {"url": d["url"], "size": d.get("size", 0), "level": d.get("level", "")}
+    ttl = SONG_URL_TTL
+    if d.get("expi"):
+        ttl = min(ttl, float(d["expi"]) - SONG_URL_EXPIRY_MARGIN)
+    _song_url_cache.set(cache_key, info, ttl=ttl)
+    # 服务端会按账号权限自动降级音质，实际音质的请求也可直接命中
+    granted = info["level"]
+    if granted and granted != level:
+        _song_url_cache.set(_song_url_cache_key(sid, granted, cookie), info, ttl=ttl)
+    return info
+
+
+def get_song_url(song_id: int | str, level: str = "lossless", cookie: str = "") -> dict | None:
+    """获取歌曲播放/下载链接。level: standard, exhigh, lossless, hires 等。
+    结果按 (歌曲 ID, level, cookie) 缓存，缓存时间短于链接签名的有效期；无链接的结果缓存 SONG_URL_MISS_TTL 秒。"""
+    sid = int(song_id)
+    return get_song_urls([sid], level=level, cookie=cookie).get(sid)
+
+
+def get_song_urls(song_ids: list[int | str], level: str = "lossless", cookie: str = "") -> dict[int, dict]:
+    """批量获取播放链接，返回 {歌曲 ID: {url, size, level}}（无链接的 ID 不在结果中）。
+    接口 ids 参数接受列表，未缓存的 ID 每 BATCH_SIZE 首一次请求。"""
+    out: dict[int, dict] = {}
+    missing: list[int] = []
+    for song_id in song_ids:
+        sid = int(song_id)
+        cached = _song_url_cache.get(_song_url_cache_key(sid, level, cookie))
+        if cached == _NO_URL:
+            continue
+        if cached is not None:
+            out[sid] = dict(cached)
+        elif sid not in missing:
+            missing.append(sid)
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
+        payload = {
+            "ids": batch,
+            "level": level,
+            "encodeType": "flac",
+            "header": _url_header(),
+        }
+        result = _post("/eapi/song/enhance/player/url/v1", payload, cookie=cookie)
+        by_id = {int(d["id"]): d for d in result.get("data") or [] if d.get("id")}
+        for sid in batch:
+            info = _cache_song_url(sid, level, cookie, by_id.get(sid))
+            if info:
+                out[sid] = dict(info)
+    return out
 
 
 def get_song_with_best_url(keyword_or_id: str, cookie: str = "") -> dict | None:
-    """根据关键词或歌曲 ID 获取歌曲信息及最高可用音质下载链接。优先尝试无损音质，兜底次高音质、标准音质。封面等元数据统一走 get_song_detail。"""
+    """根据关键词或歌曲 ID 获取歌曲信息及最高可用音质下载链接。优先尝试无损音质，兜底次高音质、标准音质。封面等元数据统一走 get_song_detail。
+    通常请求无损时服务端已按账号权限降级返回可用音质，只需一次请求；各步结果均有缓存。"""
     if keyword_or_id.strip().isdigit():
         song_id = int(keyword_or_id.strip())
         fallback = {"id": song_id, "name": "", "artists": [], "album": "", "pic_url": ""}
@@ -216,23 +381,224 @@ def get_song_with_best_url(keyword_or_id: str, cookie: str = "") -> dict | None:
     return None
 
 
-def download_netease_song_to_path(url: str, path: str) -> int:
-    """下载网易云歌曲到本地文件，返回写入字节数。"""
-    with httpx.Client(timeout=60.0, follow_redirects=True) as client:
-        r = client.get(url)
-        r.raise_for_status()
-        with open(path, "wb") as f:
-            n = 0
-            for chunk in r.iter_bytes(chunk_size=65536):
-                f.write(chunk)
-                n += len(chunk)
-        return n
+def get_songs_with_best_urls(song_ids: list[int | str], cookie: str = "") -> list[dict]:
+    """批量版 get_song_with_best_url：按输入顺序返回 [{id, name, artists, album, pic_url, url, size, level}, ...]。
+    详情与链接均批量请求；无损拿不到链接的歌曲再批量尝试极高、标准音质。始终无链接的歌曲 url 为空字符串。"""
+    ids = [int(i) for i in song_ids]
+    details = get_song_details(ids, cookie=cookie)
+    urls: dict[int, dict] = {}
+    pending = list(dict.fromkeys(ids))
+    for level in ("lossless", "exhigh", "standard"):
+        if not pending:
+            break
+        urls.update(get_song_urls(pending, level=level, cookie=cookie))
+        pending = [sid for sid in pending if sid not in urls]
+    out = []
+    for sid in ids:
+        d = details.get(sid) or {"id": sid, "name": "", "artists": [], "album": "", "pic_url": ""}
+        u = urls.get(sid) or {}
+        out.append({
+            "id": sid,
+            "name": d.get("name", "未知"),
+            "artists": d.get("artists", []),
+            "album": d.get("album", ""),
+            "pic_url": d.get("pic_url", ""),
+            "url": u.get("url", ""),
+            "size": u.get("size", 0),
+            "level": u.get("level", ""),
+        })
+    return out
 
 
-def _detect_audio_format(path: str) -> str | None:
+def parse_collection_id(text: str, kind: str = "") -> tuple[str, int]:
+    """
+    从歌单/专辑链接或纯数字 ID 中解析 (kind, id)。kind 为 "playlist" 或 "album"；
+    链接中含 album 时自动识别为专辑，纯数字时使用传入的 kind（默认 playlist）。
+    """
+    raw = (text or "").strip()
+    if raw.isdigit():
+        return (kind or "playlist", int(raw))
+    match = re.search(r"https?://\S+", raw)
+    url = urllib.parse.urlsplit(match.group(0) if match else raw)
+    # 网页版地址把路由放在 #/ 之后（music.163.com/#/playlist?id=...），与路径部分分别解析
+    fragment = urllib.parse.urlsplit(url.fragment)
+    for path, query in ((url.path, url.query), (fragment.path, fragment.query)):
+        segments = [seg for seg in path.split("/") if seg]
+        found_kind = next((seg for seg in reversed(segments) if seg in ("playlist", "album")), "")
+        if not found_kind:
+            continue
+        ids = urllib.parse.parse_qs(query).get("id") or []
+        if ids and ids[0].isdigit():
+            return (kind or found_kind, int(ids[0]))
+        # 路径形式 /playlist/<id>
+        following = segments[segments.index(found_kind) + 1:]
+        if following and following[0].isdigit():
+            return (kind or found_kind, int(following[0]))
+    raise ValueError("无法从链接中解析歌单或专辑 ID")
+
+
+def get_playlist(playlist_id: int | str, cookie: str = "") -> dict:
+    """获取歌单名称与全部歌曲 ID（trackIds，一次请求），返回 {id, name, track_ids}。"""
+    headers = {"Referer": "https://music.163.com/"}
+    if cookie:
+        headers["Cookie"] = _cookie_header(_parse_cookies(cookie))
+    r = _request(
+        "POST",
+        f"{BASE_URL}/api/v6/playlist/detail",
+        data={"id": str(int(playlist_id)), "n": "100000", "s": "8"},
+        headers=headers,
+    )
+    r.raise_for_status()
+    result = json.loads(r.text)
+    playlist = result.get("playlist")
+    if not playlist:
+        raise RuntimeError(result.get("message") or result.get("msg") or "获取歌单失败")
+    track_ids = [int(t["id"]) for t in playlist.get("trackIds") or [] if t.get("id")]
+    if not track_ids:
+        track_ids = [int(t["id"]) for t in playlist.get("tracks") or [] if t.get("id")]
+    return {"id": int(playlist_id), "name": playlist.get("name", ""), "track_ids": track_ids}
+
+
+def get_album(album_id: int | str, cookie: str = "") -> dict:
+    """获取专辑名称与全部歌曲 ID（一次请求），并把返回的歌曲写入详情缓存（与 cookie 对应）。返回 {id, name, track_ids}。"""
+    headers = {"Referer": "https://music.163.com/"}
+    if cookie:
+        headers["Cookie"] = _cookie_header(_parse_cookies(cookie))
+    r = _request("GET", f"{WEB_BASE_URL}/api/v1/album/{int(album_id)}", headers=headers)
+    r.raise_for_status()
+    result = json.loads(r.text)
+    album = result.get("album")
+    if not album:
+        raise RuntimeError(result.get("message") or result.get("msg") or "获取专辑失败")
+    songs = result.get("songs") or album.get("songs") or []
+    for song in songs:
+        if song.get("id"):
+            detail = _normalize_song(song)
+            if not detail["pic_url"]:
+                detail["pic_url"] = album.get("picUrl", "")
+            _detail_cache.set((int(song["id"]), _cookie_scope(cookie)), detail)
+    return {
+        "id": int(album_id),
+        "name": album.get("name", ""),
+        "track_ids": [int(song["id"]) for song in songs if song.get("id")],
+    }
+
+
+# 歌曲下载：流式读取，中断后用 Range 从已收到的位置续传
+SONG_DOWNLOAD_RETRIES = 4
+
+
+def iter_song_bytes(url: str, expected_size: int = 0, chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    流式下载歌曲，逐块产出字节，不把整首歌读入内存。
+    连接中断时带 Range: bytes={已收字节}- 续传（服务端不支持 Range 时跳过已收部分），最多重试 SONG_DOWNLOAD_RETRIES 次。
+    expected_size>0（get_song_url 返回的 size）时，结束后校验总字节数，不一致抛 RuntimeError。
+    """
+    received = 0
+    attempt = 0
+    try:
+        while True:
+            headers = {"Range": f"bytes={received}-"} if received else {}
+            try:
+                with transport.get_client(url, http2=False).stream(
+                    "GET", url, headers=headers, timeout=httpx.Timeout(30.0, read=60.0), follow_redirects=True,
+                ) as r:
+                    r.raise_for_status()
+                    skip = received if received and r.status_code != 206 else 0
+                    for chunk in r.iter_bytes(chunk_size=chunk_size):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        received += len(chunk)
+                        yield chunk
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    raise
+                attempt += 1
+                if attempt > SONG_DOWNLOAD_RETRIES:
+                    raise
+                logger.warning("网易云下载中断（已收 %s 字节），第 %s 次续传 - %s", received, attempt, e)
+                metrics.record_retry()
+                time.sleep(1.0 * attempt)
+        if expected_size and received != expected_size:
+            raise RuntimeError(f"歌曲大小不一致：期望 {expected_size} 字节，实际 {received} 字节")
+    finally:
+        metrics.add_bytes("netease", "download", received)
+
+
+def download_netease_song_to_path(
+    url: str,
+    path: str,
+    expected_size: int = 0,
+    on_size: Callable[[int], None] | None = None,
+) -> int:
+    """下载网易云歌曲到本地文件（流式写入，支持续传与大小校验），返回写入字节数。
+    已知 expected_size 时，开始下载前以该大小调用 on_size（可用于提前创建上传会话）。"""
+    if on_size is not None and expected_size > 0:
+        on_size(expected_size)
+    n = 0
+    with open(path, "wb") as f:
+        for chunk in iter_song_bytes(url, expected_size):
+            f.write(chunk)
+            n += len(chunk)
+    return n
+
+
+def download_netease_song_with_cover(
+    url: str,
+    path: str,
+    cover_data: bytes,
+    mime: str,
+    expected_size: int = 0,
+    on_size: Callable[[int], None] | None = None,
+) -> dict:
+    """
+    下载歌曲并在同一遍写入中嵌入封面：先写带封面的 ID3v2 标签 / FLAC 元数据块，再流式写入音频主体。
+    内存占用与文件大小无关，且不需要事后整文件重写。M4A 等无法流式嵌入的格式原样写入，
+    由调用方决定是否再用 embed_cover_into_audio 补嵌。返回 {size, cover_embedded, format, cover_embed_error}，
+    文件头无法解析时歌曲原样写入，cover_embed_error 为原因（否则为 None）。
+    已知 expected_size 且流式嵌入成功时，写完文件头即以嵌入后的总大小调用 on_size。
+    """
+    stream = CoverEmbeddingStream(iter_song_bytes(url, expected_size), cover_data, mime)
+    n = 0
+    with open(path, "wb") as f:
+        for chunk in stream:
+            if n == 0 and on_size is not None and expected_size > 0 and stream.embedded:
+                on_size(expected_size + stream.size_delta)
+            f.write(chunk)
+            n += len(chunk)
+    return {"size": n, "cover_embedded": stream.embedded, "format": stream.format, "cover_embed_error": stream.error}
+
+
+def open_song_stream(url: str, expected_size: int, cover: tuple[bytes, str] | None = None) -> dict:
+    """
+    打开歌曲下载流，供直接交给分块上传（不落盘）。expected_size 必须为 get_song_url 返回的 size。
+    传 cover 时流中已嵌入封面；此时会先读取文件头以确定嵌入后的总大小。
+    返回 {chunks, size, cover_embedded, format, cover_embed_error}，size 为 chunks 的总字节数。
+    """
+    if expected_size <= 0:
+        raise ValueError("流式上传需要已知歌曲大小")
+    chunks = iter_song_bytes(url, expected_size)
+    if cover is None:
+        return {"chunks": chunks, "size": expected_size, "cover_embedded": False, "format": None, "cover_embed_error": None}
+    stream = CoverEmbeddingStream(chunks, *cover)
+    it = iter(stream)
+    first = next(it, b"")
+    return {
+        "chunks": itertools.chain([first], it),
+        "size": expected_size + stream.size_delta,
+        "cover_embedded": stream.embedded,
+        "format": stream.format,
+        "cover_embed_error": stream.error,
+    }
+
+
+def _detect_head_format(head: bytes) -> str | None:
     """根据文件头判断格式：'mp3'、'flac' 或 'm4a'（MP4 容器）。"""
-    with open(path, "rb") as f:
-        head = f.read(16)
     if len(head) < 8:
         return None
     if head.startswith(b"fLaC"):
@@ -245,31 +611,230 @@ def _detect_audio_format(path: str) -> str | None:
     return None
 
 
-def embed_cover_into_audio(audio_path: str, cover_url: str) -> bool:
-    """将封面图写入音频文件元数据（MP3 用 ID3 APIC，FLAC 用 picture）。封面从 cover_url 下载。
-    返回 True 表示已嵌入，False 表示跳过（格式不支持等）；下载或写入失败时抛异常。"""
+def _detect_audio_format(path: str) -> str | None:
+    """根据文件头判断格式：'mp3'、'flac' 或 'm4a'（MP4 容器）。"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    return _detect_head_format(head)
+
+
+def sized_cover_url(cover_url: str, size: int | None = None) -> str:
+    """为网易云封面 URL 加上服务端缩放参数 param={size}y{size}；size 为 None 时取 COVER_SIZE，<=0 时返回原图 URL。"""
+    size = COVER_SIZE if size is None else size
+    if size <= 0:
+        return cover_url
+    base = re.sub(r"([?&])param=[^&]*&?", r"\1", cover_url).rstrip("?&")
+    sep = "&" if "?" in base else "?"
+    return f"{base}{sep}param={size}y{size}"
+
+
+def _cover_mime(cover_data: bytes) -> str | None:
+    # 只接受真实图片：JPG/JPEG（网易云封面多为 jpg）或 PNG，MIME 用标准 image/jpeg / image/png
+    if cover_data[:2] == b"\xff\xd8":
+        return "image/jpeg"  # .jpg / .jpeg
+    if cover_data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    return None
+
+
+def fetch_cover(cover_url: str, size: int | None = None) -> tuple[bytes, str] | None:
+    """下载封面图，返回 (图片字节, MIME)。只接受 JPEG/PNG；URL 无效或内容不是图片时返回 None，下载失败抛异常。
+    size 为服务端缩放边长（见 sized_cover_url）。结果写入磁盘 LRU 缓存；同一 URL 并发请求只下载一次，总并发受限。"""
     if not cover_url or not cover_url.strip().startswith("http"):
         logger.debug("embed_cover: 无效或非 http 封面 URL，跳过")
-        return False
+        return None
+    url = sized_cover_url(cover_url.strip(), size)
+    with _cover_url_locks_guard:
+        url_lock = _cover_url_locks.setdefault(url, threading.Lock())
     try:
-        with httpx.Client(timeout=15.0, follow_redirects=True) as client:
-            r = client.get(cover_url)
-            r.raise_for_status()
-            cover_data = r.content
-    except Exception as e:
-        logger.warning("embed_cover: 下载封面失败 %s - %s", cover_url[:60], e)
-        raise
+        with url_lock:
+            cover_data = _cover_cache.get(url)
+            if cover_data is None:
+                try:
+                    with _cover_fetch_slots:
+                        r = _request("GET", url, follow_redirects=True)
+                        r.raise_for_status()
+                        cover_data = r.content
+                except Exception as e:
+                    logger.warning("embed_cover: 下载封面失败 %s - %s", url[:60], e)
+                    raise
+                if cover_data and len(cover_data) >= 50 and _cover_mime(cover_data):
+                    _cover_cache.set(url, cover_data)
+    finally:
+        with _cover_url_locks_guard:
+            if _cover_url_locks.get(url) is url_lock and not url_lock.locked():
+                del _cover_url_locks[url]
     if not cover_data or len(cover_data) < 50:
         logger.warning("embed_cover: 封面数据为空或过短 (%s bytes)", len(cover_data) if cover_data else 0)
-        return False
-    # 只接受真实图片：JPG/JPEG（网易云封面多为 jpg）或 PNG，MIME 用标准 image/jpeg / image/png
-    if cover_data[:2] == b"\xff\xd8":
-        mime = "image/jpeg"  # .jpg / .jpeg
-    elif cover_data[:8] == b"\x89PNG\r\n\x1a\n":
-        mime = "image/png"
-    else:
+        return None
+    mime = _cover_mime(cover_data)
+    if not mime:
         logger.warning("embed_cover: 封面非 JPEG/PNG，前 8 字节 %s", cover_data[:8].hex() if len(cover_data) >= 8 else "不足")
+        return None
+    return (cover_data, mime)
+
+
+def prefetch_covers(cover_urls: list[str], size: int | None = None) -> dict[str, bool | Exception]:
+    """
+    批量预取封面到磁盘缓存：URL 去重后并行下载（受封面并发上限约束），不在内存中保留图片，
+    之后 fetch_cover 直接从磁盘缓存读取。返回 {原 URL: True（可用，已缓存）| False（不是可用图片）| 异常（下载失败）}。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    unique = [u for u in dict.fromkeys(cover_urls) if u]
+    out: dict[str, bool | Exception] = {}
+    if not unique:
+        return out
+    with ThreadPoolExecutor(max_workers=min(len(unique), 8)) as pool:
+        futures = {u: pool.submit(fetch_cover, u, size) for u in unique}
+        for u, fut in futures.items():
+            try:
+                out[u] = fut.result() is not None
+            except Exception as e:
+                out[u] = e
+    return out
+
+
+def _cover_apic(cover_data: bytes, mime: str):
+    from mutagen.id3._frames import APIC
+
+    return APIC(encoding=3, mime=mime, type=3, desc="Cover", data=cover_data)
+
+
+class CoverEmbeddingStream:
+    """
+    包装音频字节块迭代器，在输出中就地加入封面，其余字节原样透传：
+      - MP3：输出新的 ID3v2 标签（保留源标签中的其他帧，替换 APIC）后接音频帧；
+      - FLAC：输出 fLaC 与源元数据块（去掉旧 PICTURE），追加 PICTURE 块并设为最后一块，再接音频帧。
+    只缓冲文件头部的标签/元数据块（至多 _HEADER_LIMIT 字节），音频主体逐块透传，可直接写文件或交给分块上传。
+    文件头无法解析（ID3 版本不支持、元数据块被截断等）时不嵌入，已缓冲的字节原样输出，error 记录原因。
+    迭代开始后 format、embedded、error 可用；size_delta 为输出相对输入的字节数变化。
+    """
+
+    _HEADER_LIMIT = 32 * 1024 * 1024
+
+    def __init__(self, chunks: Iterator[bytes], cover_data: bytes, mime: str) -> None:
+        self._chunks = iter(chunks)
+        self._buf = bytearray()
+        # 已解析到的位置：解析成功后才丢弃 _buf[:_pos]，失败时 _buf 仍是源数据的开头
+        self._pos = 0
+        self.cover_data = cover_data
+        self.mime = mime
+        self.format: str | None = None
+        self.embedded = False
+        self.size_delta = 0
+        self.error: str | None = None
+
+    def _fill(self, n: int) -> bool:
+        """缓冲区至少有 n 字节时返回 True；源已读完仍不足则返回 False。"""
+        while len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._buf += chunk
+        return True
+
+    def _take(self, n: int) -> bytes:
+        end = self._pos + n
+        if end > self._HEADER_LIMIT:
+            raise ValueError(f"文件头超过 {self._HEADER_LIMIT} 字节")
+        if not self._fill(end):
+            raise ValueError("音频数据不完整：文件头被截断")
+        out = bytes(self._buf[self._pos:end])
+        self._pos = end
+        return out
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._fill(16)
+        self.format = _detect_head_format(bytes(self._buf[:16]))
+        if self.format in ("mp3", "flac"):
+            try:
+                header = self._mp3_header() if self.format == "mp3" else self._flac_header()
+            except Exception as e:
+                self.embedded, self.size_delta = False, 0
+                self.error = f"无法解析 {self.format} 文件头：{str(e) or type(e).__name__}"
+                logger.warning("embed_cover: %s，原样输出", self.error)
+            else:
+                del self._buf[:self._pos]
+                yield header
+            self._pos = 0
+        else:
+            logger.debug("embed_cover: 格式 %s 不支持流式嵌入，原样输出", self.format)
+        if self._buf:
+            yield bytes(self._buf)
+            self._buf.clear()
+        yield from self._chunks
+
+    def _mp3_header(self) -> bytes:
+        import io
+
+        from mutagen.id3 import ID3
+
+        old = b""
+        if self._buf[:3] == b"ID3":
+            header = self._buf[:10]
+            if len(header) < 10:
+                raise ValueError("ID3 标签头被截断")
+            size = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+            if header[5] & 0x10:  # 带 footer
+                size += 10
+            old = self._take(size)
+        tags = ID3(io.BytesIO(old)) if old else ID3()
+        tags.delall("APIC")
+        tags.add(_cover_apic(self.cover_data, self.mime))
+        buf = io.BytesIO()
+        tags.save(buf, padding=lambda _: 0)
+        new = buf.getvalue()
+        self.embedded = True
+        self.size_delta = len(new) - len(old)
+        return new
+
+    def _flac_header(self) -> bytes:
+        from mutagen.flac import Picture
+
+        consumed = len(self._take(4))
+        blocks = []
+        while True:
+            header = self._take(4)
+            length = int.from_bytes(header[1:4], "big")
+            body = self._take(length)
+            consumed += 4 + length
+            block_type = header[0] & 0x7F
+            if block_type != 6:  # 丢弃原有 PICTURE
+                blocks.append((block_type, body))
+            if header[0] & 0x80:
+                break
+        pic = Picture()
+        pic.type = 3
+        pic.mime = self.mime
+        pic.desc = "Cover"
+        pic.data = self.cover_data
+        blocks.append((6, pic.write()))
+        out = bytearray(b"fLaC")
+        for i, (block_type, body) in enumerate(blocks):
+            last = 0x80 if i == len(blocks) - 1 else 0
+            out.append(last | block_type)
+            out += len(body).to_bytes(3, "big")
+            out += body
+        self.embedded = True
+        self.size_delta = len(out) - consumed
+        return bytes(out)
+
+
+def embed_cover_into_audio(
+    audio_path: str,
+    cover_url: str,
+    cover: tuple[bytes, str] | None = None,
+    size: int | None = None,
+) -> bool:
+    """将封面图写入音频文件元数据（MP3 用 ID3 APIC，FLAC 用 picture）。封面从 cover_url 下载，已下载时可直接传 cover=(数据, MIME)。
+    返回 True 表示已嵌入，False 表示跳过（格式不支持等）；下载或写入失败时抛异常。
+    下载时即可嵌入的场景优先用 download_netease_song_with_cover，避免事后重写文件。"""
+    if cover is None:
+        cover = fetch_cover(cover_url, size)
+    if cover is None:
         return False
+    cover_data, mime = cover
     fmt = _detect_audio_format(audio_path)
     if not fmt:
         logger.warning("embed_cover: 无法识别音频格式 %s", audio_path)
@@ -300,9 +865,8 @@ def embed_cover_into_audio(audio_path: str, cover_url: str) -> bool:
             return True
         # MP3：有 ID3 则直接改，无 ID3 则手动在文件头前插入 ID3 块
         from mutagen.id3 import ID3
-        from mutagen.id3._frames import APIC
 
-        apic = APIC(encoding=3, mime=mime, type=3, desc="Cover", data=cover_data)
+        apic = _cover_apic(cover_data, mime)
         try:
             tags = ID3(audio_path)
         except Exception:
@@ -337,4 +901,4 @@ def download_netease_song_to_path_by_keyword(keyword_or_id: str, path: str, cook
     info = get_song_with_best_url(keyword_or_id, cookie=cookie)
     if not info or not info.get("url"):
         raise RuntimeError("未获取到歌曲下载链接")
-    return download_netease_song_to_path(info["url"], path)
+    return download_netease_song_to_path(info["url"], path, info.get("size") or 0)
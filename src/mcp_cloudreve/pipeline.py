@@ -0,0 +1,388 @@
+"""
+入库流程公共部分：令牌状态、目标目录、从本地文件分块上传、批量直链。
+供 server 中抖音/哔哩哔哩/网易云等上传工具复用；可在多线程中共享同一个 TokenState。
+PreparedUpload 把目录创建、策略检查、上传会话创建放到后台线程，与媒体下载并行。
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+import httpx
+
+from . import buffers
+from . import cloudreve
+from . import listing
+from . import state
+from . import uploaders
+
+logger = logging.getLogger(__name__)
+
+# 控制面请求（建目录、查策略、建会话、取消会话）的后台线程池，所有工具调用共享
+_control_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CLOUDREVE_CONTROL_CONCURRENCY", "16")),
+    thread_name_prefix="cloudreve-ctl",
+)
+# 存储策略列表按令牌缓存，同一用户连续入库时不再重复请求（MCP_STATE_BACKEND=redis 时多 worker 共享）
+_policies_cache = state.cache("cloudreve:policies", maxsize=256, ttl=300.0)
+
+
+def normalize_folder_uri(folder_uri: str) -> str:
+    """去掉末尾 /，并把 cloudreve://douyin 这类缺少文件系统段的 URI 补为 cloudreve://my/douyin。"""
+    folder = folder_uri.strip().rstrip("/")
+    if folder.startswith("cloudreve://") and "/" not in folder[len("cloudreve://"):]:
+        folder = f"cloudreve://my/{folder[len('cloudreve://'):]}"
+    return folder
+
+
+class TokenState:
+    """
+    一次工具调用内共享的 Cloudreve 令牌。
+    任一步骤（可能在其他线程）触发刷新后，后续请求统一改用新令牌，最终把刷新结果返回给调用方。
+    刷新是 single-flight 的：多个线程同时遇到 401 时只有一个去刷新，其余等它完成后直接用新令牌重试，
+    不会拿同一个 refresh_token 重复刷新（服务端轮换 refresh_token 时重复刷新只有一次能成功）。
+    """
+
+    def __init__(self, access_token: str, refresh_token: str | None = None) -> None:
+        self.access_token = access_token
+        self.refresh_token = refresh_token or None
+        self.refreshed: dict | None = None
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def snapshot(self) -> tuple[str, str | None]:
+        with self._lock:
+            return self.access_token, self.refresh_token
+
+    def cache_key(self) -> str:
+        """按用户区分缓存条目用的键：当前 access_token 的 sha256（不保存令牌本身）。"""
+        access_token, _ = self.snapshot()
+        return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+    def apply(self, refreshed: cloudreve.RefreshedTokens) -> None:
+        if not refreshed:
+            return
+        with self._lock:
+            self.access_token = refreshed["access_token"]
+            self.refresh_token = refreshed.get("refresh_token")
+            self.refreshed = refreshed
+            self.refresh_count += 1
+
+    def _refresh(self, stale: str) -> None:
+        """以 stale 调用遇到 401 后调用：持刷新锁时若令牌已被其他线程换掉则直接返回，否则刷新一次。"""
+        with self._refresh_lock:
+            access_token, rft = self.snapshot()
+            if access_token != stale or not rft:
+                return
+            self.apply(cloudreve.refresh_token_api(rft))
+
+    def call(self, fn: Callable[..., tuple[Any, cloudreve.RefreshedTokens]], *args: Any, **kwargs: Any) -> Any:
+        """
+        以当前令牌调用 cloudreve 中返回 (data, refreshed) 的函数并返回 data。
+        不把 refresh_token 交给 fn（避免各线程各自刷新）：遇到 401 时由 _refresh 串行刷新，再用新令牌重试一次。
+        """
+        access_token, rft = self.snapshot()
+        try:
+            data, _ = fn(access_token, *args, **kwargs)
+            return data
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 401 or not rft:
+                raise
+        self._refresh(access_token)
+        access_token, _ = self.snapshot()
+        data, _ = fn(access_token, *args, **kwargs)
+        return data
+
+    def refreshed_tokens(self) -> dict | None:
+        """工具输出中的 refreshed_tokens 字段；未刷新时为 None。"""
+        r = self.refreshed
+        if not r:
+            return None
+        return {
+            "access_token": r["access_token"],
+            "refresh_token": r["refresh_token"],
+            "access_expires": r.get("access_expires"),
+            "refresh_expires": r.get("refresh_expires"),
+        }
+
+
+def ensure_folder(tokens: TokenState, folder: str) -> None:
+    """创建/确认文件夹（已存在不报错）。"""
+    tokens.call(cloudreve.create_file, folder, "folder", err_on_conflict=False)
+    listing.invalidate(tokens, folder)
+
+
+def check_policy(tokens: TokenState, policy_id: str, size: int | None = None) -> dict | None:
+    """
+    确认 policy_id 在当前用户可用的存储策略中，且 size 不超过其 max_size（max_size 为 0 表示不限）。
+    不满足时抛 ValueError；获取策略列表本身失败时只记日志并返回 None（交给后续上传报错）。
+    """
+    key = tokens.cache_key()
+    policies = _policies_cache.get(key)
+    if policies is None:
+        try:
+            policies = tokens.call(cloudreve.list_storage_policies)
+        except Exception as e:
+            logger.warning("获取存储策略列表失败，跳过策略检查 - %s", e)
+            return None
+        _policies_cache.set(key, policies)
+    policy = next((p for p in policies if str(p.get("id")) == str(policy_id)), None)
+    if policy is None:
+        raise ValueError(f"存储策略 {policy_id} 不存在或当前用户不可用")
+    max_size = policy.get("max_size") or 0
+    if size is not None and max_size and size > max_size:
+        raise ValueError(f"文件大小 {size} 字节超过存储策略上限 {max_size} 字节")
+    return policy
+
+
+def prepare_target(tokens: TokenState, folder: str, policy_id: str) -> dict | None:
+    """并行创建/确认目标文件夹与检查存储策略（结果进入缓存，供随后的批量上传复用），返回策略信息。"""
+    folder_future = _control_pool.submit(ensure_folder, tokens, folder)
+    policy = check_policy(tokens, policy_id)
+    folder_future.result()
+    return policy
+
+
+def _create_session(tokens: TokenState, uri: str, size: int, policy_id: str, mime_type: str) -> dict:
+    return tokens.call(cloudreve.create_upload_session, uri, size, policy_id, mime_type=mime_type)
+
+
+def _uploaded(tokens: TokenState, uri: str, size: int, chunks: int) -> dict:
+    """上传完成：使 uri 所在文件夹的列表缓存失效，返回 {size, chunks}。"""
+    listing.invalidate(tokens, uri)
+    return {"size": size, "chunks": chunks}
+
+
+def _upload_session_from_path(tokens: TokenState, session_data: dict, path: str, size: int) -> int:
+    """按会话的 chunk_size 从文件顺序上传全部分块（readinto 到缓冲池中的同一块缓冲区），返回分块数。
+    会话可直传后端存储（S3 / OneDrive / 从机）时交给 uploaders，否则经 Cloudreve 中转。"""
+    if uploaders.is_direct(session_data):
+        return uploaders.upload_path(tokens, session_data, path, size)
+    chunk_size = session_data["chunk_size"] or size
+    if chunk_size <= 0:
+        chunk_size = size
+    session_id = session_data["session_id"]
+    index = 0
+    with open(path, "rb", buffering=0) as f, buffers.acquire(min(chunk_size, size)) as buf:
+        for _ in range(0, size, chunk_size):
+            n = buffers.readinto_full(f, buf)
+            tokens.call(cloudreve.upload_file_chunk, session_id, index, buf[:n])
+            index += 1
+    return index
+
+
+def upload_path(
+    tokens: TokenState,
+    uri: str,
+    path: str,
+    policy_id: str,
+    *,
+    mime_type: str = "application/octet-stream",
+) -> dict:
+    """将本地文件分块上传到 uri，返回 {size, chunks}。分块大小以上传会话返回的 chunk_size 为准。"""
+    size = os.path.getsize(path)
+    session_data = _create_session(tokens, uri, size, policy_id, mime_type)
+    return _uploaded(tokens, uri, size, _upload_session_from_path(tokens, session_data, path, size))
+
+
+def _after(prereqs: list[Future | None], fn: Callable[..., Any], *args: Any) -> Future:
+    """prereqs 全部完成后再把 fn 提交到控制面线程池；任一前置失败则返回的 Future 以该异常结束。等待期间不占用线程。"""
+    out: Future = Future()
+    pending = [f for f in prereqs if f is not None]
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def run() -> None:
+        try:
+            for f in pending:
+                f.result()
+            out.set_result(fn(*args))
+        except BaseException as e:
+            out.set_exception(e)
+
+    def done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            _control_pool.submit(run)
+
+    if not pending:
+        _control_pool.submit(run)
+    for f in pending:
+        f.add_done_callback(done)
+    return out
+
+
+class PreparedUpload:
+    """
+    与媒体下载并行准备上传：构造时即在后台创建目标文件夹（folder 不为空时）并检查存储策略；
+    下载方拿到大小（Content-Length 等）后调用 on_size，后台随即创建上传会话。
+    下载完成后 upload_path 直接使用已建好的会话；实际大小与预估不符时取消旧会话重新创建。
+    出错或未使用时调用 abort 清理提前创建的会话。
+    """
+
+    def __init__(
+        self,
+        tokens: TokenState,
+        uri: str,
+        policy_id: str,
+        *,
+        mime_type: str = "application/octet-stream",
+        folder: str | None = None,
+    ) -> None:
+        self.tokens = tokens
+        self.uri = uri
+        self.policy_id = policy_id
+        self.mime_type = mime_type
+        self._folder_future: Future | None = _control_pool.submit(ensure_folder, tokens, folder) if folder else None
+        self._policy_future: Future = _control_pool.submit(check_policy, tokens, policy_id)
+        self._session_future: Future | None = None
+        self._session_size: int | None = None
+        self._lock = threading.Lock()
+
+    def _wait_ready(self) -> dict | None:
+        """等待目录创建与策略检查完成（失败时抛出其异常），返回策略信息。"""
+        if self._folder_future is not None:
+            self._folder_future.result()
+        return self._policy_future.result()
+
+    def on_size(self, size: int) -> None:
+        """下载方得知最终大小时调用（可在下载线程中）。策略检查已失败或超出上限时抛异常以中止下载。"""
+        if self._policy_future.done():
+            policy = self._policy_future.result()
+            max_size = (policy or {}).get("max_size") or 0
+            if max_size and size > max_size:
+                raise ValueError(f"文件大小 {size} 字节超过存储策略上限 {max_size} 字节")
+        with self._lock:
+            if self._session_future is not None:
+                return
+            self._session_size = size
+            self._session_future = _after(
+                [self._folder_future, self._policy_future],
+                _create_session, self.tokens, self.uri, size, self.policy_id, self.mime_type,
+            )
+
+    def _cancel_session(self, future: Future) -> None:
+        try:
+            session_data = future.result()
+        except Exception:
+            return
+        try:
+            self.tokens.call(cloudreve.delete_upload_session, session_data["session_id"], self.uri)
+        except Exception as e:
+            logger.debug("取消上传会话失败 %s - %s", self.uri, e)
+
+    def _take_session(self, size: int) -> dict:
+        """
+        取出提前创建的会话；没有或大小不符时按 size 新建。
+        大小不符时先同步取消旧会话：会话存在期间 Cloudreve 为该 URI 保留占位文件与锁，旧会话未删除时新建会冲突。
+        """
+        with self._lock:
+            future, self._session_future = self._session_future, None
+            expected = self._session_size
+        if future is not None and expected != size:
+            self._cancel_session(future)
+            future = None
+        if future is None:
+            self._wait_ready()
+            check_policy(self.tokens, self.policy_id, size)
+            return _create_session(self.tokens, self.uri, size, self.policy_id, self.mime_type)
+        return future.result()
+
+    def upload_path(self, path: str) -> dict:
+        """上传下载完成的本地文件，返回 {size, chunks}。"""
+        size = os.path.getsize(path)
+        session_data = self._take_session(size)
+        return _uploaded(self.tokens, self.uri, size, _upload_session_from_path(self.tokens, session_data, path, size))
+
+    def upload_stream(self, chunks: Iterable[bytes], size: int) -> dict:
+        """同模块级 upload_stream，但复用提前准备好的目录、策略检查与会话。"""
+        session_data = self._take_session(size)
+        return _uploaded(self.tokens, self.uri, size, _upload_session_from_stream(self.tokens, session_data, chunks, size))
+
+    def abort(self) -> None:
+        """放弃上传：取消已提前创建的会话（在后台进行）。"""
+        with self._lock:
+            future, self._session_future = self._session_future, None
+        if future is not None:
+            future.add_done_callback(lambda f: _control_pool.submit(self._cancel_session, f))
+
+
+def _upload_session_from_stream(
+    tokens: TokenState,
+    session_data: dict,
+    chunks: Iterable[bytes],
+    size: int,
+) -> int:
+    """按会话的 chunk_size 把字节流重新切块（拷贝进缓冲池中的同一块缓冲区）顺序上传，返回分块数；流的实际大小与 size 不一致时抛 RuntimeError。"""
+    if uploaders.is_direct(session_data):
+        return uploaders.upload_stream(tokens, session_data, chunks, size)
+    chunk_size = session_data["chunk_size"] or size
+    if chunk_size <= 0:
+        chunk_size = size
+    session_id = session_data["session_id"]
+    index = 0
+    sent = 0
+    filled = 0
+    with buffers.acquire(max(1, min(chunk_size, size))) as buf:
+        capacity = len(buf)
+        for data in chunks:
+            view = memoryview(data)
+            while view:
+                # 缓冲区满且还有数据时才发出，最后一块留到流结束后校验总大小再发
+                if filled == capacity:
+                    if sent + capacity >= size:
+                        raise RuntimeError(f"数据流超过声明大小 {size} 字节")
+                    tokens.call(cloudreve.upload_file_chunk, session_id, index, buf)
+                    sent += capacity
+                    filled = 0
+                    index += 1
+                n = min(len(view), capacity - filled)
+                buf[filled:filled + n] = view[:n]
+                filled += n
+                view = view[n:]
+            if sent + filled > size:
+                raise RuntimeError(f"数据流超过声明大小 {size} 字节")
+        if sent + filled != size:
+            raise RuntimeError(f"数据流大小不一致：声明 {size} 字节，实际 {sent + filled} 字节")
+        if filled or index == 0:
+            tokens.call(cloudreve.upload_file_chunk, session_id, index, buf[:filled])
+            index += 1
+    return index
+
+
+def upload_stream(
+    tokens: TokenState,
+    uri: str,
+    chunks: Iterable[bytes],
+    size: int,
+    policy_id: str,
+    *,
+    mime_type: str = "application/octet-stream",
+) -> dict:
+    """
+    把字节流（如边下载边产出的数据）直接分块上传到 uri，不落盘。size 须为流的准确总大小（创建会话需要）。
+    按会话的 chunk_size 重新切块，只占用缓冲池中的一个分块缓冲区；流的实际大小与 size 不一致时抛 RuntimeError。
+    返回 {size, chunks}。
+    """
+    session_data = _create_session(tokens, uri, size, policy_id, mime_type)
+    return _uploaded(tokens, uri, size, _upload_session_from_stream(tokens, session_data, chunks, size))
+
+
+def direct_links(tokens: TokenState, uris: list[str]) -> dict[str, str]:
+    """一次请求为多个文件创建直链，返回 {uri: 直链}；失败时每个 uri 对应一条错误说明。"""
+    if not uris:
+        return {}
+    try:
+        links = tokens.call(cloudreve.create_direct_links, uris)
+    except Exception as e:
+        return {uri: f"（获取直链失败：{e}）" for uri in uris}
+    out = {}
+    for uri, item in zip(uris, links):
+        out[uri] = (item or {}).get("link") or ""
+    return out
@@ -0,0 +1,96 @@
+"""
+可选的工具调用性能剖析：由环境变量开启，按采样率对 @mcp.tool() 调用做 cProfile 或 pyinstrument 剖析，
+结果写到 {MCP_PROFILE_DIR}/{工具名}/{时间戳}-{请求 ID}.prof|.html。未开启时装饰器直接调用原函数。
+
+  MCP_PROFILE=cprofile|pyinstrument   剖析器（不设则关闭）
+  MCP_PROFILE_RATE=0.1                采样率（0~1，默认 1 即每次调用）
+  MCP_PROFILE_DIR=/tmp/profiles       输出目录
+
+只剖析执行工具的线程；多 P、歌单等在线程池中并行的部分不在其中。
+"""
+
+import functools
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+import uuid
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODE = os.environ.get("MCP_PROFILE", "").strip().lower()
+PROFILE_RATE = float(os.environ.get("MCP_PROFILE_RATE", "1"))
+PROFILE_DIR = os.environ.get("MCP_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "mcp-cloudreve-profiles")
+
+if PROFILE_MODE == "pyinstrument":
+    try:
+        import pyinstrument
+    except ImportError:
+        logger.warning("MCP_PROFILE=pyinstrument 但未安装 pyinstrument（pip install \"mcp-cloudreve[profile]\"），已关闭剖析")
+        PROFILE_MODE = ""
+elif PROFILE_MODE == "cprofile":
+    import cProfile
+elif PROFILE_MODE:
+    logger.warning("未知的 MCP_PROFILE=%s（应为 cprofile 或 pyinstrument），已关闭剖析", PROFILE_MODE)
+    PROFILE_MODE = ""
+
+
+def _request_id() -> str:
+    """当前 MCP 请求的 ID（不在请求中时生成一个随机 ID）。"""
+    try:
+        from mcp.server.lowlevel.server import request_ctx
+
+        rid = str(request_ctx.get().request_id)
+    except (ImportError, LookupError):
+        rid = uuid.uuid4().hex[:12]
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", rid)
+
+
+def _output_path(tool: str, suffix: str) -> str:
+    directory = os.path.join(PROFILE_DIR, tool)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{_request_id()}{suffix}")
+
+
+def _run_cprofile(tool: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        try:
+            profiler.dump_stats(_output_path(tool, ".prof"))
+        except OSError as e:
+            logger.warning("写入剖析结果失败 %s - %s", tool, e)
+
+
+def _run_pyinstrument(tool: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    profiler = pyinstrument.Profiler()
+    profiler.start()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.stop()
+        try:
+            with open(_output_path(tool, ".html"), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        except OSError as e:
+            logger.warning("写入剖析结果失败 %s - %s", tool, e)
+
+
+def profile_tool(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """工具函数装饰器（放在 @mcp.tool() 下方）：按 MCP_PROFILE / MCP_PROFILE_RATE 采样剖析本次调用。"""
+    if not PROFILE_MODE:
+        return fn
+    name = fn.__name__
+    runner = _run_cprofile if PROFILE_MODE == "cprofile" else _run_pyinstrument
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if PROFILE_RATE < 1 and random.random() >= PROFILE_RATE:
+            return fn(*args, **kwargs)
+        return runner(name, fn, args, kwargs)
+
+    return wrapper
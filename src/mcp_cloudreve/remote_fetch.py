@@ -0,0 +1,164 @@
+"""
+服务端拉取：把已解析出的媒体直链交给 Cloudreve 离线下载（POST /workflow/download），
+由 Cloudreve 直接从 CDN 下载并写入存储策略，本进程只轮询任务状态，媒体字节不经过本机（不占暂存目录与带宽）。
+
+  CLOUDREVE_REMOTE_POLL_INTERVAL  轮询任务状态的间隔秒数（默认 2）
+  CLOUDREVE_REMOTE_TIMEOUT        等待任务完成的最长秒数（默认 600），超时取消任务
+
+离线下载不能携带自定义请求头（Referer、Cookie 等），也不能合并音视频或嵌入封面；
+用户组未开启离线下载、任务失败（如链接需要请求头）或超时时抛 Unavailable，调用方回退到本地下载上传。
+文件存入目标文件夹所在的存储策略（由 Cloudreve 按文件夹决定），policy_id 只用于大小上限检查。
+
+任务下载到目标文件夹下一个唯一的临时子文件夹（.mcp-fetch-<随机串>），完成后在其中改名再移动到目标文件夹，
+因此不会与并发的其他拉取互相覆盖、改错文件。创建任务前先经 listing.stat 检查目标：已有同名文件时与本地上传一样覆盖
+（移入前把旧文件移入回收站），是文件夹时直接报错；移入时仍冲突（期间被其他客户端写入）抛 Conflict。
+无论成功、失败、超时还是调用被中断，临时子文件夹都会被永久删除（未结束的任务先取消）。
+"""
+
+import logging
+import os
+import time
+import uuid
+
+import httpx
+
+from . import cloudreve
+from . import listing
+from . import pipeline
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("CLOUDREVE_REMOTE_POLL_INTERVAL", "2"))
+TIMEOUT = float(os.environ.get("CLOUDREVE_REMOTE_TIMEOUT", "600"))
+# 按任务 ID 查找时最多翻的页数（每页 100 个任务）
+_MAX_PAGES = 5
+_DONE = "completed"
+_FAILED = {"error", "canceled"}
+# 同名对象已存在的业务错误码
+_CONFLICT_CODES = {40004}
+_TEMP_PREFIX = ".mcp-fetch-"
+
+
+class Unavailable(RuntimeError):
+    """无法使用服务端拉取（未开启离线下载、任务失败或超时）；调用方应回退到本地下载上传。"""
+
+
+class Conflict(RuntimeError):
+    """拉取已完成，但移入时目标文件夹中出现了同名对象，文件未能移入（临时副本已删除）；调用方可回退到本地上传覆盖。"""
+
+
+def _is_conflict(e: Exception) -> bool:
+    if not isinstance(e, cloudreve.CloudreveError):
+        return False
+    codes = {e.code} | {(item or {}).get("code") for item in e.aggregated.values()}
+    return bool(codes & _CONFLICT_CODES)
+
+
+def _find_task(tokens: pipeline.TokenState, task_id: str) -> dict | None:
+    """在进行中与已结束的离线下载任务中按 ID 查找。"""
+    for category in ("downloading", "downloaded"):
+        page_token = ""
+        for _ in range(_MAX_PAGES):
+            page = tokens.call(cloudreve.list_tasks, category, page_size=100, next_page_token=page_token)
+            for task in page.get("tasks") or []:
+                if task.get("id") == task_id:
+                    return task
+            page_token = (page.get("pagination") or {}).get("next_token") or ""
+            if not page_token:
+                break
+    return None
+
+
+def _downloaded_name(task: dict) -> str:
+    """任务完成后文件在目标文件夹中的名字（离线下载按 URL 或响应头决定文件名）。"""
+    download = ((task.get("summary") or {}).get("props") or {}).get("download") or {}
+    files = [f for f in download.get("files") or [] if f.get("selected", True)]
+    if len(files) == 1 and files[0].get("name"):
+        return files[0]["name"].rsplit("/", 1)[-1]
+    return download.get("name") or ""
+
+
+def _cancel(tokens: pipeline.TokenState, task_id: str) -> None:
+    try:
+        tokens.call(cloudreve.cancel_remote_download, task_id)
+    except Exception as e:
+        logger.warning("取消离线下载任务 %s 失败 - %s", task_id, e)
+
+
+def _remove_temp(tokens: pipeline.TokenState, temp: str) -> None:
+    try:
+        tokens.call(cloudreve.delete_files, [temp], skip_soft_delete=True)
+    except Exception as e:
+        logger.warning("删除离线下载临时文件夹 %s 失败 - %s", temp, e)
+
+
+def fetch(
+    tokens: pipeline.TokenState,
+    url: str,
+    target_uri: str,
+    policy_id: str,
+    *,
+    size: int | None = None,
+) -> dict:
+    """
+    让 Cloudreve 下载 url 并保存为 target_uri，返回 {size, task_id}。
+    size 为已知的文件大小（用于策略上限检查）。target_uri 已是文件时覆盖，是文件夹时抛 ValueError（不创建任务）。
+    """
+    folder, _, name = target_uri.rpartition("/")
+    pipeline.check_policy(tokens, policy_id, size)
+    existing = listing.stat(tokens, [target_uri])[0].get(target_uri)
+    if existing is not None and existing["type"] == "folder":
+        raise ValueError(f"{target_uri} 是已存在的文件夹")
+    pipeline.ensure_folder(tokens, folder)
+    temp = f"{folder}/{_TEMP_PREFIX}{uuid.uuid4().hex}"
+    try:
+        tokens.call(cloudreve.create_file, temp, "folder")
+    except (RuntimeError, httpx.HTTPStatusError) as e:
+        raise Unavailable(f"创建离线下载临时文件夹失败：{e}") from e
+    task_id = ""
+    finished = False
+    try:
+        try:
+            tasks = tokens.call(cloudreve.create_remote_download, [url], temp)
+        except (RuntimeError, httpx.HTTPStatusError) as e:
+            raise Unavailable(f"创建离线下载任务失败：{e}") from e
+        if not tasks or not tasks[0].get("id"):
+            raise Unavailable("创建离线下载任务失败：未返回任务 ID")
+        task_id = tasks[0]["id"]
+
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            task = _find_task(tokens, task_id)
+            status = (task or {}).get("status") or ""
+            if status == _DONE:
+                break
+            if status in _FAILED:
+                finished = True
+                raise Unavailable(f"离线下载任务{status}：{(task or {}).get('error') or '未知错误'}")
+            if time.monotonic() >= deadline:
+                raise Unavailable(f"离线下载任务 {TIMEOUT:.0f} 秒内未完成，已取消")
+            time.sleep(POLL_INTERVAL)
+        finished = True
+
+        downloaded = _downloaded_name(task)
+        if not downloaded:
+            raise RuntimeError(f"离线下载任务 {task_id} 已完成，但未返回文件名")
+        info = {}
+        if downloaded != name:
+            info = tokens.call(cloudreve.rename_file, f"{temp}/{downloaded}", name)
+        if existing is not None:
+            # 与本地上传一致地覆盖：旧文件移入回收站后再移入新文件
+            tokens.call(cloudreve.delete_files, [target_uri])
+        try:
+            tokens.call(cloudreve.move_files, [f"{temp}/{name}"], folder)
+        except cloudreve.CloudreveError as e:
+            if _is_conflict(e):
+                raise Conflict(f"目标已存在：{target_uri}") from e
+            raise
+    finally:
+        if task_id and not finished:
+            _cancel(tokens, task_id)
+        _remove_temp(tokens, temp)
+    listing.invalidate(tokens, target_uri)
+    download = ((task.get("summary") or {}).get("props") or {}).get("download") or {}
+    return {"size": int(info.get("size") or download.get("total") or 0), "task_id": task_id}
@@ -1,53 +1,104 @@
 """
 MCP 服务：Cloudreve 登录、上传、直链等工具。
-支持 SSE 传输（平台 SSE 模板：GET /sse 建流，POST /messages?session_id=xxx）。
+支持 SSE 传输（平台 SSE 模板：GET /sse 建流，POST /messages?session_id=xxx），
+以及无状态的 streamable-HTTP 传输（POST /mcp，每个请求独立，不绑定进程，可多 worker / 多节点负载均衡）。
 """
 
-import base64
+import functools
 import json
 import logging
 import os
 import re
-import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+import anyio.to_thread
 from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import Response
 
-from . import bilibili
+# 平台模块 douyin / bilibili / netease（及其依赖的 cryptography 等）在入库工具内首次调用时才导入，缩短冷启动
+from . import buffers
 from . import cloudreve
-from . import douyin
-from . import netease
+from . import listing
+from . import metrics
+from . import pipeline
+from . import profiling
+from . import singleflight
+from . import spool
 
 NAME = "cloudreve-sse-mcp"
 
 _host = os.environ.get("HOST", "0.0.0.0")
 _port = int(os.environ.get("PORT", "3001"))
 
+# MCP_TRANSPORT：sse（默认）或 streamable-http
+TRANSPORT = os.environ.get("MCP_TRANSPORT", "sse").strip().lower()
+
 mcp = FastMCP(
     NAME,
     json_response=True,
+    stateless_http=True,
     host=_host,
     port=_port,
 )
 
 
+def _tool():
+    """
+    注册 MCP 工具，用法同 @mcp.tool()。FastMCP 在事件循环中直接调用同步工具函数，一个调用的网络与磁盘 IO 会阻塞
+    其他所有请求（重复的入库请求也只能排队，single-flight 合并不到）；因此注册的是在 anyio 工作线程中运行原函数的
+    异步包装（参数与说明仍取自原函数），装饰器返回原函数，模块内与基准测试中仍可直接同步调用。
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def run(*args, **kwargs):
+            return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+        mcp.tool()(run)
+        return fn
+
+    return decorator
+
+
+def create_app():
+    """ASGI 应用工厂（多 worker 时由 uvicorn 在每个 worker 中调用）：按 MCP_TRANSPORT 返回 SSE 或 streamable-HTTP 应用。"""
+    if TRANSPORT == "streamable-http":
+        return mcp.streamable_http_app()
+    return mcp.sse_app()
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> Response:
+    """Prometheus 指标（工具/阶段耗时、上下行字节数、上游请求）。"""
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
 # ----- 示例工具 -----
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def echo(message: str) -> str:
     """回显传入的文本"""
     return f"Echo: {message}"
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def get_time() -> str:
     """返回服务器当前时间"""
     return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
 
 # ----- Cloudreve：验证码与登录 -----
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_get_captcha() -> str:
     """获取 Cloudreve 登录验证码。返回 base64 图片和 ticket。仅当站点开启验证码时需要。"""
     data = cloudreve.get_captcha()
@@ -59,7 +110,9 @@ def cloudreve_get_captcha() -> str:
     return json.dumps(out, ensure_ascii=False, indent=2)
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_login(
     email: str,
     password: str,
@@ -80,7 +133,9 @@ def cloudreve_login(
     return json.dumps(out, ensure_ascii=False, indent=2)
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_refresh_token(refresh_token: str) -> str:
     """使用 refresh_token 刷新令牌，返回新的 access_token 与 refresh_token。access_token 过期时可调用本工具或在下述工具中传入 refresh_token 以自动刷新。"""
     data = cloudreve.refresh_token_api(refresh_token)
@@ -93,7 +148,9 @@ def cloudreve_refresh_token(refresh_token: str) -> str:
     return json.dumps(out, ensure_ascii=False, indent=2)
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_list_storage_policies(access_token: str, refresh_token: str = "") -> str:
     """获取当前用户可用的存储策略列表（id、name、type、max_size 等）。上传文件时 policy_id 填此处返回的 id。须先 cloudreve_login。可传 refresh_token 以在 token 过期时自动刷新。"""
     policies, refreshed = cloudreve.list_storage_policies(
@@ -111,7 +168,9 @@ def cloudreve_list_storage_policies(access_token: str, refresh_token: str = "")
     return result
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_create_folder(
     access_token: str,
     folder_uri: str,
@@ -130,6 +189,7 @@ def cloudreve_create_folder(
             refresh_token=refresh_token or None,
             err_on_conflict=err_on_conflict,
         )
+        listing.invalidate(pipeline.TokenState(access_token), folder)
         out = {
             "path": file_data.get("path"),
             "id": file_data.get("id"),
@@ -154,7 +214,9 @@ def cloudreve_create_folder(
 
 
 # ----- Cloudreve：上传会话与分块 -----
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_create_upload_session(
     access_token: str,
     uri: str,
@@ -170,6 +232,7 @@ def cloudreve_create_upload_session(
         refresh_token=refresh_token or None,
         last_modified=last_modified, mime_type=mime_type,
     )
+    listing.invalidate(pipeline.TokenState(access_token), uri)
     out = {
         "session_id": session_data["session_id"],
         "chunk_size": session_data["chunk_size"],
@@ -186,7 +249,9 @@ def cloudreve_create_upload_session(
     return json.dumps(out, ensure_ascii=False, indent=2)
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_upload_file_chunk(
     access_token: str,
     session_id: str,
@@ -195,11 +260,17 @@ def cloudreve_upload_file_chunk(
     refresh_token: str = "",
 ) -> str:
     """向已创建的上传会话上传一个分块。分块从 index=0 开始按顺序上传；chunk_base64 为该分块的 Base64。可传 refresh_token，token 过期时自动刷新后重试。"""
-    chunk = base64.b64decode(chunk_base64)
-    _, refreshed = cloudreve.upload_file_chunk(
-        access_token, session_id, index, chunk,
-        refresh_token=refresh_token or None,
-    )
+    encoded = buffers.normalize_base64(chunk_base64)
+    # 解码进缓冲池中的缓冲区，不另外生成整块 bytes
+    with buffers.acquire(buffers.base64_size(encoded)) as buf:
+        offset = 0
+        for data in buffers.iter_base64(encoded):
+            buf[offset:offset + len(data)] = data
+            offset += len(data)
+        _, refreshed = cloudreve.upload_file_chunk(
+            access_token, session_id, index, buf,
+            refresh_token=refresh_token or None,
+        )
     if refreshed:
         return json.dumps({
             "message": f"分块 {index} 上传成功",
@@ -213,7 +284,9 @@ def cloudreve_upload_file_chunk(
     return f"分块 {index} 上传成功"
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_upload_file(
     access_token: str,
     target_uri: str,
@@ -225,66 +298,42 @@ def cloudreve_upload_file(
 ) -> str:
     """将本地文件或 Base64 内容上传到 Cloudreve。须先 cloudreve_login。可传 file_path 或 file_base64；可传 refresh_token，access_token 过期时自动刷新。上传完成后会自动尝试获取直链。"""
     if file_path:
-        with open(file_path, "rb") as f:
-            buffer = f.read()
+        size = os.path.getsize(file_path)
     elif file_base64:
-        buffer = base64.b64decode(file_base64)
+        encoded = buffers.normalize_base64(file_base64)
+        size = buffers.base64_size(encoded)
     else:
         return json.dumps({"error": "必须提供 file_path 或 file_base64 之一"}, ensure_ascii=False)
 
-    size = len(buffer)
-    rft = refresh_token or None
-    refreshed = chunk_refreshed = link_refreshed = None
-    session_data, refreshed = cloudreve.create_upload_session(
-        access_token, target_uri, size, policy_id,
-        refresh_token=rft,
-        mime_type=mime_type or "application/octet-stream",
-    )
-    if refreshed:
-        access_token = refreshed["access_token"]
-        rft = refreshed.get("refresh_token")
-    chunk_size = session_data["chunk_size"] or size
-    if chunk_size <= 0:
-        chunk_size = size
-    session_id = session_data["session_id"]
-    index = 0
-    for offset in range(0, size, chunk_size):
-        end = min(offset + chunk_size, size)
-        _, chunk_refreshed = cloudreve.upload_file_chunk(
-            access_token, session_id, index, buffer[offset:end],
-            refresh_token=rft,
-        )
-        if chunk_refreshed:
-            access_token = chunk_refreshed["access_token"]
-            rft = chunk_refreshed.get("refresh_token")
-        index += 1
+    # 本地文件 readinto、Base64 增量解码，都经缓冲池分块上传，不把整个文件读入内存
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    mime = mime_type or "application/octet-stream"
+    if file_path:
+        uploaded = pipeline.upload_path(tokens, target_uri, file_path, policy_id, mime_type=mime)
+    else:
+        uploaded = pipeline.upload_stream(tokens, target_uri, buffers.iter_base64(encoded), size, policy_id, mime_type=mime)
+    index = uploaded["chunks"]
+    metrics.add_bytes("local", "upload", size)
 
     direct_link_text = ""
-    link_refreshed = None
     try:
-        links, link_refreshed = cloudreve.create_direct_links(access_token, [target_uri], refresh_token=rft)
-        if link_refreshed:
-            access_token = link_refreshed["access_token"]
-            rft = link_refreshed.get("refresh_token")
+        links = tokens.call(cloudreve.create_direct_links, [target_uri])
         if links and links[0].get("link"):
             direct_link_text = f"，直链：{links[0]['link']}"
     except Exception as e:
         direct_link_text = f"（获取直链失败：{e}）"
 
     result = f"上传完成：{target_uri}，共 {index} 个分块，总大小 {size} 字节{direct_link_text}"
-    if refreshed or chunk_refreshed or link_refreshed:
-        final_refreshed = refreshed or chunk_refreshed or link_refreshed
-        if final_refreshed:
-            result += "\n\n刷新后的令牌（后续请求请使用）：\n" + json.dumps({
-                "access_token": final_refreshed["access_token"],
-                "refresh_token": final_refreshed["refresh_token"],
-                "access_expires": final_refreshed.get("access_expires"),
-                "refresh_expires": final_refreshed.get("refresh_expires"),
-            }, ensure_ascii=False, indent=2)
+    if tokens.refreshed_tokens():
+        result += "\n\n刷新后的令牌（后续请求请使用）：\n" + json.dumps(
+            tokens.refreshed_tokens(), ensure_ascii=False, indent=2,
+        )
     return result
 
 
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_create_direct_links(access_token: str, uris: list[str], refresh_token: str = "") -> str:
     """为指定文件创建直链，返回可直接访问的 URL 列表。须先登录。可传 refresh_token，access_token 过期时自动刷新。"""
     links, refreshed = cloudreve.create_direct_links(
@@ -302,8 +351,493 @@ def cloudreve_create_direct_links(access_token: str, uris: list[str], refresh_to
     return result
 
 
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_download_file(
+    access_token: str,
+    uri: str,
+    local_path: str,
+    refresh_token: str = "",
+    checksum: str = "",
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """将网盘文件下载到本地。须先 cloudreve_login。uri 为文件 URI（如 cloudreve://my/douyin/1.mp4）；local_path 为本地文件路径，须位于下载目录（环境变量 MCP_DOWNLOAD_DIR，默认 ~/Downloads）内，相对路径相对该目录，以 / 结尾或为已存在的目录时按网盘文件名保存到该目录；开始前预留所需磁盘空间，不足且排队超时返回 status=busy。通过 Cloudreve 文件下载地址接口（失败时改用直链）获取地址后按字节区间并发下载到预分配的本地文件（concurrency 不传用环境变量 MCP_DOWNLOAD_CONCURRENCY，默认 8）；中断后再次调用同一 uri 与 local_path 时只补缺失的区间。checksum 可传 sha256:<hex> / md5:<hex>，下载完成后校验，不一致时删除并报错。可传 refresh_token 以在 token 过期时自动刷新。timings 为 True 时返回中附带各阶段耗时与吞吐。"""
+    try:
+        with metrics.timed("cloudreve_download_file", "cloudreve"):
+            return _cloudreve_download_file_impl(
+                access_token=access_token,
+                uri=uri,
+                local_path=local_path,
+                refresh_token=refresh_token,
+                checksum=checksum,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except spool.SpoolBusy as e:
+        return json.dumps(spool.busy_response(e), ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_download_file_impl(
+    access_token: str,
+    uri: str,
+    local_path: str,
+    refresh_token: str,
+    checksum: str,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import downloader
+    uri = uri.strip()
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    with metrics.stage("cloudreve", "info"):
+        info = tokens.call(cloudreve.get_file_info, uri)
+    if info.get("type") == 1:
+        raise ValueError(f"{uri} 是文件夹，请指定文件")
+    name = info.get("name") or uri.rsplit("/", 1)[-1]
+    path = downloader.resolve_path(local_path, name)
+    url_source = "file_url"
+
+    def get_url() -> str:
+        # 优先用临时下载地址（不要求直链权限）；接口不可用时改用直链
+        nonlocal url_source
+        try:
+            urls = tokens.call(cloudreve.get_file_urls, [uri])
+            if urls and urls[0]:
+                return urls[0]
+        except RuntimeError as e:
+            logger.warning("获取下载地址失败，改用直链 - %s", e)
+        url_source = "direct_link"
+        links = tokens.call(cloudreve.create_direct_links, [uri])
+        if not links or not links[0].get("link"):
+            raise RuntimeError(f"无法获取 {uri} 的下载地址")
+        return links[0]["link"]
+
+    with metrics.stage("cloudreve", "download") as st:
+        result = downloader.download(
+            get_url, path, source_key=uri, size=info.get("size"), checksum=checksum, concurrency=concurrency or None,
+        )
+        st.bytes, st.chunks = result["downloaded_bytes"], result["parts"]
+
+    out = {
+        "status": "success",
+        "uri": uri,
+        "local_path": os.path.abspath(path),
+        "size_bytes": result["size"],
+        "parts": result["parts"],
+        "downloaded_bytes": result["downloaded_bytes"],
+        "resumed_bytes": result["resumed_bytes"],
+        "ranged": result["ranged"],
+        "url_source": url_source,
+    }
+    if result["checksum"]:
+        out["checksum"] = result["checksum"]
+    if result["url_refreshes"]:
+        out["url_refreshes"] = result["url_refreshes"]
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+# ----- Cloudreve：文件夹列表与存在性检查（带本地元数据缓存） -----
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_list_files(
+    access_token: str,
+    folder_uri: str,
+    refresh_token: str = "",
+    limit: int = 1000,
+    refresh: bool = False,
+    timings: bool = False,
+) -> str:
+    """列出网盘文件夹内容（名称、URI、类型、大小、修改时间，文件夹在前按名称排序）。须先 cloudreve_login。folder_uri 如 cloudreve://my/douyin。按游标分页读取，结果在本地缓存：CLOUDREVE_LIST_CACHE_TTL（默认 30 秒）内再次列出同一文件夹不发请求，之后只请求一页做重验证；refresh 为 True 时强制重新拉取。limit 为最多返回的条目数（0 不限）；缓存不可用且文件夹超过 limit 项时只拉取最近修改的 limit 项，truncated 为 True。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_list_files", "cloudreve"):
+            return _cloudreve_list_files_impl(
+                access_token=access_token,
+                folder_uri=folder_uri,
+                refresh_token=refresh_token,
+                limit=limit,
+                refresh=refresh,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_list_files_impl(
+    access_token: str,
+    folder_uri: str,
+    refresh_token: str,
+    limit: int = 1000,
+    refresh: bool = False,
+    timings: bool = False,
+) -> str:
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    folder = pipeline.normalize_folder_uri(folder_uri)
+    with metrics.stage("cloudreve", "list") as st:
+        listed = listing.list_folder(tokens, folder, refresh=refresh, limit=max(0, limit))
+        st.chunks = listed["pages"]
+    files = sorted(listed["files"], key=lambda f: (f["type"] != "folder", f["name"]))
+    truncated = not listed["complete"] or (limit > 0 and len(files) > limit)
+    out = {
+        "status": "success",
+        "folder_uri": folder,
+        "count": min(len(files), limit) if limit > 0 else len(files),
+        "truncated": truncated,
+        "source": listed["source"],
+        "files": files[:limit] if limit > 0 else files,
+    }
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_file_exists(
+    access_token: str,
+    uris: list[str],
+    refresh_token: str = "",
+    timings: bool = False,
+) -> str:
+    """批量检查网盘文件或文件夹是否存在（如入库前确认 cloudreve://my/douyin/<视频ID>.mp4 是否已上传），返回每个 URI 的 exists 及大小、修改时间。须先 cloudreve_login。优先从已缓存的文件夹列表回答，不发请求；同一文件夹下查询较多时列出一次该文件夹，其余逐个查询，结果（含不存在）缓存 CLOUDREVE_LIST_CACHE_TTL 秒。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_file_exists", "cloudreve"):
+            return _cloudreve_file_exists_impl(
+                access_token=access_token,
+                uris=uris,
+                refresh_token=refresh_token,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_file_exists_impl(
+    access_token: str,
+    uris: list[str],
+    refresh_token: str,
+    timings: bool = False,
+) -> str:
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    with metrics.stage("cloudreve", "stat") as st:
+        found, requests = listing.stat(tokens, [pipeline.normalize_folder_uri(u) for u in uris])
+        st.chunks = requests
+    results = {}
+    for uri, item in found.items():
+        results[uri] = {"exists": False} if item is None else {
+            "exists": True, "type": item["type"], "size": item["size"], "updated_at": item["updated_at"],
+        }
+    out = {
+        "status": "success",
+        "existing": sum(1 for item in found.values() if item is not None),
+        "requests": requests,
+        "results": results,
+    }
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+# ----- Cloudreve：批量移动 / 复制 / 删除 / 重命名 -----
+# 同步与批量操作结果中逐条列出的条目上限（其余只计数）
+_RESULT_LIST_LIMIT = 200
+
+
+def _bulk_output(result: dict, tokens: pipeline.TokenState, timings: bool, **fields) -> str:
+    failed = result["failed"]
+    out: dict = {
+        "status": "success" if not failed else ("partial" if result["done"] else "error"),
+        **fields,
+        "done_count": len(result["done"]),
+        "failed_count": len(failed),
+        "requests": result["requests"],
+        "done": result["done"][:_RESULT_LIST_LIMIT],
+        "failed": failed[:_RESULT_LIST_LIMIT],
+    }
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_move_files(
+    access_token: str,
+    uris: list[str],
+    dst_folder_uri: str,
+    refresh_token: str = "",
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """批量移动网盘文件/文件夹到 dst_folder_uri。须先 cloudreve_login。uris 可包含成千上万个 URI：按父文件夹分组，每批 CLOUDREVE_BULK_BATCH_SIZE 个（默认 100）一次请求，最多 concurrency 个请求并行（默认环境变量 CLOUDREVE_BULK_CONCURRENCY 即 4）。部分失败时 status 为 partial，failed 中逐个列出（超过 200 条时只计数）。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_move_files", "cloudreve"):
+            return _cloudreve_move_files_impl(
+                access_token=access_token,
+                uris=uris,
+                dst_folder_uri=dst_folder_uri,
+                refresh_token=refresh_token,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_copy_files(
+    access_token: str,
+    uris: list[str],
+    dst_folder_uri: str,
+    refresh_token: str = "",
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """批量复制网盘文件/文件夹到 dst_folder_uri，分批与并发同 cloudreve_move_files。须先 cloudreve_login。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_copy_files", "cloudreve"):
+            return _cloudreve_move_files_impl(
+                access_token=access_token,
+                uris=uris,
+                dst_folder_uri=dst_folder_uri,
+                refresh_token=refresh_token,
+                copy=True,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_move_files_impl(
+    access_token: str,
+    uris: list[str],
+    dst_folder_uri: str,
+    refresh_token: str,
+    copy: bool = False,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import bulk
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    with metrics.stage("cloudreve", "copy" if copy else "move") as st:
+        result = bulk.move(tokens, uris, dst_folder_uri, copy=copy, concurrency=concurrency or None)
+        st.chunks = result["requests"]
+    return _bulk_output(result, tokens, timings, dst_folder_uri=pipeline.normalize_folder_uri(dst_folder_uri), copy=copy)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_delete_files(
+    access_token: str,
+    uris: list[str],
+    refresh_token: str = "",
+    permanent: bool = False,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """批量删除网盘文件/文件夹。须先 cloudreve_login。默认移入回收站，permanent 为 True 时直接永久删除（不可恢复）。分批与并发同 cloudreve_move_files；部分失败时 status 为 partial。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_delete_files", "cloudreve"):
+            return _cloudreve_delete_files_impl(
+                access_token=access_token,
+                uris=uris,
+                refresh_token=refresh_token,
+                permanent=permanent,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_delete_files_impl(
+    access_token: str,
+    uris: list[str],
+    refresh_token: str,
+    permanent: bool = False,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import bulk
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    with metrics.stage("cloudreve", "delete") as st:
+        result = bulk.delete(tokens, uris, skip_soft_delete=permanent, concurrency=concurrency or None)
+        st.chunks = result["requests"]
+    return _bulk_output(result, tokens, timings, permanent=permanent)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_rename_files(
+    access_token: str,
+    renames: dict[str, str],
+    refresh_token: str = "",
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """批量重命名网盘文件/文件夹。须先 cloudreve_login。renames 为 {原 URI: 新名称}（只是名称，不含路径；要换文件夹请用 cloudreve_move_files）。重命名接口一次只能改一个对象，最多 concurrency 个请求并行（默认环境变量 CLOUDREVE_BULK_CONCURRENCY 即 4）；部分失败时 status 为 partial。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_rename_files", "cloudreve"):
+            return _cloudreve_rename_files_impl(
+                access_token=access_token,
+                renames=renames,
+                refresh_token=refresh_token,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_rename_files_impl(
+    access_token: str,
+    renames: dict[str, str],
+    refresh_token: str,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import bulk
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    with metrics.stage("cloudreve", "rename") as st:
+        result = bulk.rename(tokens, renames, concurrency=concurrency or None)
+        st.chunks = result["requests"]
+    return _bulk_output(result, tokens, timings)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_sync_directory(
+    access_token: str,
+    local_dir: str,
+    remote_folder_uri: str,
+    policy_id: str,
+    refresh_token: str = "",
+    manifest_path: str = "",
+    hash_files: bool = False,
+    exclude: list[str] | None = None,
+    direct_links: bool = False,
+    dry_run: bool = False,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    """将本地目录增量同步到网盘文件夹。须先 cloudreve_login。遍历 local_dir，与本地清单（默认存于 MCP_SYNC_MANIFEST_DIR，可用 manifest_path 指定）比对大小与修改时间，只上传新增或变化的文件（并发数 concurrency，默认环境变量 MCP_SYNC_CONCURRENCY 即 4），目录结构保持不变；未变化的文件不发任何请求。hash_files 为 True 时记录 sha256，修改时间变化但内容相同的文件不重传。exclude 为要跳过的 glob 模式（如 *.tmp、.git）。direct_links 为 True 时为本次上传的文件批量获取直链。dry_run 为 True 时只返回将要上传的文件。本地删除的文件只从清单移除，不删除网盘文件。可传 refresh_token 以在 token 过期时自动刷新。"""
+    try:
+        with metrics.timed("cloudreve_sync_directory", "local"):
+            return _cloudreve_sync_directory_impl(
+                access_token=access_token,
+                local_dir=local_dir,
+                remote_folder_uri=remote_folder_uri,
+                policy_id=policy_id,
+                refresh_token=refresh_token,
+                manifest_path=manifest_path,
+                hash_files=hash_files,
+                exclude=exclude,
+                direct_links=direct_links,
+                dry_run=dry_run,
+                concurrency=concurrency,
+                timings=timings,
+            )
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_sync_directory_impl(
+    access_token: str,
+    local_dir: str,
+    remote_folder_uri: str,
+    policy_id: str,
+    refresh_token: str,
+    manifest_path: str,
+    hash_files: bool,
+    exclude: list[str] | None,
+    direct_links: bool,
+    dry_run: bool,
+    concurrency: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import sync
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    result = sync.sync_directory(
+        tokens, local_dir, remote_folder_uri, policy_id,
+        manifest_path=manifest_path, hash_files=hash_files, exclude=exclude,
+        direct_links=direct_links, dry_run=dry_run, concurrency=concurrency or None,
+    )
+    failed = result.get("failed")
+    out: dict = {"status": "success" if not failed else ("partial" if result.get("uploaded") else "error"), "dry_run": dry_run}
+    for key, value in result.items():
+        if isinstance(value, list):
+            out[f"{key}_count"] = len(value)
+            out[key] = value[:_RESULT_LIST_LIMIT]
+        else:
+            out[key] = value
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+def _attach_timings(out: dict, tokens: pipeline.TokenState, timings: bool) -> None:
+    """把令牌刷新次数记入本次调用的 StageTimer；timings 为 True 时把阶段明细附到输出的 timings 字段。"""
+    timer = metrics.current_timer()
+    timer.token_refreshes = tokens.refresh_count
+    if timings:
+        out["timings"] = timer.summary()
+
+
 # ----- 抖音：解析 → 下载 → 上传网盘 → 直链 -----
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_upload_douyin_video(
     access_token: str,
     douyin_share_link: str,
@@ -311,17 +845,24 @@ def cloudreve_upload_douyin_video(
     refresh_token: str = "",
     folder_uri: str = "",
     target_uri: str | None = None,
+    server_fetch: bool = False,
+    timings: bool = False,
 ) -> str:
-    """MCP 流程：登入网盘 → 解析抖音链接 → 下载视频 → 上传到网盘。本工具完成后三步：解析抖音分享链接、将无水印视频下载到临时文件、在网盘创建/确认文件夹后分块上传并返回直链，上传完毕后删除临时文件。须先调用 cloudreve_login 获得 access_token；policy_id 可用 cloudreve_list_storage_policies 查询。可传 refresh_token 以在 token 过期时自动刷新。folder_uri 不传则默认上传到 cloudreve://my/douyin/{视频ID}.mp4；可传 folder_uri（如 cloudreve://my/douyin 或 cloudreve://douyin）指定目录。target_uri 可覆盖最终文件 URI。"""
+    """MCP 流程：登入网盘 → 解析抖音链接 → 下载视频 → 上传到网盘。本工具完成后三步：解析抖音分享链接、将无水印视频下载到临时文件、在网盘创建/确认文件夹后分块上传并返回直链，上传完毕后删除临时文件。须先调用 cloudreve_login 获得 access_token；policy_id 可用 cloudreve_list_storage_policies 查询。可传 refresh_token 以在 token 过期时自动刷新。folder_uri 不传则默认上传到 cloudreve://my/douyin/{视频ID}.mp4；可传 folder_uri（如 cloudreve://my/douyin 或 cloudreve://douyin）指定目录。target_uri 可覆盖最终文件 URI。server_fetch 为 True 时把无水印直链交给 Cloudreve 离线下载（需用户组开启离线下载），视频不经过本机；不可用或任务失败时自动回退本地下载上传，返回中 fetched_by 为 cloudreve 或 local，回退时附 server_fetch_error。timings 为 True 时返回中附带 timings：各阶段（parse/download/mux/upload/link 等）耗时、字节数、吞吐、分块数，以及重试与令牌刷新次数；同样内容每次调用都会写一行结构化日志。"""
     try:
-        return _cloudreve_upload_douyin_video_impl(
-            access_token=access_token,
-            douyin_share_link=douyin_share_link,
-            policy_id=policy_id,
-            refresh_token=refresh_token,
-            folder_uri=folder_uri,
-            target_uri=target_uri,
-        )
+        with metrics.timed("cloudreve_upload_douyin_video", "douyin"):
+            return _cloudreve_upload_douyin_video_impl(
+                access_token=access_token,
+                douyin_share_link=douyin_share_link,
+                policy_id=policy_id,
+                refresh_token=refresh_token,
+                folder_uri=folder_uri,
+                target_uri=target_uri,
+                server_fetch=server_fetch,
+                timings=timings,
+            )
+    except spool.SpoolBusy as e:
+        return json.dumps(spool.busy_response(e), ensure_ascii=False, indent=2)
     except Exception as e:
         return json.dumps({
             "status": "error",
@@ -330,6 +871,38 @@ def cloudreve_upload_douyin_video(
         }, ensure_ascii=False, indent=2)
 
 
+def _server_fetch(
+    platform: str,
+    tokens: pipeline.TokenState,
+    url: str,
+    uri: str,
+    policy_id: str,
+    size: int | None = None,
+) -> tuple[dict | None, str | None]:
+    """尝试由 Cloudreve 离线下载 url 到 uri。成功返回 ({size, task_id}, None)；不可用时返回 (None, 回退原因)，调用方改走本地下载上传。"""
+    from . import remote_fetch
+    try:
+        with metrics.stage(platform, "fetch") as st:
+            fetched = remote_fetch.fetch(tokens, url, uri, policy_id, size=size)
+            st.bytes = fetched["size"]
+        metrics.add_bytes(platform, "server_fetch", fetched["size"])
+        return fetched, None
+    except (remote_fetch.Unavailable, remote_fetch.Conflict) as e:
+        # Conflict：移入时目标被其他客户端写入，本地上传会覆盖它
+        logger.warning("%s：服务端拉取不可用，回退本地下载上传 - %s", platform, e)
+        return None, str(e)
+
+
+def _fetch_fields(fetched: dict | None, fallback_reason: str | None) -> dict:
+    """服务端拉取相关的输出字段；未请求服务端拉取时为空。"""
+    if fetched is None and fallback_reason is None:
+        return {}
+    out = {"fetched_by": "cloudreve" if fetched is not None else "local"}
+    if fallback_reason is not None:
+        out["server_fetch_error"] = fallback_reason
+    return out
+
+
 def _cloudreve_upload_douyin_video_impl(
     access_token: str,
     douyin_share_link: str,
@@ -337,111 +910,97 @@ def _cloudreve_upload_douyin_video_impl(
     refresh_token: str,
     folder_uri: str,
     target_uri: str | None,
+    server_fetch: bool = False,
+    timings: bool = False,
 ) -> str:
-    info = douyin.parse_douyin_share_url(douyin_share_link)
+    from . import douyin
+    with metrics.stage("douyin", "parse"):
+        info = douyin.parse_douyin_share_url(douyin_share_link)
     video_url = info["url"]
     title = info["title"]
     video_id = info["video_id"]
 
-    tmp_path = None
-    try:
-        tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        tmp_path = tmp.name
-        tmp.close()
-        douyin.download_douyin_video_to_path(video_url, tmp_path)
-        size = os.path.getsize(tmp_path)
-
-        rft = refresh_token or None
-        if (target_uri or "").strip():
-            uri = (target_uri or "").strip()
-        elif (folder_uri or "").strip():
-            folder = folder_uri.strip().rstrip("/")
-            if folder.startswith("cloudreve://") and "/" not in folder[len("cloudreve://"):]:
-                folder = f"cloudreve://my/{folder[len('cloudreve://'):]}"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
-            )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{video_id}.mp4"
-        else:
-            folder = "cloudreve://my/douyin"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
-            )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{video_id}.mp4"
-        refreshed = chunk_refreshed = link_refreshed = None
-        session_data, refreshed = cloudreve.create_upload_session(
-            access_token, uri, size, policy_id,
-            refresh_token=rft,
-            mime_type="video/mp4",
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    folder = None
+    if (target_uri or "").strip():
+        uri = (target_uri or "").strip()
+    else:
+        folder = pipeline.normalize_folder_uri(folder_uri or "cloudreve://my/douyin")
+        uri = f"{folder}/{video_id}.mp4"
+
+    def transfer() -> dict:
+        fetched, fallback_reason = (
+            _server_fetch("douyin", tokens, video_url, uri, policy_id) if server_fetch else (None, None)
         )
-        if refreshed:
-            access_token = refreshed["access_token"]
-            rft = refreshed.get("refresh_token")
-        chunk_size = session_data["chunk_size"] or size
-        if chunk_size <= 0:
-            chunk_size = size
-        session_id = session_data["session_id"]
-        index = 0
-        with open(tmp_path, "rb") as f:
-            for offset in range(0, size, chunk_size):
-                chunk = f.read(chunk_size)
-                _, chunk_refreshed = cloudreve.upload_file_chunk(
-                    access_token, session_id, index, chunk,
-                    refresh_token=rft,
-                )
-                if chunk_refreshed:
-                    access_token = chunk_refreshed["access_token"]
-                    rft = chunk_refreshed.get("refresh_token")
-                index += 1
+        if fetched is not None:
+            return {"size": fetched["size"], **_fetch_fields(fetched, fallback_reason)}
+        uploaded = _ingest_douyin_local(tokens, video_url, uri, policy_id, folder)
+        return {"size": uploaded["size"], **_fetch_fields(fetched, fallback_reason)}
 
-        link_refreshed = None
-        direct_link = ""
-        try:
-            links, link_refreshed = cloudreve.create_direct_links(access_token, [uri], refresh_token=rft)
-            if link_refreshed:
-                access_token = link_refreshed["access_token"]
-                rft = link_refreshed.get("refresh_token")
-            if links and links[0].get("link"):
-                direct_link = links[0]["link"]
-        except Exception as e:
-            direct_link = f"（获取直链失败：{e}）"
+    # 同一视频同时入库到同一 URI 时只传一次，其余调用等待并共享结果
+    transferred, coalesced = singleflight.run("douyin", video_id, uri, tokens, policy_id, transfer)
+    with metrics.stage("douyin", "link"):
+        direct_link = pipeline.direct_links(tokens, [uri])[uri]
 
-        out = {
-            "status": "success",
-            "video_id": video_id,
-            "title": title,
-            "target_uri": uri,
-            "size_bytes": size,
-            "direct_link": direct_link,
-        }
-        if refreshed or chunk_refreshed or link_refreshed:
-            final_refreshed = refreshed or chunk_refreshed or link_refreshed
-            if final_refreshed:
-                out["refreshed_tokens"] = {
-                    "access_token": final_refreshed["access_token"],
-                    "refresh_token": final_refreshed["refresh_token"],
-                    "access_expires": final_refreshed.get("access_expires"),
-                    "refresh_expires": final_refreshed.get("refresh_expires"),
-                }
-        return json.dumps(out, ensure_ascii=False, indent=2)
-    finally:
-        if tmp_path is not None:
-            try:
-                os.unlink(tmp_path)
-            except FileNotFoundError:
-                pass
+    out = {
+        "status": "success",
+        "video_id": video_id,
+        "title": title,
+        "target_uri": uri,
+        "size_bytes": transferred["size"],
+        "direct_link": direct_link,
+        **{k: v for k, v in transferred.items() if k != "size"},
+    }
+    if coalesced:
+        out["coalesced"] = True
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+def _ingest_douyin_local(
+    tokens: pipeline.TokenState,
+    video_url: str,
+    uri: str,
+    policy_id: str,
+    folder: str | None,
+) -> dict:
+    """下载到暂存目录后分块上传到 uri，返回 {size, chunks}。"""
+    from . import douyin
+    # 建目录、查策略在后台与下载并行；拿到 Content-Length 后即创建上传会话
+    prepared = pipeline.PreparedUpload(tokens, uri, policy_id, mime_type="video/mp4", folder=folder)
+
+    def on_size(size: int) -> None:
+        # 拿到 Content-Length 后把默认预留改为实际大小（不足时排队或 busy），再提前创建上传会话
+        res.resize(size)
+        prepared.on_size(size)
+
+    try:
+        with spool.reserve() as res:
+            tmp_path = res.temp_file(".mp4")
+            with metrics.stage("douyin", "download") as st:
+                st.bytes = downloaded = douyin.download_douyin_video_to_path(video_url, tmp_path, on_size=on_size)
+            metrics.add_bytes("douyin", "download", downloaded)
+            with metrics.stage("douyin", "upload") as st:
+                uploaded = prepared.upload_path(tmp_path)
+                st.bytes, st.chunks = uploaded["size"], uploaded["chunks"]
+        metrics.add_bytes("douyin", "upload", uploaded["size"])
+        return uploaded
+    except BaseException:
+        prepared.abort()
+        raise
 
 
 # ----- 哔哩哔哩：解析 → 下载 → 上传网盘 → 直链 -----
-@mcp.tool()
+# 多 P 下载上传的全局并发上限（所有调用共享）
+_BILIBILI_PAGE_CONCURRENCY = max(1, int(os.environ.get("BILIBILI_PAGE_CONCURRENCY", "3")))
+_bilibili_page_slots = threading.BoundedSemaphore(_BILIBILI_PAGE_CONCURRENCY)
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_upload_bilibili_video(
     access_token: str,
     bilibili_share_link: str,
@@ -450,18 +1009,36 @@ def cloudreve_upload_bilibili_video(
     folder_uri: str = "",
     target_uri: str | None = None,
     cookie: str = "",
+    pages: str = "",
+    timings: bool = False,
 ) -> str:
-    """MCP 流程：登入网盘 → 解析哔哩哔哩链接 → 下载视频（DASH/durl）→ 上传到网盘。本工具完成后三步；须先 cloudreve_login。未登录时画质通常只有 360p/480p，建议传 B 站 cookie 以获取 1080p 等更高画质；cookie 也会用于获取播放地址和下载音视频片段。DASH 流会合并音视频，多段 durl 会合并后上传，需本机安装 ffmpeg。folder_uri 不传则默认 cloudreve://my/bilibili/{bvid}.mp4。"""
+    """MCP 流程：登入网盘 → 解析哔哩哔哩链接 → 下载视频（DASH/durl）→ 上传到网盘。本工具完成后三步；须先 cloudreve_login。未登录时画质通常只有 360p/480p，建议传 B 站 cookie 以获取 1080p 等更高画质；cookie 也会用于获取播放地址和下载音视频片段。DASH 流会合并音视频，多段 durl 会合并后上传，需本机安装 ffmpeg。folder_uri 不传则默认 cloudreve://my/bilibili/{bvid}.mp4。pages 用于多 P 视频：传 "all" 下载全部分 P，或如 "1-3,5" 选择分 P；此时各 P 并发下载上传到 {folder_uri 或 cloudreve://my/bilibili}/{bvid}/P01 标题.mp4（target_uri 视为目标文件夹），直链一次批量获取。timings 为 True 时返回中附带 timings：各阶段（parse/download/mux/upload/link 等）耗时、字节数、吞吐、分块数，以及重试与令牌刷新次数；同样内容每次调用都会写一行结构化日志。"""
     try:
-        return _cloudreve_upload_bilibili_video_impl(
-            access_token=access_token,
-            bilibili_share_link=bilibili_share_link,
-            policy_id=policy_id,
-            refresh_token=refresh_token,
-            folder_uri=folder_uri,
-            target_uri=target_uri,
-            cookie=cookie,
-        )
+        with metrics.timed("cloudreve_upload_bilibili_video", "bilibili"):
+            if (pages or "").strip():
+                return _cloudreve_upload_bilibili_pages_impl(
+                    access_token=access_token,
+                    bilibili_share_link=bilibili_share_link,
+                    policy_id=policy_id,
+                    refresh_token=refresh_token,
+                    folder_uri=folder_uri,
+                    target_uri=target_uri,
+                    cookie=cookie,
+                    pages=pages,
+                    timings=timings,
+                )
+            return _cloudreve_upload_bilibili_video_impl(
+                access_token=access_token,
+                bilibili_share_link=bilibili_share_link,
+                policy_id=policy_id,
+                refresh_token=refresh_token,
+                folder_uri=folder_uri,
+                target_uri=target_uri,
+                cookie=cookie,
+                timings=timings,
+            )
+    except spool.SpoolBusy as e:
+        return json.dumps(spool.busy_response(e), ensure_ascii=False, indent=2)
     except Exception as e:
         return json.dumps({
             "status": "error",
@@ -478,111 +1055,159 @@ def _cloudreve_upload_bilibili_video_impl(
     folder_uri: str,
     target_uri: str | None,
     cookie: str,
+    timings: bool = False,
 ) -> str:
-    parsed = bilibili.parse_bilibili_share_url(bilibili_share_link)
-    bvid = parsed["bvid"]
-    info = bilibili.get_video_info(bvid, cookie=cookie or "")
+    from . import bilibili
+    with metrics.stage("bilibili", "parse"):
+        parsed = bilibili.parse_bilibili_share_url(bilibili_share_link)
+        bvid = parsed["bvid"]
+        info = bilibili.get_video_info(bvid, cookie=cookie or "")
     title = info.get("title", "")
 
-    tmp_path = None
-    try:
-        tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        tmp_path = tmp.name
-        tmp.close()
-        bilibili.download_bilibili_video_to_path(bvid, tmp_path, cookie=cookie or "")
-        size = os.path.getsize(tmp_path)
-
-        rft = refresh_token or None
-        if (target_uri or "").strip():
-            uri = (target_uri or "").strip()
-        elif (folder_uri or "").strip():
-            folder = folder_uri.strip().rstrip("/")
-            if folder.startswith("cloudreve://") and "/" not in folder[len("cloudreve://"):]:
-                folder = f"cloudreve://my/{folder[len('cloudreve://'):]}"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
-            )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{bvid}.mp4"
-        else:
-            folder = "cloudreve://my/bilibili"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
-            )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{bvid}.mp4"
-        refreshed = chunk_refreshed = link_refreshed = None
-        session_data, refreshed = cloudreve.create_upload_session(
-            access_token, uri, size, policy_id,
-            refresh_token=rft,
-            mime_type="video/mp4",
-        )
-        if refreshed:
-            access_token = refreshed["access_token"]
-            rft = refreshed.get("refresh_token")
-        chunk_size = session_data["chunk_size"] or size
-        if chunk_size <= 0:
-            chunk_size = size
-        session_id = session_data["session_id"]
-        index = 0
-        with open(tmp_path, "rb") as f:
-            for offset in range(0, size, chunk_size):
-                chunk = f.read(chunk_size)
-                _, chunk_refreshed = cloudreve.upload_file_chunk(
-                    access_token, session_id, index, chunk,
-                    refresh_token=rft,
-                )
-                if chunk_refreshed:
-                    access_token = chunk_refreshed["access_token"]
-                    rft = chunk_refreshed.get("refresh_token")
-                index += 1
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    folder = None
+    if (target_uri or "").strip():
+        uri = (target_uri or "").strip()
+    else:
+        folder = pipeline.normalize_folder_uri(folder_uri or "cloudreve://my/bilibili")
+        uri = f"{folder}/{bvid}.mp4"
 
-        link_refreshed = None
-        direct_link = ""
+    def transfer() -> dict:
+        # 建目录、查策略与下载/合并并行；合并后才知道大小，上传会话在 upload_path 中创建
+        prepared = pipeline.PreparedUpload(tokens, uri, policy_id, mime_type="video/mp4", folder=folder)
         try:
-            links, link_refreshed = cloudreve.create_direct_links(access_token, [uri], refresh_token=rft)
-            if link_refreshed:
-                access_token = link_refreshed["access_token"]
-                rft = link_refreshed.get("refresh_token")
-            if links and links[0].get("link"):
-                direct_link = links[0]["link"]
-        except Exception as e:
-            direct_link = f"（获取直链失败：{e}）"
+            with spool.reserve() as res:
+                tmp_path = res.temp_file(".mp4")
+                bilibili.download_bilibili_video_to_path(
+                    bvid, tmp_path, cookie=cookie or "", cid=info["cid"], reservation=res,
+                )
+                with metrics.stage("bilibili", "upload") as st:
+                    uploaded = prepared.upload_path(tmp_path)
+                    st.bytes, st.chunks = uploaded["size"], uploaded["chunks"]
+        except BaseException:
+            prepared.abort()
+            raise
+        metrics.add_bytes("bilibili", "upload", uploaded["size"])
+        return {"size": uploaded["size"]}
 
-        out = {
-            "status": "success",
-            "bvid": bvid,
-            "title": title,
-            "target_uri": uri,
-            "size_bytes": size,
-            "direct_link": direct_link,
-        }
-        if refreshed or chunk_refreshed or link_refreshed:
-            final_refreshed = refreshed or chunk_refreshed or link_refreshed
-            if final_refreshed:
-                out["refreshed_tokens"] = {
-                    "access_token": final_refreshed["access_token"],
-                    "refresh_token": final_refreshed["refresh_token"],
-                    "access_expires": final_refreshed.get("access_expires"),
-                    "refresh_expires": final_refreshed.get("refresh_expires"),
-                }
-        return json.dumps(out, ensure_ascii=False, indent=2)
-    finally:
-        if tmp_path is not None:
+    uploaded, coalesced = singleflight.run("bilibili", f"{bvid}/{info['cid']}", uri, tokens, policy_id, transfer)
+    with metrics.stage("bilibili", "link"):
+        direct_link = pipeline.direct_links(tokens, [uri])[uri]
+
+    out = {
+        "status": "success",
+        "bvid": bvid,
+        "title": title,
+        "target_uri": uri,
+        "size_bytes": uploaded["size"],
+        "direct_link": direct_link,
+    }
+    if coalesced:
+        out["coalesced"] = True
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+def _bilibili_page_filename(page: dict) -> str:
+    part = re.sub(r'[\\/:*?"<>|]', "", (page.get("part") or "").strip())
+    return f"P{page['page']:02d} {part}.mp4" if part else f"P{page['page']:02d}.mp4"
+
+
+def _upload_bilibili_page(
+    tokens: pipeline.TokenState,
+    bvid: str,
+    page: dict,
+    uri: str,
+    policy_id: str,
+    cookie: str,
+) -> dict:
+    """下载并上传单个分 P，占用一个全局并发名额。"""
+    from . import bilibili
+    with _bilibili_page_slots, spool.reserve() as res:
+        tmp_path = res.temp_file(".mp4")
+        bilibili.download_bilibili_video_to_path(bvid, tmp_path, cookie=cookie, cid=page["cid"], reservation=res)
+        with metrics.stage("bilibili", "upload") as st:
+            uploaded = pipeline.PreparedUpload(tokens, uri, policy_id, mime_type="video/mp4").upload_path(tmp_path)
+            st.bytes, st.chunks = uploaded["size"], uploaded["chunks"]
+        metrics.add_bytes("bilibili", "upload", uploaded["size"])
+        return {"size_bytes": uploaded["size"]}
+
+
+def _cloudreve_upload_bilibili_pages_impl(
+    access_token: str,
+    bilibili_share_link: str,
+    policy_id: str,
+    refresh_token: str,
+    folder_uri: str,
+    target_uri: str | None,
+    cookie: str,
+    pages: str,
+    timings: bool = False,
+) -> str:
+    from . import bilibili
+    with metrics.stage("bilibili", "parse"):
+        parsed = bilibili.parse_bilibili_share_url(bilibili_share_link)
+        bvid = parsed["bvid"]
+        info = bilibili.get_video_info(bvid, cookie=cookie or "")
+    selected = bilibili.select_pages(info.get("pages") or [], pages)
+
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    if (target_uri or "").strip():
+        folder = pipeline.normalize_folder_uri(target_uri or "")
+    else:
+        parent = pipeline.normalize_folder_uri(folder_uri or "cloudreve://my/bilibili")
+        folder = f"{parent}/{bvid}"
+    pipeline.prepare_target(tokens, folder, policy_id)
+
+    results: list[dict] = []
+    with ThreadPoolExecutor(max_workers=min(len(selected), _BILIBILI_PAGE_CONCURRENCY)) as pool:
+        futures = []
+        for page in selected:
+            uri = f"{folder}/{_bilibili_page_filename(page)}"
+            item = {"page": page["page"], "part": page.get("part", ""), "cid": page["cid"], "target_uri": uri}
+            results.append(item)
+            futures.append(pool.submit(
+                metrics.in_context(_upload_bilibili_page), tokens, bvid, page, uri, policy_id, cookie or "",
+            ))
+        for item, fut in zip(results, futures):
             try:
-                os.unlink(tmp_path)
-            except FileNotFoundError:
-                pass
+                item.update(fut.result())
+                item["status"] = "success"
+            except spool.SpoolBusy as e:
+                item.update(spool.busy_response(e))
+            except Exception as e:
+                item["status"] = "error"
+                item["error"] = str(e) or repr(e)
+                item["error_type"] = type(e).__name__
+
+    done = [item["target_uri"] for item in results if item["status"] == "success"]
+    with metrics.stage("bilibili", "link"):
+        links = pipeline.direct_links(tokens, done)
+    for item in results:
+        if item["target_uri"] in links:
+            item["direct_link"] = links[item["target_uri"]]
+
+    failed = len(results) - len(done)
+    out = {
+        "status": "success" if not failed else ("partial" if done else "error"),
+        "bvid": bvid,
+        "title": info.get("title", ""),
+        "folder_uri": folder,
+        "page_count": len(info.get("pages") or []),
+        "pages": results,
+    }
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
 
 
 # ----- 网易云音乐：搜索/ID → 获取最佳音质链接 → 下载 → 上传网盘 → 直链 -----
-@mcp.tool()
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
 def cloudreve_upload_netease_song(
     access_token: str,
     keyword_or_song_id: str,
@@ -591,18 +1216,29 @@ def cloudreve_upload_netease_song(
     folder_uri: str = "",
     target_uri: str | None = None,
     netease_cookie: str = "",
+    cover_size: int = 0,
+    stream_upload: bool = False,
+    server_fetch: bool = False,
+    timings: bool = False,
 ) -> str:
-    """MCP 流程：登入网盘 → 根据关键词或歌曲 ID 获取网易云最佳音质链接 → 下载到临时文件 → 将封面图（JPG）嵌入音频元数据（MP3 ID3 / FLAC picture）→ 上传到网盘并返回直链。须先 cloudreve_login。keyword_or_song_id 可为搜索关键词或歌曲 ID（纯数字）。可选传 netease_cookie 以获取更高音质（如无损）。folder_uri 不传则默认 cloudreve://my/netease/{歌曲名 - 歌手}.mp3。返回中含 cover_url、direct_link。"""
+    """MCP 流程：登入网盘 → 根据关键词或歌曲 ID 获取网易云最佳音质链接 → 下载到临时文件 → 将封面图（JPG）嵌入音频元数据（MP3 ID3 / FLAC picture）→ 上传到网盘并返回直链。须先 cloudreve_login。keyword_or_song_id 可为搜索关键词或歌曲 ID（纯数字）。可选传 netease_cookie 以获取更高音质（如无损）。folder_uri 不传则默认 cloudreve://my/netease/{歌曲名 - 歌手}.mp3。cover_size>0 时嵌入服务端缩放为该边长的封面（如 500），不传用环境变量 NETEASE_COVER_SIZE（默认原图）。stream_upload 为 True 时不落临时文件，下载流直接分块上传（M4A 此时不嵌封面）。server_fetch 为 True 时把歌曲直链交给 Cloudreve 离线下载，音频不经过本机（不嵌封面）；不可用或任务失败时自动回退本地流程，返回中 fetched_by 为 cloudreve 或 local，回退时附 server_fetch_error。返回中含 cover_url、direct_link。timings 为 True 时返回中附带 timings：各阶段（parse/download/mux/upload/link 等）耗时、字节数、吞吐、分块数，以及重试与令牌刷新次数；同样内容每次调用都会写一行结构化日志。"""
     try:
-        return _cloudreve_upload_netease_song_impl(
-            access_token=access_token,
-            keyword_or_song_id=keyword_or_song_id,
-            policy_id=policy_id,
-            refresh_token=refresh_token,
-            folder_uri=folder_uri,
-            target_uri=target_uri,
-            netease_cookie=netease_cookie,
-        )
+        with metrics.timed("cloudreve_upload_netease_song", "netease"):
+            return _cloudreve_upload_netease_song_impl(
+                access_token=access_token,
+                keyword_or_song_id=keyword_or_song_id,
+                policy_id=policy_id,
+                refresh_token=refresh_token,
+                folder_uri=folder_uri,
+                target_uri=target_uri,
+                netease_cookie=netease_cookie,
+                cover_size=cover_size,
+                stream_upload=stream_upload,
+                server_fetch=server_fetch,
+                timings=timings,
+            )
+    except spool.SpoolBusy as e:
+        return json.dumps(spool.busy_response(e), ensure_ascii=False, indent=2)
     except Exception as e:
         return json.dumps({
             "status": "error",
@@ -611,6 +1247,124 @@ def cloudreve_upload_netease_song(
         }, ensure_ascii=False, indent=2)
 
 
+def _netease_filename(info: dict) -> str:
+    name = (info.get("name") or "未知").strip()
+    artists = info.get("artists") or []
+    safe = re.sub(r'[\\/:*?"<>|]', "", f"{name} - {', '.join(artists) if artists else '未知'}".strip() or "song")
+    return f"{safe}.mp3"
+
+
+def _ingest_netease_track(
+    prepared: pipeline.PreparedUpload,
+    info: dict,
+    cover_size: int | None = None,
+    prefetched_cover: bool | Exception | None = None,
+    stream_upload: bool = False,
+) -> dict:
+    """单首歌曲：下载到临时文件（同时嵌入封面）→ 分块上传到 prepared.uri。返回 {size_bytes, cover_embedded[, cover_embed_error]}。
+    prepared 在后台准备目录与策略；已知最终大小（无封面或流式嵌入成功）时下载一开始就创建上传会话。
+    prefetched_cover 为 netease.prefetch_covers 对 pic_url 的结果：False（不是可用图片）或异常时不再获取；
+    True（已在磁盘缓存）或不传时按 pic_url 获取（有磁盘缓存）。
+    stream_upload 为 True 且已知歌曲大小时不落盘，下载流（已嵌封面）直接交给分块上传。"""
+    from . import netease
+    try:
+        # 1) 先取封面，下载音频时在同一遍写入中把封面嵌入元数据（MP3 ID3 / FLAC picture）
+        pic_url = info.get("pic_url") or ""
+        cover = None
+        cover_embedded = False
+        cover_embed_error: str | None = None
+        if isinstance(prefetched_cover, Exception):
+            cover_embed_error = str(prefetched_cover) or type(prefetched_cover).__name__
+        elif prefetched_cover is False:
+            logger.debug("网易云上传：封面不是可用图片，跳过嵌入")
+        elif pic_url:
+            try:
+                cover = netease.fetch_cover(pic_url, cover_size)
+            except Exception as e:
+                cover_embed_error = str(e) or type(e).__name__
+                logger.warning("网易云上传：封面下载失败 - %s", cover_embed_error, exc_info=True)
+        else:
+            logger.debug("网易云上传：无封面 URL，跳过嵌入")
+        expected_size = int(info.get("size") or 0)
+        if stream_upload and expected_size > 0:
+            with metrics.stage("netease", "stream") as st:
+                opened = netease.open_song_stream(info["url"], expected_size, cover)
+                uploaded = prepared.upload_stream(opened["chunks"], opened["size"])
+                st.bytes, st.chunks = uploaded["size"], uploaded["chunks"]
+            metrics.add_bytes("netease", "upload", uploaded["size"])
+            out: dict = {"size_bytes": uploaded["size"], "cover_embedded": opened["cover_embedded"], "streamed": True}
+            cover_embed_error = cover_embed_error or opened["cover_embed_error"]
+            if cover is not None and not opened["cover_embedded"] and cover_embed_error is None:
+                cover_embed_error = f"流式上传不支持为 {opened['format'] or '未知'} 格式嵌入封面"
+            if cover_embed_error is not None:
+                out["cover_embed_error"] = cover_embed_error
+            return out
+        # 封面嵌入会让文件比歌曲本身略大，按歌曲大小加封面字节预留；大小未知时按默认值预留
+        cover_bytes = len(cover[0]) if cover is not None else 0
+        with spool.reserve(expected_size + cover_bytes if expected_size > 0 else None) as res:
+            tmp_path = res.temp_file(".mp3")
+
+            def on_size(size: int) -> None:
+                res.resize(size + cover_bytes)
+                prepared.on_size(size)
+
+            with metrics.stage("netease", "download") as st:
+                if cover is None:
+                    st.bytes = netease.download_netease_song_to_path(
+                        info["url"], tmp_path, expected_size, on_size=on_size,
+                    )
+                else:
+                    downloaded = netease.download_netease_song_with_cover(
+                        info["url"], tmp_path, *cover, expected_size=expected_size, on_size=on_size,
+                    )
+                    st.bytes = downloaded["size"]
+            if cover is not None:
+                cover_embedded = downloaded["cover_embedded"]
+                # 文件头无法解析时歌曲已原样写入，不再尝试补嵌
+                cover_embed_error = downloaded["cover_embed_error"]
+                # 2) M4A 等无法流式嵌入的格式，下载完成后再写入封面
+                if not cover_embedded and cover_embed_error is None:
+                    try:
+                        logger.info("网易云上传：正在将封面嵌入音频 %s", tmp_path)
+                        cover_embedded = netease.embed_cover_into_audio(tmp_path, pic_url, cover=cover)
+                    except Exception as e:
+                        cover_embed_error = str(e) or type(e).__name__
+                        logger.warning("网易云上传：封面嵌入失败 - %s", cover_embed_error, exc_info=True)
+                if cover_embedded:
+                    logger.info("网易云上传：封面嵌入成功")
+                else:
+                    logger.info("网易云上传：跳过嵌入（格式不支持或无有效封面）")
+            # 3) 分块上传；M4A 等补嵌封面的文件下载时未提前建会话（大小要到补嵌后才知道），此时才创建
+            with metrics.stage("netease", "upload") as st:
+                uploaded = prepared.upload_path(tmp_path)
+                st.bytes, st.chunks = uploaded["size"], uploaded["chunks"]
+            metrics.add_bytes("netease", "upload", uploaded["size"])
+        out = {"size_bytes": uploaded["size"], "cover_embedded": cover_embedded}
+        if cover_embed_error is not None:
+            out["cover_embed_error"] = cover_embed_error
+        return out
+    except BaseException:
+        prepared.abort()
+        raise
+
+
+def _ingest_netease_playlist_track(
+    tokens: pipeline.TokenState,
+    uri: str,
+    policy_id: str,
+    info: dict,
+    cover_size: int | None,
+    prefetched_cover: bool | Exception | None,
+) -> tuple[dict, bool]:
+    """歌单中的一首歌：与同时进行的相同入库（同一首歌、同一 URI）合并，返回 (结果, 是否复用了进行中的任务)。"""
+
+    def transfer() -> dict:
+        prepared = pipeline.PreparedUpload(tokens, uri, policy_id, mime_type="audio/mpeg")
+        return _ingest_netease_track(prepared, info, cover_size, prefetched_cover)
+
+    return singleflight.run("netease", info["id"], uri, tokens, policy_id, transfer)
+
+
 def _cloudreve_upload_netease_song_impl(
     access_token: str,
     keyword_or_song_id: str,
@@ -619,130 +1373,212 @@ def _cloudreve_upload_netease_song_impl(
     folder_uri: str,
     target_uri: str | None,
     netease_cookie: str,
+    cover_size: int = 0,
+    stream_upload: bool = False,
+    server_fetch: bool = False,
+    timings: bool = False,
 ) -> str:
-    info = netease.get_song_with_best_url(keyword_or_song_id, cookie=netease_cookie or "")
+    from . import netease
+    with metrics.stage("netease", "parse"):
+        info = netease.get_song_with_best_url(keyword_or_song_id, cookie=netease_cookie or "")
     if not info or not info.get("url"):
         raise RuntimeError("未获取到歌曲或下载链接")
     name = (info.get("name") or "未知").strip()
     artists = info.get("artists") or []
-    safe = re.sub(r'[\\/:*?"<>|]', "", f"{name} - {', '.join(artists) if artists else '未知'}".strip() or "song")
-    filename = f"{safe}.mp3"
 
-    tmp_path = None
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    folder = None
+    if (target_uri or "").strip():
+        uri = (target_uri or "").strip()
+    else:
+        folder = pipeline.normalize_folder_uri(folder_uri or "cloudreve://my/netease")
+        uri = f"{folder}/{_netease_filename(info)}"
+
+    def transfer() -> dict:
+        fetched, fallback_reason = (
+            _server_fetch("netease", tokens, info["url"], uri, policy_id, size=int(info.get("size") or 0) or None)
+            if server_fetch else (None, None)
+        )
+        if fetched is not None:
+            # 离线下载保存的是原始音频，不嵌入封面
+            return {"size_bytes": fetched["size"], "cover_embedded": False, **_fetch_fields(fetched, fallback_reason)}
+        prepared = pipeline.PreparedUpload(tokens, uri, policy_id, mime_type="audio/mpeg", folder=folder)
+        track = _ingest_netease_track(
+            prepared, info, cover_size=cover_size or None, stream_upload=stream_upload,
+        )
+        return {**track, **_fetch_fields(fetched, fallback_reason)}
+
+    # 同一首歌同时入库到同一 URI 时只传一次（歌单入库中的同一首歌也会合并），其余调用等待并共享结果
+    track, coalesced = singleflight.run("netease", info.get("id"), uri, tokens, policy_id, transfer)
+    with metrics.stage("netease", "link"):
+        direct_link = pipeline.direct_links(tokens, [uri])[uri]
+
+    out = {
+        "status": "success",
+        "song_id": info.get("id"),
+        "name": name,
+        "artists": artists,
+        "cover_url": info.get("pic_url") or "",
+        "cover_embedded": track["cover_embedded"],
+        "target_uri": uri,
+        "size_bytes": track["size_bytes"],
+        "direct_link": direct_link,
+        **{k: track[k] for k in ("fetched_by", "server_fetch_error", "cover_embed_error") if k in track},
+    }
+    if coalesced:
+        out["coalesced"] = True
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+
+# ----- 网易云音乐：歌单/专辑 → 批量获取详情与链接 → 并行下载、嵌封面、上传 → 批量直链 -----
+# 歌单/专辑内歌曲的并行处理数
+_NETEASE_TRACK_CONCURRENCY = max(1, int(os.environ.get("NETEASE_TRACK_CONCURRENCY", "4")))
+
+
+@_tool()
+@metrics.instrument_tool
+@profiling.profile_tool
+def cloudreve_upload_netease_playlist(
+    access_token: str,
+    playlist_or_album: str,
+    policy_id: str,
+    kind: str = "",
+    refresh_token: str = "",
+    folder_uri: str = "",
+    netease_cookie: str = "",
+    limit: int = 0,
+    cover_size: int = 0,
+    timings: bool = False,
+) -> str:
+    """MCP 流程：网易云歌单或专辑整体入库。playlist_or_album 可为歌单/专辑链接或 ID；纯数字 ID 时用 kind 指定 "playlist"（默认）或 "album"。一次获取全部歌曲 ID，批量获取详情与播放链接（最佳可用音质），再并行下载、嵌入封面、上传，最后批量获取直链。folder_uri 不传则默认 cloudreve://my/netease/{歌单或专辑名}/。limit>0 时只处理前 limit 首。封面按 URL 去重后批量预取（同一专辑只下载一次），cover_size>0 时使用服务端缩放后的封面。须先 cloudreve_login。timings 为 True 时返回中附带 timings：各阶段（parse/download/mux/upload/link 等）耗时、字节数、吞吐、分块数，以及重试与令牌刷新次数；同样内容每次调用都会写一行结构化日志。"""
     try:
-        tmp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-        tmp_path = tmp.name
-        tmp.close()
-        # 1) 下载音频到临时文件
-        netease.download_netease_song_to_path(info["url"], tmp_path)
-        # 2) 上传到网盘前，先将封面图（JPG）嵌入音频元数据（MP3 ID3 / FLAC picture）
-        pic_url = info.get("pic_url") or ""
-        cover_embedded = False
-        cover_embed_error: str | None = None
-        if pic_url:
-            try:
-                logger.info("网易云上传：正在将封面嵌入音频 %s", tmp_path)
-                cover_embedded = netease.embed_cover_into_audio(tmp_path, pic_url)
-                if cover_embedded:
-                    logger.info("网易云上传：封面嵌入成功")
-                else:
-                    logger.info("网易云上传：跳过嵌入（格式不支持或无有效封面）")
-            except Exception as e:
-                cover_embed_error = str(e) or type(e).__name__
-                logger.warning("网易云上传：封面嵌入失败 - %s", cover_embed_error, exc_info=True)
-        else:
-            logger.debug("网易云上传：无封面 URL，跳过嵌入")
-        # 3) 嵌封面后重新取大小，再创建上传会话并分块上传
-        size = os.path.getsize(tmp_path)
-
-        rft = refresh_token or None
-        if (target_uri or "").strip():
-            uri = (target_uri or "").strip()
-        elif (folder_uri or "").strip():
-            folder = folder_uri.strip().rstrip("/")
-            if folder.startswith("cloudreve://") and "/" not in folder[len("cloudreve://"):]:
-                folder = f"cloudreve://my/{folder[len('cloudreve://'):]}"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
+        with metrics.timed("cloudreve_upload_netease_playlist", "netease"):
+            return _cloudreve_upload_netease_playlist_impl(
+                access_token=access_token,
+                playlist_or_album=playlist_or_album,
+                policy_id=policy_id,
+                kind=kind,
+                refresh_token=refresh_token,
+                folder_uri=folder_uri,
+                netease_cookie=netease_cookie,
+                limit=limit,
+                cover_size=cover_size,
+                timings=timings,
             )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{filename}"
+    except spool.SpoolBusy as e:
+        return json.dumps(spool.busy_response(e), ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "error": str(e) or repr(e),
+            "error_type": type(e).__name__,
+        }, ensure_ascii=False, indent=2)
+
+
+def _cloudreve_upload_netease_playlist_impl(
+    access_token: str,
+    playlist_or_album: str,
+    policy_id: str,
+    kind: str,
+    refresh_token: str,
+    folder_uri: str,
+    netease_cookie: str,
+    limit: int,
+    cover_size: int = 0,
+    timings: bool = False,
+) -> str:
+    from . import netease
+    cookie = netease_cookie or ""
+    with metrics.stage("netease", "parse"):
+        kind, collection_id = netease.parse_collection_id(playlist_or_album, (kind or "").strip().lower())
+        if kind == "album":
+            collection = netease.get_album(collection_id, cookie=cookie)
+        elif kind == "playlist":
+            collection = netease.get_playlist(collection_id, cookie=cookie)
         else:
-            folder = "cloudreve://my/netease"
-            _, folder_refreshed = cloudreve.create_file(
-                access_token, folder, "folder",
-                refresh_token=rft, err_on_conflict=False,
-            )
-            if folder_refreshed:
-                access_token = folder_refreshed["access_token"]
-                rft = folder_refreshed.get("refresh_token")
-            uri = f"{folder}/{filename}"
-        refreshed = chunk_refreshed = link_refreshed = None
-        session_data, refreshed = cloudreve.create_upload_session(
-            access_token, uri, size, policy_id,
-            refresh_token=rft,
-            mime_type="audio/mpeg",
+            raise ValueError(f"不支持的类型：{kind}（应为 playlist 或 album）")
+        track_ids = collection["track_ids"]
+        if limit and limit > 0:
+            track_ids = track_ids[:limit]
+        if not track_ids:
+            raise RuntimeError("歌单或专辑中没有歌曲")
+        songs = netease.get_songs_with_best_urls(track_ids, cookie=cookie)
+    # 封面只预取到磁盘缓存（不在内存中保留），各首歌下载时从缓存读取
+    with metrics.stage("netease", "cover"):
+        covers = netease.prefetch_covers(
+            [info["pic_url"] for info in songs if info.get("url") and info.get("pic_url")],
+            cover_size or None,
         )
-        if refreshed:
-            access_token = refreshed["access_token"]
-            rft = refreshed.get("refresh_token")
-        chunk_size = session_data["chunk_size"] or size
-        if chunk_size <= 0:
-            chunk_size = size
-        session_id = session_data["session_id"]
-        index = 0
-        with open(tmp_path, "rb") as f:
-            for offset in range(0, size, chunk_size):
-                chunk = f.read(chunk_size)
-                _, chunk_refreshed = cloudreve.upload_file_chunk(
-                    access_token, session_id, index, chunk,
-                    refresh_token=rft,
-                )
-                if chunk_refreshed:
-                    access_token = chunk_refreshed["access_token"]
-                    rft = chunk_refreshed.get("refresh_token")
-                index += 1
 
-        direct_link = ""
-        try:
-            links, link_refreshed = cloudreve.create_direct_links(access_token, [uri], refresh_token=rft)
-            if link_refreshed:
-                access_token = link_refreshed["access_token"]
-                rft = link_refreshed.get("refresh_token")
-            if links and links[0].get("link"):
-                direct_link = links[0]["link"]
-        except Exception as e:
-            direct_link = f"（获取直链失败：{e}）"
+    tokens = pipeline.TokenState(access_token, refresh_token)
+    if (folder_uri or "").strip():
+        folder = pipeline.normalize_folder_uri(folder_uri)
+    else:
+        name = re.sub(r'[\\/:*?"<>|]', "", collection.get("name") or "").strip() or f"{kind}_{collection_id}"
+        folder = f"cloudreve://my/netease/{name}"
+    pipeline.prepare_target(tokens, folder, policy_id)
 
-        out = {
-            "status": "success",
-            "song_id": info.get("id"),
-            "name": name,
-            "artists": artists,
-            "cover_url": info.get("pic_url") or "",
-            "cover_embedded": cover_embedded,
-            "target_uri": uri,
-            "size_bytes": size,
-            "direct_link": direct_link,
-        }
-        if cover_embed_error is not None:
-            out["cover_embed_error"] = cover_embed_error
-        if refreshed or chunk_refreshed or link_refreshed:
-            final_refreshed = refreshed or chunk_refreshed or link_refreshed
-            if final_refreshed:
-                out["refreshed_tokens"] = {
-                    "access_token": final_refreshed["access_token"],
-                    "refresh_token": final_refreshed["refresh_token"],
-                    "access_expires": final_refreshed.get("access_expires"),
-                    "refresh_expires": final_refreshed.get("refresh_expires"),
-                }
-        return json.dumps(out, ensure_ascii=False, indent=2)
-    finally:
-        if tmp_path is not None:
+    results: list[dict] = []
+    used_names: set[str] = set()
+    with ThreadPoolExecutor(max_workers=min(len(songs), _NETEASE_TRACK_CONCURRENCY)) as pool:
+        futures = {}
+        for info in songs:
+            item = {"song_id": info["id"], "name": info.get("name", ""), "artists": info.get("artists", [])}
+            results.append(item)
+            if not info.get("url"):
+                item["status"] = "error"
+                item["error"] = "未获取到下载链接"
+                continue
+            filename = _netease_filename(info)
+            if filename in used_names:
+                filename = f"{filename[:-len('.mp3')]} ({info['id']}).mp3"
+            used_names.add(filename)
+            item["target_uri"] = f"{folder}/{filename}"
+            item["level"] = info.get("level", "")
+            futures[id(item)] = pool.submit(
+                metrics.in_context(_ingest_netease_playlist_track), tokens, item["target_uri"], policy_id, info,
+                cover_size or None, covers.get(info.get("pic_url") or ""),
+            )
+        for item in results:
+            fut = futures.get(id(item))
+            if fut is None:
+                continue
             try:
-                os.unlink(tmp_path)
-            except FileNotFoundError:
-                pass
+                track, coalesced = fut.result()
+                item.update(track)
+                if coalesced:
+                    item["coalesced"] = True
+                item["status"] = "success"
+            except spool.SpoolBusy as e:
+                item.update(spool.busy_response(e))
+            except Exception as e:
+                item["status"] = "error"
+                item["error"] = str(e) or repr(e)
+                item["error_type"] = type(e).__name__
+
+    done = [item["target_uri"] for item in results if item.get("status") == "success"]
+    with metrics.stage("netease", "link"):
+        links = pipeline.direct_links(tokens, done)
+    for item in results:
+        if item.get("target_uri") in links:
+            item["direct_link"] = links[item["target_uri"]]
+
+    failed = len(results) - len(done)
+    out = {
+        "status": "success" if not failed else ("partial" if done else "error"),
+        "kind": kind,
+        "id": collection_id,
+        "name": collection.get("name", ""),
+        "folder_uri": folder,
+        "track_count": len(results),
+        "succeeded": len(done),
+        "failed": failed,
+        "tracks": results,
+    }
+    if tokens.refreshed_tokens():
+        out["refreshed_tokens"] = tokens.refreshed_tokens()
+    _attach_timings(out, tokens, timings)
+    return json.dumps(out, ensure_ascii=False, indent=2)
@@ -0,0 +1,98 @@
+"""
+进程内 single-flight：同一用户对同一 (平台, 源 ID, 目标 URI) 的并发入库只执行一次传输，
+重复调用挂到进行中的任务上等待并共享其结果（或异常），不再各自下载、上传并争抢同一个网盘对象。
+
+共享的只是传输部分的结果（大小、是否嵌入封面等），不含令牌：每个调用方仍用自己的令牌取直链，
+refreshed_tokens 也只返回给真正发生刷新的那一方。任务结束即从登记表移除，之后的调用重新执行（不做结果缓存）。
+
+用户区分：access_token 为 JWT 时取其 sub（先经 check_policy 用该令牌成功请求过一次，证明令牌有效、sub 可信），
+因此同一账号的不同登录会话也能合并；否则退回令牌摘要，只合并持有同一令牌的调用。
+只在单个进程内生效；多 worker 时重复请求落在不同 worker 上不会合并。
+工具经 server._tool 注册，在工作线程中执行，同一进程内的并发调用才会同时到达这里。
+"""
+
+import base64
+import json
+import logging
+import threading
+from typing import Any, Callable
+
+from . import metrics
+from . import pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+_lock = threading.Lock()
+_flights: dict[tuple, _Flight] = {}
+
+
+def _jwt_subject(token: str) -> str:
+    """不校验签名地取 JWT 载荷中的 sub；不是 JWT 时返回空串。"""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return ""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+    except (ValueError, TypeError):
+        return ""
+    sub = payload.get("sub") if isinstance(payload, dict) else None
+    return str(sub) if sub else ""
+
+
+def user_key(tokens: pipeline.TokenState, policy_id: str) -> str:
+    """
+    合并键中的用户部分。先 check_policy（按令牌缓存，通常不发请求）：成功说明当前令牌被 Cloudreve 接受，
+    此时取当前令牌（可能已刷新）的 sub；检查未能完成时只用令牌摘要。
+    """
+    verified = pipeline.check_policy(tokens, policy_id) is not None
+    access_token, _ = tokens.snapshot()
+    sub = _jwt_subject(access_token) if verified else ""
+    return f"sub:{sub}" if sub else f"token:{tokens.cache_key()}"
+
+
+def run(
+    platform: str,
+    source_id: str,
+    target_uri: str,
+    tokens: pipeline.TokenState,
+    policy_id: str,
+    fn: Callable[[], Any],
+) -> tuple[Any, bool]:
+    """
+    以 (platform, source_id, target_uri, 用户) 为键执行 fn，返回 (结果, 是否复用了进行中的任务)。
+    已有相同任务在执行时不调用 fn，等待其结束后返回同一结果；该任务失败时抛出同一异常。
+    """
+    key = (platform, str(source_id), target_uri, user_key(tokens, policy_id))
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        metrics.COALESCED.labels(platform).inc()
+        logger.info("%s：%s → %s 已在进行中，等待其结果", platform, source_id, target_uri)
+        with metrics.stage(platform, "coalesced"):
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+    try:
+        flight.result = fn()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            _flights.pop(key, None)
+        flight.done.set()
+    return flight.result, False
@@ -0,0 +1,184 @@
+"""
+落盘暂存（spool）目录与磁盘感知的准入控制：入库任务的临时文件（下载中的视频/音频、DASH 的 .m4s、合并输出）
+统一放在 MCP_SPOOL_DIR 下，每个任务先按预计大小预留字节，空间足够才开始下载。
+
+  MCP_SPOOL_DIR          暂存目录，可指向 tmpfs 或高速盘（默认系统临时目录下的 mcp-cloudreve-spool）
+  MCP_SPOOL_MAX_BYTES    所有任务预留总量上限（字节，0 表示只受磁盘剩余空间限制）
+  MCP_SPOOL_MIN_FREE     磁盘至少保留的剩余空间（字节，默认 256 MiB），留给其他进程与文件系统元数据
+  MCP_SPOOL_WAIT         空间不足时排队等待的秒数（默认 30），超时返回 busy 而不是在传输中途遇到 ENOSPC
+  MCP_SPOOL_DEFAULT_RESERVE  大小未知时（如抖音拿到响应头前）的初始预留（字节，默认 256 MiB）
+
+可用空间 = 磁盘剩余 - MIN_FREE - 各任务「已预留但尚未写入」的字节；任务写入的文件已计入磁盘占用，不会重复扣减。
+预留随 with 块结束释放，并删除该任务在暂存目录中创建的全部文件与目录。
+
+reserve(directory=...) 也可为暂存目录以外的目标（如 cloudreve_download_file 的下载目录）预留：
+同一文件系统上的预留共同扣减剩余空间（同样保留 MIN_FREE），MAX_BYTES 只约束暂存目录中的预留；
+经 track 登记的文件由调用方管理，只用于计算已写入的字节，释放时不删除。
+"""
+
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+
+SPOOL_DIR = os.environ.get("MCP_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "mcp-cloudreve-spool")
+MAX_BYTES = int(os.environ.get("MCP_SPOOL_MAX_BYTES", "0"))
+MIN_FREE = int(os.environ.get("MCP_SPOOL_MIN_FREE", str(256 * MIB)))
+WAIT_SECONDS = float(os.environ.get("MCP_SPOOL_WAIT", "30"))
+DEFAULT_RESERVE = int(os.environ.get("MCP_SPOOL_DEFAULT_RESERVE", str(256 * MIB)))
+
+_cond = threading.Condition()
+_active: set["Reservation"] = set()
+
+
+class SpoolBusy(RuntimeError):
+    """暂存空间不足且排队超时；工具返回 status=busy，调用方可稍后重试。"""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _ensure_dir() -> None:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+
+
+def _path_size(path: str) -> int:
+    try:
+        if os.path.isdir(path):
+            return sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _dirs, files in os.walk(path) for name in files
+            )
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Reservation:
+    """一个任务在暂存目录中的字节预留，以及它创建的临时文件/目录（释放时一并删除）。"""
+
+    def __init__(self, nbytes: int, directory: str = SPOOL_DIR) -> None:
+        self.nbytes = nbytes
+        self.directory = directory
+        self.device = os.stat(directory).st_dev
+        self._paths: list[str] = []
+        # 调用方管理的文件 → 登记时已有的字节数
+        self._tracked: dict[str, int] = {}
+
+    def written(self) -> int:
+        """该任务已写入的字节数（已体现在磁盘剩余空间中）。"""
+        return sum(_path_size(p) for p in self._paths) + sum(
+            max(0, _path_size(p) - base) for p, base in self._tracked.items()
+        )
+
+    def outstanding(self) -> int:
+        return max(0, self.nbytes - self.written())
+
+    def temp_file(self, suffix: str = "") -> str:
+        """在暂存目录中创建一个空临时文件，返回路径。"""
+        _ensure_dir()
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=SPOOL_DIR)
+        os.close(fd)
+        self._paths.append(path)
+        return path
+
+    def temp_dir(self) -> str:
+        """在暂存目录中创建一个临时子目录，返回路径。"""
+        _ensure_dir()
+        path = tempfile.mkdtemp(dir=SPOOL_DIR)
+        self._paths.append(path)
+        return path
+
+    def track(self, path: str) -> None:
+        """登记一个由调用方创建和删除的文件：之后写入的字节计为已写入，释放预留时不删除它。"""
+        self._tracked[path] = _path_size(path)
+
+    def resize(self, nbytes: int) -> None:
+        """得知更准确的预计大小后调整预留；变大且空间不足时同样排队，超时抛 SpoolBusy。"""
+        with _cond:
+            if nbytes <= self.nbytes:
+                self.nbytes = nbytes
+                _cond.notify_all()
+                return
+            _wait_for(nbytes - self.nbytes, exclude=self, directory=self.directory)
+            self.nbytes = nbytes
+
+    def _cleanup(self) -> None:
+        for path in self._paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        self._paths.clear()
+
+
+def _available(directory: str = SPOOL_DIR) -> int:
+    """directory 所在文件系统当前还能预留的字节数（调用方持有 _cond）。"""
+    if directory == SPOOL_DIR:
+        _ensure_dir()
+    device = os.stat(directory).st_dev
+    free = shutil.disk_usage(directory).free - MIN_FREE
+    free -= sum(r.outstanding() for r in _active if r.device == device)
+    if MAX_BYTES > 0 and directory == SPOOL_DIR:
+        free = min(free, MAX_BYTES - sum(r.nbytes for r in _active if r.directory == SPOOL_DIR))
+    return free
+
+
+def _wait_for(nbytes: int, exclude: Reservation | None = None, directory: str = SPOOL_DIR) -> None:
+    """等到可再预留 nbytes 字节（调用方持有 _cond）。exclude 为正在扩大预留的任务；没有其他任务占用时空间不会再释放，直接失败。"""
+    deadline = time.monotonic() + WAIT_SECONDS
+    while _available(directory) < nbytes:
+        others = [r for r in _active if r is not exclude]
+        remaining = deadline - time.monotonic()
+        if not others or remaining <= 0:
+            logger.warning("空间不足：需要 %.1f MiB，可用 %.1f MiB，进行中任务 %d 个",
+                           nbytes / MIB, max(0, _available(directory)) / MIB, len(others))
+            raise SpoolBusy(
+                f"空间不足（需要 {nbytes / MIB:.1f} MiB，目录 {directory}），请稍后重试",
+                retry_after=max(1.0, WAIT_SECONDS),
+            )
+        # 其他任务写入时不会通知，定期醒来重新计算
+        _cond.wait(min(remaining, 1.0))
+
+
+@contextlib.contextmanager
+def reserve(nbytes: int | None = None, directory: str | None = None) -> Iterator[Reservation]:
+    """
+    预留 nbytes 字节（None 时用 DEFAULT_RESERVE）后进入 with 块；空间不足时排队至多 MCP_SPOOL_WAIT 秒，仍不足抛 SpoolBusy。
+    directory 为写入目标所在的已存在目录（默认暂存目录）。退出时释放预留并删除经 temp_file / temp_dir 创建的文件。
+    """
+    if directory is None:
+        _ensure_dir()
+    res = Reservation(DEFAULT_RESERVE if nbytes is None else max(0, nbytes), directory or SPOOL_DIR)
+    with _cond:
+        _wait_for(res.nbytes, directory=res.directory)
+        _active.add(res)
+    try:
+        yield res
+    finally:
+        res._cleanup()
+        with _cond:
+            _active.discard(res)
+            _cond.notify_all()
+
+
+def busy_response(e: SpoolBusy) -> dict:
+    """工具返回的 busy 结果。"""
+    return {
+        "status": "busy",
+        "error": str(e),
+        "error_type": type(e).__name__,
+        "retry_after": e.retry_after,
+    }
@@ -0,0 +1,114 @@
+"""
+可替换的共享状态后端：解析结果缓存（网易云搜索/详情/播放链接、存储策略列表、哔哩哔哩 WBI 密钥）经 cache() 创建。
+
+  MCP_STATE_BACKEND=memory   默认，进程内 TTLCache，每个 worker 各自缓存
+  MCP_STATE_BACKEND=redis    多 worker / 多节点共享，地址 MCP_STATE_REDIS_URL（默认 redis://127.0.0.1:6379/0），
+                             需 pip install "mcp-cloudreve[redis]"；未安装时记警告并退回 memory
+
+服务端不保存令牌（调用方每次传入，刷新后随结果返回），也没有跨调用的任务状态，因此除缓存外各 worker 无需共享数据。
+DNS 缓存与封面磁盘缓存仍是进程 / 本机级别（后者同机多 worker 共用同一目录）。
+"""
+
+import json
+import logging
+import os
+from typing import Any, Hashable, Iterable
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.environ.get("MCP_STATE_BACKEND", "memory").strip().lower()
+REDIS_URL = os.environ.get("MCP_STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+# 各 worker 共用一个 Redis 时，用前缀区分不同部署
+KEY_PREFIX = os.environ.get("MCP_STATE_KEY_PREFIX", "mcp-cloudreve")
+# discard 时一条 DEL 命令包含的键数
+_DELETE_BATCH = 1000
+
+_redis_client = None
+_redis_missing = False
+
+
+def _get_redis():
+    """返回共享的 Redis 客户端（自带连接池，线程安全）；未安装 redis 时返回 None（只警告一次）。"""
+    global _redis_client, _redis_missing
+    if _redis_client is None and not _redis_missing:
+        try:
+            import redis
+        except ImportError:
+            _redis_missing = True
+            logger.warning('MCP_STATE_BACKEND=redis 但未安装 redis（pip install "mcp-cloudreve[redis]"），退回进程内缓存')
+            return None
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=2.0, socket_connect_timeout=2.0)
+    return _redis_client
+
+
+class RedisCache:
+    """
+    与 TTLCache 接口一致（get/set/pop/discard/clear）的 Redis 缓存：值以 JSON 保存，条目过期交给 Redis（PX），
+    maxsize 不生效，容量由 Redis 的 maxmemory 策略控制。Redis 不可用时只记日志，表现为未命中，不影响调用方。
+    """
+
+    def __init__(self, client, namespace: str, ttl: float) -> None:
+        self.ttl = ttl
+        self._client = client
+        self._prefix = f"{KEY_PREFIX}:{namespace}:"
+
+    def _key(self, key: Hashable) -> str:
+        return self._prefix + (key if isinstance(key, str) else json.dumps(key, ensure_ascii=False, default=str))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            raw = self._client.get(self._key(key))
+        except Exception as e:
+            logger.warning("共享缓存读取失败 %s - %s", self._prefix, e)
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        try:
+            self._client.set(self._key(key), json.dumps(value, ensure_ascii=False), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            logger.warning("共享缓存写入失败 %s - %s", self._prefix, e)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            raw = self._client.getdel(self._key(key))
+        except Exception as e:
+            logger.warning("共享缓存删除失败 %s - %s", self._prefix, e)
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def discard(self, keys: Iterable[Hashable]) -> None:
+        """一次删除多个键：按批拼成 DEL 命令，经一个非事务 pipeline 发出（一次往返）。"""
+        names = [self._key(key) for key in keys]
+        if not names:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for i in range(0, len(names), _DELETE_BATCH):
+                pipe.delete(*names[i:i + _DELETE_BATCH])
+            pipe.execute()
+        except Exception as e:
+            logger.warning("共享缓存删除失败 %s - %s", self._prefix, e)
+
+    def clear(self) -> None:
+        try:
+            for key in self._client.scan_iter(match=self._prefix + "*", count=500):
+                self._client.delete(key)
+        except Exception as e:
+            logger.warning("共享缓存清空失败 %s - %s", self._prefix, e)
+
+
+def cache(namespace: str, maxsize: int, ttl: float) -> TTLCache | RedisCache:
+    """按 MCP_STATE_BACKEND 创建命名空间为 namespace 的缓存。值须可 JSON 序列化（Redis 后端下元组读回为列表）。"""
+    if BACKEND == "redis":
+        client = _get_redis()
+        if client is not None:
+            return RedisCache(client, namespace, ttl)
+    elif BACKEND != "memory":
+        logger.warning("未知的 MCP_STATE_BACKEND=%s，使用进程内缓存", BACKEND)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,265 @@
+"""
+本地目录 → Cloudreve 增量同步：遍历目录，与本地清单（manifest）比对，只上传新增或变化的文件。
+
+  MCP_SYNC_CONCURRENCY    同时上传的文件数（默认 4）
+  MCP_SYNC_MANIFEST_DIR   清单默认存放目录（默认 ~/.cache/mcp-cloudreve/sync），按 (本地目录, 网盘目录) 各一个 JSON
+
+清单记录每个文件的 (相对路径, 大小, mtime_ns, 可选 sha256, 网盘 URI[, 直链])。大小与 mtime 都未变的文件直接跳过，
+不读文件内容也不发请求，未变化的大目录重新同步只需遍历一次目录；开启 hash 时 mtime 变化但内容未变的文件只更新清单。
+需要上传的文件所在文件夹先统一创建一次（只建最深的一层，祖先由 Cloudreve 自动创建），直链按批请求。
+本地已删除的文件只从清单移除并在结果中列出，不删除网盘上的文件。
+网盘 URI 中相对路径的每一段都单独百分号编码，文件名里的空格、#、?、% 等不会被当作 URI 语法。
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import metrics
+from . import pipeline
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = max(1, int(os.environ.get("MCP_SYNC_CONCURRENCY", "4")))
+MANIFEST_DIR = os.environ.get("MCP_SYNC_MANIFEST_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "mcp-cloudreve", "sync",
+)
+_MANIFEST_VERSION = 1
+# 同步过程中清单的落盘间隔（秒），中断后已上传的文件不会重传
+_CHECKPOINT_SECONDS = 5.0
+# 一次直链请求包含的文件数
+_LINK_BATCH = 100
+
+
+def remote_uri(remote_folder: str, rel: str) -> str:
+    """相对路径 rel（以 / 分隔）在 remote_folder 下的 URI，各段分别百分号编码。"""
+    return "/".join([remote_folder, *(urllib.parse.quote(seg, safe="") for seg in rel.split("/"))])
+
+
+def manifest_path_for(local_dir: str, remote_folder: str) -> str:
+    key = hashlib.sha256(f"{os.path.abspath(local_dir)}\n{remote_folder}".encode("utf-8")).hexdigest()[:32]
+    return os.path.join(MANIFEST_DIR, f"{key}.json")
+
+
+def load_manifest(path: str, local_dir: str, remote_folder: str) -> dict[str, dict]:
+    """读取清单中的文件条目；清单不存在、损坏或对应的目录不同时返回空字典（全部视为新文件）。"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (data.get("version"), data.get("local_dir"), data.get("remote_folder")) != (
+        _MANIFEST_VERSION, os.path.abspath(local_dir), remote_folder,
+    ):
+        logger.warning("清单 %s 与本次同步的目录不符，忽略", path)
+        return {}
+    return data.get("files") or {}
+
+
+def save_manifest(path: str, local_dir: str, remote_folder: str, files: dict[str, dict]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": _MANIFEST_VERSION,
+            "local_dir": os.path.abspath(local_dir),
+            "remote_folder": remote_folder,
+            "files": files,
+        }, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def scan(local_dir: str, exclude: list[str] | None = None) -> dict[str, tuple[int, int]]:
+    """遍历目录，返回 {相对路径（/ 分隔）: (大小, mtime_ns)}。跳过符号链接与匹配 exclude（fnmatch，作用于相对路径与文件名）的条目。"""
+    patterns = exclude or []
+    out: dict[str, tuple[int, int]] = {}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(local_dir, rel_dir) if rel_dir else local_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if patterns and any(fnmatch.fnmatch(rel, p) or fnmatch.fnmatch(entry.name, p) for p in patterns):
+                    continue
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    stack.append(rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    out[rel] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _with_ancestors(folder: str) -> list[str]:
+    """folder 及其各级祖先文件夹（直到文件系统根，如 cloudreve://my）。"""
+    out = [folder]
+    while "/" in folder.removeprefix("cloudreve://"):
+        folder = folder.rsplit("/", 1)[0]
+        out.append(folder)
+    return out
+
+
+def _leaf_folders(folders: set[str]) -> list[str]:
+    """去掉是其他文件夹祖先的文件夹（创建子文件夹时祖先会自动创建）。"""
+    ancestors = {parent for folder in folders for parent in _with_ancestors(folder)[1:]}
+    return sorted(folders - ancestors)
+
+
+def sync_directory(
+    tokens: pipeline.TokenState,
+    local_dir: str,
+    remote_folder: str,
+    policy_id: str,
+    *,
+    manifest_path: str = "",
+    hash_files: bool = False,
+    exclude: list[str] | None = None,
+    direct_links: bool = False,
+    dry_run: bool = False,
+    concurrency: int | None = None,
+) -> dict:
+    """
+    同步 local_dir 到网盘文件夹 remote_folder，返回统计与每个已上传/失败文件的明细。
+    dry_run 为 True 时只比对并返回将要上传的文件，不发请求也不改清单。
+    """
+    local_dir = os.path.abspath(os.path.expanduser(local_dir))
+    if not os.path.isdir(local_dir):
+        raise ValueError(f"本地目录不存在：{local_dir}")
+    remote_folder = pipeline.normalize_folder_uri(remote_folder)
+    manifest_path = manifest_path or manifest_path_for(local_dir, remote_folder)
+
+    with metrics.stage("local", "scan") as st:
+        manifest = load_manifest(manifest_path, local_dir, remote_folder)
+        current = scan(local_dir, exclude)
+        st.chunks = len(current)
+    removed = sorted(set(manifest) - set(current))
+    candidates = [
+        rel for rel, (size, mtime_ns) in current.items()
+        if (entry := manifest.get(rel)) is None or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns
+    ]
+    candidates.sort()
+    result: dict = {
+        "scanned": len(current),
+        "unchanged": len(current) - len(candidates),
+        "removed": removed,
+        "manifest_path": manifest_path,
+    }
+    if dry_run:
+        result.update({"to_upload": candidates, "bytes_to_upload": sum(current[rel][0] for rel in candidates)})
+        return result
+
+    lock = threading.Lock()
+    dirty = bool(removed)
+    for rel in removed:
+        del manifest[rel]
+    last_save = time.monotonic()
+    uploaded: list[dict] = []
+    failed: list[dict] = []
+    rehashed = 0
+
+    def checkpoint(force: bool = False) -> None:
+        nonlocal last_save, dirty
+        if dirty and (force or time.monotonic() - last_save >= _CHECKPOINT_SECONDS):
+            save_manifest(manifest_path, local_dir, remote_folder, manifest)
+            last_save = time.monotonic()
+            dirty = False
+
+    def uri_of(rel: str) -> str:
+        return remote_uri(remote_folder, rel)
+
+    def sync_one(rel: str) -> None:
+        nonlocal dirty, rehashed
+        size, mtime_ns = current[rel]
+        path = os.path.join(local_dir, *rel.split("/"))
+        digest = _sha256(path) if hash_files else None
+        with lock:
+            previous = manifest.get(rel)
+        if digest is not None and previous is not None and previous.get("sha256") == digest and previous.get("size") == size:
+            # 只有 mtime 变化，内容相同：不上传，只更新清单
+            with lock:
+                manifest[rel] = {**previous, "mtime_ns": mtime_ns}
+                rehashed += 1
+                dirty = True
+            return
+        mime = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        pipeline.check_policy(tokens, policy_id, size)
+        done = pipeline.upload_path(tokens, uri_of(rel), path, policy_id, mime_type=mime)
+        entry = {"size": size, "mtime_ns": mtime_ns, "uri": uri_of(rel)}
+        if digest is not None:
+            entry["sha256"] = digest
+        with lock:
+            manifest[rel] = entry
+            uploaded.append({"path": rel, "uri": entry["uri"], "size": done["size"]})
+            dirty = True
+
+    if candidates:
+        # 已同步过的文件所在的文件夹必然存在，只为其余文件夹建一次
+        existing = {e["uri"].rsplit("/", 1)[0] for e in manifest.values() if e.get("uri")}
+        needed = {uri_of(rel).rsplit("/", 1)[0] for rel in candidates} - existing
+        with ThreadPoolExecutor(max_workers=concurrency or CONCURRENCY, thread_name_prefix="cloudreve-sync") as pool:
+            with metrics.stage("local", "folders") as st:
+                folders = _leaf_folders(needed)
+                created = {pool.submit(metrics.in_context(pipeline.ensure_folder), tokens, folder): folder for folder in folders}
+                folder_errors = {
+                    created[f]: str(e) or type(e).__name__ for f in as_completed(created) if (e := f.exception()) is not None
+                }
+                st.chunks = len(folders)
+            pending = candidates
+            if folder_errors:
+                # 建成的最深文件夹连同其祖先都已存在；其余需要的文件夹下的文件记为失败，不再上传
+                ready = {ancestor for folder in folders if folder not in folder_errors for ancestor in _with_ancestors(folder)}
+                pending = []
+                for rel in candidates:
+                    folder = uri_of(rel).rsplit("/", 1)[0]
+                    if folder not in needed or folder in ready:
+                        pending.append(rel)
+                        continue
+                    leaf = next(f for f in folder_errors if f == folder or f.startswith(folder + "/"))
+                    failed.append({"path": rel, "error": f"创建文件夹 {leaf} 失败：{folder_errors[leaf]}"})
+            with metrics.stage("local", "upload") as st:
+                futures = {pool.submit(metrics.in_context(sync_one), rel): rel for rel in pending}
+                for f in as_completed(futures):
+                    if (e := f.exception()) is not None:
+                        failed.append({"path": futures[f], "error": str(e) or type(e).__name__})
+                    with lock:
+                        checkpoint()
+                st.bytes = sum(item["size"] for item in uploaded)
+                st.chunks = len(uploaded)
+        metrics.add_bytes("local", "upload", sum(item["size"] for item in uploaded))
+
+    if direct_links and uploaded:
+        with metrics.stage("local", "link"):
+            for start in range(0, len(uploaded), _LINK_BATCH):
+                batch = uploaded[start:start + _LINK_BATCH]
+                links = pipeline.direct_links(tokens, [item["uri"] for item in batch])
+                for item in batch:
+                    item["direct_link"] = links.get(item["uri"], "")
+                    # 获取失败时 direct_links 返回的是错误说明，不写入清单
+                    if item["direct_link"].startswith(("http://", "https://")):
+                        manifest[item["path"]]["direct_link"] = item["direct_link"]
+            dirty = True
+    checkpoint(force=True)
+
+    uploaded.sort(key=lambda item: item["path"])
+    failed.sort(key=lambda item: item["path"])
+    result.update({
+        "uploaded": uploaded,
+        "failed": failed,
+        "rehashed_unchanged": rehashed,
+        "bytes_uploaded": sum(item["size"] for item in uploaded),
+    })
+    result["unchanged"] += rehashed
+    return result
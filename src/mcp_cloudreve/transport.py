@@ -0,0 +1,171 @@
+"""
+上游 HTTP 传输层：按主机复用 httpx.Client（连接池 + keep-alive），缓存 DNS 解析结果，已安装 h2 时启用 HTTP/2。
+douyin / bilibili / netease / cloudreve 的请求都经由 get_client 获取客户端，同一主机的后续请求直接复用已建立的连接。
+客户端不带默认请求头与 cookie（各模块按请求传入），并拒绝保存响应 cookie，避免不同调用方之间串用。
+每个请求的耗时与状态码经事件钩子计入 metrics。
+媒体 CDN、S3 桶、临时下载地址的主机名很多，客户端缓存按最近使用保留至多 UPSTREAM_MAX_CLIENTS 个；
+被淘汰的客户端不立即关闭（可能仍有下载在进行），等其连接全部空闲后再关闭。
+"""
+
+import functools
+import importlib.util
+import ipaddress
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+from . import metrics
+from .cache import TTLCache
+
+# 只探测 h2 是否已安装，真正导入推迟到创建 HTTP/2 客户端时
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 每个主机的连接池大小与空闲连接保活时间
+POOL_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_POOL_SIZE", "32"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("UPSTREAM_POOL_KEEPALIVE", "16"))
+KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+# DNS 缓存时间（秒），0 表示不缓存
+DNS_CACHE_TTL = float(os.environ.get("UPSTREAM_DNS_CACHE_TTL", "300"))
+# UPSTREAM_HTTP2=0 可全局关闭 HTTP/2（即使已安装 h2）
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.environ.get("UPSTREAM_HTTP2", "1") != "0"
+# 缓存的客户端（连接池）数上限，按 (主机, 是否 HTTP/2) 计
+MAX_CLIENTS = max(1, int(os.environ.get("UPSTREAM_MAX_CLIENTS", "64")))
+# 被淘汰的客户端至少等这么久（秒）才检查是否可关闭，避免关掉刚交给调用方、尚未发出请求的客户端
+_RETIRE_GRACE = 5.0
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, read=60.0)
+
+_dns_cache = TTLCache(maxsize=1024, ttl=DNS_CACHE_TTL)
+# 值为 (客户端, httpcore 连接池)；按最近使用排序，末尾为最新
+_clients: OrderedDict[tuple[str, bool], tuple[httpx.Client, object]] = OrderedDict()
+# 已淘汰、尚未关闭的客户端：(淘汰时间, 客户端, 连接池)
+_retired: list[tuple[float, httpx.Client, object]] = []
+_clients_lock = threading.Lock()
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _resolve(host: str, port: int) -> list[str]:
+    """解析主机名为 IP 列表（带缓存）。"""
+    key = (host, port)
+    cached = _dns_cache.get(key)
+    if cached is not None:
+        return cached
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    ips = list(dict.fromkeys(info[4][0] for info in infos))
+    if ips and DNS_CACHE_TTL > 0:
+        _dns_cache.set(key, ips)
+    return ips
+
+
+@functools.lru_cache(maxsize=1)
+def _dns_backend_class() -> type:
+    """带 DNS 缓存的 httpcore 同步网络后端类。httpcore 导入较慢，首次创建客户端时才导入，不拖慢服务启动。"""
+    import httpcore
+
+    class _CachingDNSBackend(httpcore.SyncBackend):
+        """建立 TCP 连接时使用缓存的 DNS 结果；TLS 的 SNI 与证书校验仍使用原主机名（由 httpcore 按请求源传入）。"""
+
+        def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+            if DNS_CACHE_TTL <= 0 or _is_ip(host) or host == "localhost":
+                return super().connect_tcp(host, port, timeout, local_address, socket_options)
+            try:
+                ips = _resolve(host, port)
+            except OSError as e:
+                raise httpcore.ConnectError(str(e)) from e
+            last_err: Exception | None = None
+            for ip in ips:
+                try:
+                    return super().connect_tcp(ip, port, timeout, local_address, socket_options)
+                except httpcore.ConnectError as e:
+                    last_err = e
+            # 缓存的地址都连不上时丢弃缓存，下次重新解析
+            _dns_cache.pop((host, port))
+            if last_err is not None:
+                raise last_err
+            return super().connect_tcp(host, port, timeout, local_address, socket_options)
+
+    return _CachingDNSBackend
+
+
+def _build_client(http2: bool) -> tuple[httpx.Client, object]:
+    transport = httpx.HTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+    pool = getattr(transport, "_pool", None)
+    if pool is not None and hasattr(pool, "_network_backend"):
+        pool._network_backend = _dns_backend_class()()
+    client = httpx.Client(
+        transport=transport,
+        timeout=DEFAULT_TIMEOUT,
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        event_hooks={"request": [metrics.on_request], "response": [metrics.on_response]},
+    )
+    return client, pool
+
+
+def _idle(pool: object) -> bool:
+    """连接池中没有进行中的请求（没有连接或连接全部空闲）。"""
+    connections = getattr(pool, "connections", None)
+    return connections is None or all(c.is_idle() for c in connections)
+
+
+def _sweep_retired(now: float) -> list[httpx.Client]:
+    """从 _retired 中取出可以关闭的客户端（调用方持有 _clients_lock，在锁外关闭）。"""
+    closable = [client for retired_at, client, pool in _retired if now - retired_at >= _RETIRE_GRACE and _idle(pool)]
+    if closable:
+        _retired[:] = [entry for entry in _retired if entry[1] not in closable]
+    return closable
+
+
+def get_client(url: str, *, http2: bool | None = None) -> httpx.Client:
+    """
+    返回 url 所在主机的共享客户端（进程内每个主机一个，线程安全，不要关闭）。
+    http2 为 None 时按 HTTP2_ENABLED 决定；大文件下载等不宜走 HTTP/2 的场景可显式传 False。
+    超时、请求头、是否跟随重定向等按请求传入。每次发请求前调用（不要长期持有返回的客户端）。
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower() if "://" in url else url.lower()
+    use_http2 = HTTP2_ENABLED if http2 is None else (http2 and HTTP2_AVAILABLE)
+    key = (host, use_http2)
+    closable: list[httpx.Client] = []
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is not None:
+            _clients.move_to_end(key)
+            return entry[0]
+        entry = _clients[key] = _build_client(use_http2)
+        now = time.monotonic()
+        while len(_clients) > MAX_CLIENTS:
+            _, (old_client, old_pool) = _clients.popitem(last=False)
+            _retired.append((now, old_client, old_pool))
+        closable = _sweep_retired(now)
+    for client in closable:
+        client.close()
+    return entry[0]
+
+
+def close_all() -> None:
+    """关闭所有共享客户端（进程退出或测试时调用）。"""
+    with _clients_lock:
+        clients = [client for client, _ in _clients.values()] + [client for _, client, _ in _retired]
+        _clients.clear()
+        _retired.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,243 @@
+"""
+按存储策略类型直传：非本机存储策略创建上传会话时，Cloudreve v4 会返回 upload_urls / credential，
+分块可直接发往后端存储，不再经 Cloudreve 中转（POST /file/upload/{session}/{index}）。
+
+  s3 / ks3    预签名的分片上传 URL（每个分片一个），分片并行 PUT，收集 ETag 后 POST complete_url 合并，再回调 Cloudreve
+  onedrive    上传会话 URL，按 Content-Range 顺序 PUT，完成后回调 Cloudreve
+  remote      从机存储，POST {upload_urls[0]}?chunk={index}（Authorization 为会话 credential），从机自行通知主机
+
+其他类型、开启了中转（relay）的策略或会话未返回 upload_urls 时仍走 Cloudreve 中转。
+分片缓冲区取自 buffers 缓冲池，并行分片数由 MCP_DIRECT_UPLOAD_CONCURRENCY 控制；MCP_DIRECT_UPLOAD=0 可全局关闭直传。
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable
+
+import httpx
+
+from . import buffers
+from . import cloudreve
+from . import metrics
+from . import transport
+
+if TYPE_CHECKING:
+    from .pipeline import TokenState
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("MCP_DIRECT_UPLOAD", "1") != "0"
+# 单个 S3 上传同时进行的分片数（另受缓冲池字节预算限制）
+CONCURRENCY = max(1, int(os.environ.get("MCP_DIRECT_UPLOAD_CONCURRENCY", "4")))
+# 单个分片的重试次数
+_PART_ATTEMPTS = 3
+_PART_TIMEOUT = httpx.Timeout(30.0, write=120.0, read=120.0)
+_S3_TYPES = {"s3", "ks3"}
+_ERROR_RE = re.compile(rb"<Error>.*?<Code>(.*?)</Code>", re.S)
+
+
+def policy_type(session_data: dict) -> str:
+    return ((session_data.get("storage_policy") or {}).get("type") or "local").lower()
+
+
+def is_direct(session_data: dict) -> bool:
+    """该上传会话是否应直传后端存储。"""
+    if not ENABLED or not session_data.get("upload_urls"):
+        return False
+    if (session_data.get("storage_policy") or {}).get("relay"):
+        return False
+    return policy_type(session_data) in _S3_TYPES | {"onedrive", "remote"}
+
+
+class _StreamReader:
+    """把字节流包装成 readinto 接口（读满 view 或读到流结束）。"""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._it = iter(chunks)
+        self._rest = memoryview(b"")
+
+    def readinto(self, view: memoryview) -> int:
+        filled = 0
+        while filled < len(view):
+            if not self._rest:
+                data = next(self._it, None)
+                if data is None:
+                    break
+                self._rest = memoryview(data)
+                continue
+            n = min(len(self._rest), len(view) - filled)
+            view[filled:filled + n] = self._rest[:n]
+            self._rest = self._rest[n:]
+            filled += n
+        return filled
+
+
+def _part_size(session_data: dict, size: int) -> int:
+    chunk_size = session_data.get("chunk_size") or size
+    return chunk_size if chunk_size > 0 else size
+
+
+def _with_retry(name: str, fn: Callable[[], httpx.Response]) -> httpx.Response:
+    """发送分片请求；网络错误与 5xx 重试，其他错误直接抛出。"""
+    for attempt in range(_PART_ATTEMPTS):
+        try:
+            r = fn()
+            if r.status_code < 500 or attempt == _PART_ATTEMPTS - 1:
+                r.raise_for_status()
+                return r
+            logger.warning("直传 %s 返回 %s，重试", name, r.status_code)
+        except httpx.TransportError as e:
+            if attempt == _PART_ATTEMPTS - 1:
+                raise
+            logger.warning("直传 %s 失败，重试 - %s", name, e)
+        metrics.record_retry()
+        time.sleep(0.5 * (attempt + 1))
+    raise AssertionError("unreachable")
+
+
+def _send_parts(
+    readinto: Callable[[memoryview], int],
+    size: int,
+    part_size: int,
+    send: Callable[[int, memoryview], object],
+    concurrency: int,
+) -> list:
+    """
+    顺序读出各分片（每片一个缓冲池缓冲区），至多 concurrency 片同时发送；返回按分片序号排列的 send 结果。
+    读出的字节数与 size 不一致时抛 RuntimeError；任一分片失败时不再读后续分片。
+    """
+    count = max(1, -(-size // part_size))
+    slots = threading.BoundedSemaphore(concurrency)
+    results: list = [None] * count
+    futures: list[Future] = []
+
+    def run(index: int, view: memoryview, lease) -> None:
+        try:
+            results[index] = send(index, view)
+        finally:
+            lease.__exit__(None, None, None)
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="direct-upload") as pool:
+        for index in range(count):
+            slots.acquire()
+            if any(f.done() and f.exception() for f in futures):
+                slots.release()
+                break
+            length = min(part_size, size - index * part_size)
+            lease = buffers.acquire(length)
+            view = lease.__enter__()
+            try:
+                n = readinto(view)
+                if n != length:
+                    raise RuntimeError(f"数据流大小不一致：声明 {size} 字节，实际 {index * part_size + n} 字节")
+                futures.append(pool.submit(metrics.in_context(run), index, view, lease))
+            except BaseException:
+                lease.__exit__(None, None, None)
+                slots.release()
+                raise
+    for f in futures:
+        f.result()
+    if readinto(memoryview(bytearray(1))):
+        raise RuntimeError(f"数据流超过声明大小 {size} 字节")
+    return results
+
+
+def _upload_s3(tokens: "TokenState", session_data: dict, readinto: Callable[[memoryview], int], size: int) -> int:
+    urls = session_data["upload_urls"]
+    part_size = _part_size(session_data, size)
+
+    def send(index: int, view: memoryview) -> str:
+        url = urls[index]
+        length, content = buffers.request_body(view)
+        r = _with_retry(f"S3 分片 {index + 1}", lambda: transport.get_client(url, http2=False).put(
+            url, content=content, headers={"Content-Length": str(length)}, timeout=_PART_TIMEOUT,
+        ))
+        etag = r.headers.get("etag")
+        if not etag:
+            raise RuntimeError(f"S3 分片 {index + 1} 未返回 ETag")
+        return etag
+
+    etags = _send_parts(readinto, size, part_size, send, CONCURRENCY)
+    if len(etags) != len(urls):
+        raise RuntimeError(f"分片数 {len(etags)} 与会话的上传地址数 {len(urls)} 不一致")
+    complete_url = session_data.get("complete_url") or session_data.get("completeURL")
+    if complete_url:
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{i + 1}</PartNumber><ETag>{etag}</ETag></Part>" for i, etag in enumerate(etags)
+        ) + "</CompleteMultipartUpload>"
+        r = _with_retry("S3 合并分片", lambda: transport.get_client(complete_url, http2=False).post(
+            complete_url, content=body.encode(), headers={"Content-Type": "application/xml"}, timeout=_PART_TIMEOUT,
+        ))
+        # S3 合并失败时可能返回 200 + <Error> 正文
+        if m := _ERROR_RE.search(r.content):
+            raise RuntimeError(f"S3 合并分片失败：{m.group(1).decode(errors='replace')}")
+    tokens.call(cloudreve.upload_callback, policy_type(session_data), session_data["session_id"],
+                session_data.get("callback_secret", ""))
+    return len(etags)
+
+
+def _upload_onedrive(tokens: "TokenState", session_data: dict, readinto: Callable[[memoryview], int], size: int) -> int:
+    url = session_data["upload_urls"][0]
+    part_size = _part_size(session_data, size)
+
+    def send(index: int, view: memoryview) -> None:
+        start = index * part_size
+        length, content = buffers.request_body(view)
+        _with_retry(f"OneDrive 分片 {index + 1}", lambda: transport.get_client(url, http2=False).put(
+            url, content=content, timeout=_PART_TIMEOUT, headers={
+                "Content-Length": str(length),
+                "Content-Range": f"bytes {start}-{start + length - 1}/{size}",
+            },
+        ))
+
+    # OneDrive 上传会话要求按顺序写入
+    count = len(_send_parts(readinto, size, part_size, send, 1))
+    tokens.call(cloudreve.upload_callback, "onedrive", session_data["session_id"],
+                session_data.get("callback_secret", ""))
+    return count
+
+
+def _upload_remote(tokens: "TokenState", session_data: dict, readinto: Callable[[memoryview], int], size: int) -> int:
+    url = session_data["upload_urls"][0]
+    part_size = _part_size(session_data, size)
+
+    def send(index: int, view: memoryview) -> None:
+        length, content = buffers.request_body(view)
+        r = _with_retry(f"从机分片 {index}", lambda: transport.get_client(url).post(
+            url, params={"chunk": index}, content=content, timeout=_PART_TIMEOUT, headers={
+                "Authorization": session_data.get("credential") or "",
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(length),
+            },
+        ))
+        data = r.json()
+        if data.get("code", 0) != 0:
+            raise RuntimeError((data.get("msg") or "").strip() or f"从机分片 {index} 上传失败(code={data.get('code')})")
+
+    # 从机按分片序号顺序接收，最后一片写完后由从机通知主机
+    return len(_send_parts(readinto, size, part_size, send, 1))
+
+
+def _dispatch(tokens: "TokenState", session_data: dict, readinto: Callable[[memoryview], int], size: int) -> int:
+    kind = policy_type(session_data)
+    if kind in _S3_TYPES:
+        return _upload_s3(tokens, session_data, readinto, size)
+    if kind == "onedrive":
+        return _upload_onedrive(tokens, session_data, readinto, size)
+    return _upload_remote(tokens, session_data, readinto, size)
+
+
+def upload_path(tokens: "TokenState", session_data: dict, path: str, size: int) -> int:
+    """把本地文件直传到会话对应的存储（is_direct 为 True 时调用），返回分片数。"""
+    with open(path, "rb", buffering=0) as f:
+        return _dispatch(tokens, session_data, lambda view: buffers.readinto_full(f, view), size)
+
+
+def upload_stream(tokens: "TokenState", session_data: dict, chunks: Iterable[bytes], size: int) -> int:
+    """把字节流直传到会话对应的存储，返回分片数；流的实际大小与 size 不一致时抛 RuntimeError。"""
+    return _dispatch(tokens, session_data, _StreamReader(chunks).readinto, size)